@@ -4,13 +4,18 @@ Air Mouse - 使用手勢控制滑鼠
 主啟動文件
 """
 import argparse
+import json
+import signal
 import sys
 import os
 
 # 確保可以導入自定義模組
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from core import AirMouse
+from core import (AirMouse, ControlServer, LandmarkPublisher, SessionReplay, setup_logging,
+                  install_crash_dump)
+from core.config import (DEFAULT_PREVIEW_FPS, MIN_PREVIEW_FPS, MAX_PREVIEW_FPS,
+                         CONTROL_SOCKET_PATH, LANDMARK_SOCKET_PATH, SESSION_DIR, SESSION_FORMAT)
 from ui import AirMouseUI
 
 
@@ -22,6 +27,10 @@ def print_welcome_message():
     print("操作說明：")
     print("• 食指移動：控制滑鼠移動")
     print("• 空白鍵：左鍵點擊")
+    print("• 食指+中指：左鍵點擊")
+    print("• 拇指+食指捏合：左鍵點擊")
+    print("• 食指+中指+無名指：右鍵點擊")
+    print("• 食指+小指（維持片刻）：拖曳")
     print()
     print("注意事項：")
     print("- 保持食指在綠色框內")
@@ -32,9 +41,50 @@ def print_welcome_message():
     print("啟動模式：")
     print("- 預設：圖形化介面模式（推薦）")
     print("- 使用 --no-preview 參數：命令行模式（高效能）")
+    print("- 使用 --daemon 參數：背景模式（以控制通訊端調整參數）")
+    print("- 使用 --replay 參數：重播錄製的工作階段並比對結果")
     print()
 
 
+def clamp_preview_fps(preview_fps):
+    """將預覽頻率限制在允許範圍內"""
+    return max(MIN_PREVIEW_FPS, min(MAX_PREVIEW_FPS, preview_fps))
+
+
+def start_landmark_publisher(air_mouse, path):
+    """啟動手部地標本機串流"""
+    try:
+        air_mouse.landmark_publisher = LandmarkPublisher(path).start()
+        print(f"地標串流: {path}（python -m tools.landmark_monitor）")
+    except OSError as e:
+        print(f"無法建立地標串流通訊端: {e}")
+
+
+def start_session_recording(air_mouse, args):
+    """開始錄製工作階段（原始影格與每幀地標、手勢、滑鼠事件）"""
+    try:
+        path = air_mouse.start_session_recording(args.record_session, args.session_format)
+        print(f"工作階段錄製: {path}（python app.py --replay {path}）")
+    except OSError as e:
+        print(f"無法建立工作階段目錄: {e}")
+
+
+def run_replay_mode(args):
+    """重播錄製的工作階段（不移動滑鼠），輸出與錄製結果的比對"""
+    try:
+        replay = SessionReplay(args.replay)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"無法讀取工作階段 {args.replay}: {e}")
+        return 1
+    air_mouse = AirMouse(capture=replay)
+    try:
+        report = replay.replay(air_mouse)
+    finally:
+        air_mouse.cleanup()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0 if not report['mismatched_frames'] else 1
+
+
 def run_cli_mode(args):
     """運行命令行模式"""
     air_mouse = AirMouse()
@@ -44,6 +94,9 @@ def run_cli_mode(args):
     air_mouse.frame_process_interval = int(1000 / fps)
     print(f"處理頻率: 約 {fps} FPS")
     
+    # 設定預覽頻率（按 P 開啟預覽時使用）
+    air_mouse.set_preview_fps(clamp_preview_fps(args.preview_fps))
+    
     # 設定畫面方向
     air_mouse.frame_rotation = args.rotation
     air_mouse.flip_horizontal = args.flip_h
@@ -54,8 +107,33 @@ def run_cli_mode(args):
               f"垂直翻轉{'開啟' if args.flip_v else '關閉'}")
     
     air_mouse.show_preview = False
+    install_crash_dump(air_mouse.trace)
     print("已啟動高效能模式（無預覽）")
     
+    if args.publish_landmarks:
+        start_landmark_publisher(air_mouse, args.publish_landmarks)
+    if args.record_session:
+        start_session_recording(air_mouse, args)
+    
+    # 控制通訊端（背景模式預設啟用）
+    control_server = None
+    control_socket = args.control_socket or (CONTROL_SOCKET_PATH if args.daemon else None)
+    if control_socket:
+        try:
+            control_server = ControlServer(air_mouse, control_socket).start()
+            print(f"控制通訊端: {control_socket}（python -m tools.air_mouse_ctl stats）")
+        except OSError as e:
+            print(f"無法建立控制通訊端: {e}")
+            if args.daemon:
+                air_mouse.cleanup()
+                return
+    
+    # 背景模式：SIGTERM / SIGHUP 時正常結束（釋放攝影機與通訊端）
+    if args.daemon:
+        for signum in (getattr(signal, 'SIGTERM', None), getattr(signal, 'SIGHUP', None)):
+            if signum is not None:
+                signal.signal(signum, lambda *_: air_mouse.stop())
+    
     if args.no_gpu:
         air_mouse.use_gpu = False
         print("已禁用 GPU 加速，使用 CPU 模式運行")
@@ -67,12 +145,21 @@ def run_cli_mode(args):
         if not (air_mouse.opencv_gpu_available or air_mouse.tf_gpu_available):
             print("未檢測到可用的 GPU 加速，使用 CPU 模式運行")
     
-    air_mouse.run()
+    try:
+        air_mouse.run(control_server)
+    finally:
+        if control_server is not None:
+            control_server.close()
 
 
 def run_gui_mode(args):
     """運行圖形化界面模式"""
     ui = AirMouseUI()
+    install_crash_dump(ui.air_mouse.trace)
+    if args.publish_landmarks:
+        start_landmark_publisher(ui.air_mouse, args.publish_landmarks)
+    if args.record_session:
+        start_session_recording(ui.air_mouse, args)
     
     # 從命令行參數設定初始值
     ui.set_initial_settings(
@@ -80,7 +167,8 @@ def run_gui_mode(args):
         flip_h=args.flip_h,
         flip_v=args.flip_v,
         fps=max(10, min(100, args.fps)),
-        use_gpu=not args.no_gpu
+        use_gpu=not args.no_gpu,
+        preview_fps=clamp_preview_fps(args.preview_fps)
     )
     
     ui.run()
@@ -94,21 +182,43 @@ def main():
                         help='使用命令行模式（無GUI，提升效能）')
     parser.add_argument('--fps', type=int, default=50, 
                         help='設定處理頻率 (10-100 之間，數值越小越流暢但CPU負擔越重)')
+    parser.add_argument('--preview-fps', type=int, default=DEFAULT_PREVIEW_FPS,
+                        help=f'設定預覽畫面頻率 ({MIN_PREVIEW_FPS}-{MAX_PREVIEW_FPS} 之間，與處理頻率獨立)')
     parser.add_argument('--no-gpu', action='store_true', 
                         help='禁用 GPU 加速 (在 GPU 出現問題時使用)')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO',
+                        help='設定日誌等級 (DEBUG 會輸出每幀的除錯資訊，已限制頻率)')
     parser.add_argument('--rotation', type=int, choices=[0, 90, 180, 270], default=0, 
                         help='設定攝像頭畫面初始旋轉角度 (0, 90, 180, 270)')
     parser.add_argument('--flip-h', action='store_true', 
                         help='啟動時水平翻轉畫面')
     parser.add_argument('--flip-v', action='store_true', 
                         help='啟動時垂直翻轉畫面')
+    parser.add_argument('--daemon', action='store_true',
+                        help='背景模式（無預覽，透過控制通訊端調整參數與查詢統計）')
+    parser.add_argument('--control-socket', metavar='PATH',
+                        help=f'控制通訊端路徑（--daemon 預設: {CONTROL_SOCKET_PATH}）')
+    parser.add_argument('--publish-landmarks', nargs='?', const=LANDMARK_SOCKET_PATH, metavar='PATH',
+                        help=f'將每幀手部地標串流給本機其他程式（預設路徑: {LANDMARK_SOCKET_PATH}）')
+    parser.add_argument('--record-session', nargs='?', const=SESSION_DIR, metavar='DIR',
+                        help=f'錄製原始攝影機影格與每幀地標、手勢、滑鼠事件（預設目錄: {SESSION_DIR}）')
+    parser.add_argument('--session-format', choices=['video', 'images'], default=SESSION_FORMAT,
+                        help='錄製格式：video 為無損 FFV1 影片（SESSION_FOURCC），images 為無損 PNG 影像序列')
+    parser.add_argument('--replay', metavar='SESSION',
+                        help='重播錄製的工作階段目錄（不移動滑鼠），輸出與錄製結果的比對')
     
     args = parser.parse_args()
     
+    # 非同步日誌：由背景執行緒寫出，熱迴圈不直接寫 stdout
+    setup_logging(args.log_level)
+    
     print_welcome_message()
     
     # 選擇運行模式
-    if args.no_preview:
+    if args.replay:
+        print("重播工作階段...")
+        sys.exit(run_replay_mode(args))
+    elif args.no_preview or args.daemon:
         print("啟動命令行模式...")
         run_cli_mode(args)
     else:
@@ -3,8 +3,18 @@ Core 模組初始化
 """
 from .config import *
 from .gpu_detector import GPUDetector
-from .gestures import GestureDetector, Gestures, mp_hands, mp_drawing, mp_drawing_styles
+from .gestures import (GestureDetector, Gestures, mp_hands, mp_drawing, mp_drawing_styles,
+                       landmarks_to_array, finger_mask, FingerStateEstimator, GestureClassifier,
+                       PinchDetector)
 from .air_mouse import AirMouse, MouseController
+from .gesture_features import GestureFeatureIndex
+from .gesture_matcher import DTWGestureMatcher
+from .pose_classifier import PoseClassifier
+from .frame_bus import FrameBus, FrameRef
+from .control_server import ControlServer
+from .landmark_publisher import LandmarkPublisher, LandmarkSubscriber
+from .session_recorder import SessionRecorder, SessionReplay
+from .logger import setup_logging, get_logger, TraceRingBuffer, install_crash_dump
 
 __all__ = [
     'GPUDetector',
@@ -14,5 +24,24 @@ __all__ = [
     'MouseController',
     'mp_hands',
     'mp_drawing', 
-    'mp_drawing_styles'
+    'mp_drawing_styles',
+    'landmarks_to_array',
+    'finger_mask',
+    'FingerStateEstimator',
+    'GestureClassifier',
+    'PinchDetector',
+    'GestureFeatureIndex',
+    'DTWGestureMatcher',
+    'PoseClassifier',
+    'FrameBus',
+    'FrameRef',
+    'ControlServer',
+    'LandmarkPublisher',
+    'LandmarkSubscriber',
+    'SessionRecorder',
+    'SessionReplay',
+    'setup_logging',
+    'get_logger',
+    'TraceRingBuffer',
+    'install_crash_dump'
 ]
@@ -16,10 +16,23 @@ from .config import (get_pyautogui, SCREEN_WIDTH, SCREEN_HEIGHT,
                       CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_BUFFER_SIZE,
                       CAMERA_AREA_RATIO, CAMERA_VERTICAL_OFFSET,
                       DEFAULT_FRAME_PROCESS_INTERVAL, DEFAULT_SMOOTHING_FACTOR,
-                      MIN_SMOOTHING, MAX_SMOOTHING)
+                      MIN_SMOOTHING, MAX_SMOOTHING, DEFAULT_PREVIEW_FPS,
+                      CLICK_TIME_THRESHOLD, DRAG_HOLD_TIME, PINCH_CLICK_ENABLED, CLICK_LATENCY_HISTORY,
+                      FRAME_BUS_ENABLED, FRAME_BUS_SLOTS, CONTROL_PAUSED_POLL_INTERVAL,
+                      SESSION_DIR, SESSION_FORMAT)
+from .frame_bus import FrameBus, FrameRef
+from .session_recorder import SessionRecorder
+from .inference_worker import InferenceWorker, NOT_READY
 from .gpu_detector import GPUDetector
-from .gestures import GestureDetector, Gestures, mp_hands, mp_drawing, mp_drawing_styles
+from .logger import get_logger, TraceRingBuffer
+from .gesture_matcher import DTWGestureMatcher
+from .gestures import (GestureDetector, Gestures, PinchDetector, mp_hands, landmarks_to_array,
+                       DETECTOR_HANDS_OPTIONS)
 from utils.image_processing import ImageProcessor
+from utils.frame_buffers import FrameBufferPool
+from utils.overlay import OverlayCompositor, LandmarkRenderer
+
+logger = get_logger('air_mouse')
 
 class MouseController:
     """滑鼠控制器"""
@@ -33,17 +46,99 @@ class MouseController:
         self.last_finger_pos = None  # 記錄上次手指位置
         self.min_move_distance = 15  # 最小移動距離(像素)，小於此距離視為抖動
         self.jitter_filter_enabled = True  # 是否啟用抖動過濾
+        
+        # 手勢狀態（點擊為邊緣觸發，拖曳持續 DRAG_HOLD_TIME 後按下、離開手勢時放開左鍵）
+        self.active_gesture = None
+        self.dragging = False
+        self.drag_hold_time = DRAG_HOLD_TIME
+        self.drag_entered_time = None
+        self.last_click_time = 0
+        
+        # 捏合開始時鎖定的游標位置（捏合點擊在此位置送出）
+        self.latched_position = None
+        
+        # 滑鼠操作後端與時鐘（預設為 pyautogui 與 time.time；工作階段錄製與重播時替換）
+        self.pointer = None
+        self.clock = time.time
+
+    def _pointer(self):
+        """取得滑鼠操作後端"""
+        return self.pointer if self.pointer is not None else get_pyautogui()
+
+    def update_gesture(self, gesture):
+        """處理手勢切換（每幀呼叫）：進入點擊手勢時點擊一次，
+        拖曳手勢持續 drag_hold_time 秒後按下左鍵、離開時放開
+
+        回傳是否送出了點擊事件。
+        """
+        if gesture == self.active_gesture:
+            if gesture == Gestures.DRAG and not self.dragging:
+                self._press_drag_after_hold()
+            return False
+        previous = self.active_gesture
+        self.active_gesture = gesture
+        pyautogui = self._pointer()
+        
+        if previous == Gestures.DRAG:
+            self.drag_entered_time = None
+            if self.dragging:
+                pyautogui.mouseUp(_pause=False)
+                self.dragging = False
+        
+        if gesture in (Gestures.LEFT_CLICK, Gestures.RIGHT_CLICK):
+            # 在目前指標位置點擊，避免抬起手指時的位移造成誤點
+            current_time = self.clock()
+            if current_time - self.last_click_time >= CLICK_TIME_THRESHOLD:
+                current_pos = pyautogui.position()
+                self._handle_gesture(gesture, current_pos.x, current_pos.y)
+                self.last_click_time = current_time
+                return True
+        elif gesture == Gestures.DRAG:
+            self.drag_entered_time = self.clock()
+            self._press_drag_after_hold()
+        return False
+
+    def _press_drag_after_hold(self):
+        """拖曳手勢已持續足夠時間時按下左鍵"""
+        if self.clock() - self.drag_entered_time >= self.drag_hold_time:
+            self._pointer().mouseDown(_pause=False)
+            self.dragging = True
 
-    def control_mouse(self, hand_landmarks, frame_shape, gesture):
+    def latch_cursor(self):
+        """鎖定目前游標位置（捏合開始時呼叫）"""
+        position = self._pointer().position()
+        self.latched_position = (position.x, position.y)
+
+    def release_latch(self):
+        """解除游標鎖定"""
+        self.latched_position = None
+
+    def pinch_click(self):
+        """在鎖定位置左鍵點擊，回傳是否送出了點擊事件"""
+        current_time = self.clock()
+        if current_time - self.last_click_time < CLICK_TIME_THRESHOLD:
+            return False
+        if self.latched_position is None:
+            self.latch_cursor()
+        x, y = self.latched_position
+        self._handle_gesture(Gestures.LEFT_CLICK, x, y)
+        self.last_click_time = current_time
+        return True
+
+    def control_mouse(self, landmarks, frame_shape, gesture):
         """根據手的位置和手勢控制滑鼠"""
-        current_time = time.time() * 1000
+        current_time = self.clock() * 1000
+        
+        # 只有移動與拖曳需要跟隨食指位置（捏合時游標保持鎖定）
+        if gesture not in (Gestures.MOVE, Gestures.DRAG) or self.latched_position is not None:
+            return
         
         # 限制移動頻率以避免過度操作
-        if gesture == Gestures.MOVE and (current_time - self.last_move_time) < self.min_move_interval:
+        if (current_time - self.last_move_time) < self.min_move_interval:
             return
         
-        # 獲取食指尖端的位置
-        index_finger = hand_landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP]
+        # 獲取食指尖端的位置（landmarks 為正規化座標陣列 (21, 3)）
+        index_x, index_y = landmarks[mp_hands.HandLandmark.INDEX_FINGER_TIP, :2]
         
         # 將攝像頭畫面座標映射到螢幕座標
         cam_width, cam_height = frame_shape[1], frame_shape[0]
@@ -60,8 +155,8 @@ class MouseController:
         bottom_y = min(cam_height, bottom_y)
         
         # 檢查是否在交互區域內
-        finger_x = index_finger.x * cam_width
-        finger_y = index_finger.y * cam_height
+        finger_x = float(index_x) * cam_width
+        finger_y = float(index_y) * cam_height
         in_area_x = margin_x < finger_x < (cam_width - margin_x)
         in_area_y = top_y < finger_y < bottom_y
         
@@ -74,69 +169,111 @@ class MouseController:
             # 確保座標在螢幕範圍內
             screen_x = max(0, min(SCREEN_WIDTH - 1, screen_x))
             screen_y = max(0, min(SCREEN_HEIGHT - 1, screen_y))
-              # 根據手勢類型決定是否使用平滑移動
-            if gesture == Gestures.MOVE:
-                # 抖動過濾：檢查手指移動距離
-                if self.jitter_filter_enabled and self.last_finger_pos is not None:
-                    # 計算手指在攝像頭畫面中的移動距離
-                    last_x, last_y = self.last_finger_pos
-                    finger_distance = ((finger_x - last_x) ** 2 + (finger_y - last_y) ** 2) ** 0.5
-                    
-                    # 如果移動距離小於閾值，視為抖動，不執行移動
-                    if finger_distance < self.min_move_distance:
-                        # print(f"[DEBUG] 抖動過濾: 移動距離 {finger_distance:.1f} < {self.min_move_distance}")
-                        return
-                
-                # 記錄當前手指位置
-                self.last_finger_pos = (finger_x, finger_y)
+            
+            # 抖動過濾：檢查手指移動距離
+            if self.jitter_filter_enabled and self.last_finger_pos is not None:
+                # 計算手指在攝像頭畫面中的移動距離
+                last_x, last_y = self.last_finger_pos
+                finger_distance = ((finger_x - last_x) ** 2 + (finger_y - last_y) ** 2) ** 0.5
                 
-                # 移動時使用輕微平滑以避免抖動
-                pyautogui = get_pyautogui()
-                current_x, current_y = pyautogui.position()
-                target_x = int(current_x + (screen_x - current_x) * 0.8)  # 提高平滑係數
-                target_y = int(current_y + (screen_y - current_y) * 0.8)
-                self._handle_gesture(gesture, target_x, target_y)
-                self.last_move_time = current_time
-            elif gesture == Gestures.LEFT_CLICK:
-                # 點擊使用精確座標
-                self._handle_gesture(gesture, screen_x, screen_y)
+                # 如果移動距離小於閾值，視為抖動，不執行移動
+                if finger_distance < self.min_move_distance:
+                    # print(f"[DEBUG] 抖動過濾: 移動距離 {finger_distance:.1f} < {self.min_move_distance}")
+                    return
+            
+            # 記錄當前手指位置
+            self.last_finger_pos = (finger_x, finger_y)
+            
+            # 移動時使用輕微平滑以避免抖動
+            pyautogui = self._pointer()
+            current_x, current_y = pyautogui.position()
+            target_x = int(current_x + (screen_x - current_x) * 0.8)  # 提高平滑係數
+            target_y = int(current_y + (screen_y - current_y) * 0.8)
+            self._handle_gesture(gesture, target_x, target_y)
+            self.last_move_time = current_time
 
     def _handle_gesture(self, gesture, x, y):
         """處理手勢動作"""
-        pyautogui = get_pyautogui()
-        if gesture == Gestures.MOVE:
-            # 移動模式：只移動滑鼠指標
+        pyautogui = self._pointer()
+        if gesture in (Gestures.MOVE, Gestures.DRAG):
+            # 移動模式：只移動滑鼠指標（拖曳時左鍵保持按下）
             pyautogui.moveTo(x, y, _pause=False)
         elif gesture == Gestures.LEFT_CLICK:
             # 左鍵點擊
             pyautogui.click(x, y, _pause=False)
+        elif gesture == Gestures.RIGHT_CLICK:
+            # 右鍵點擊
+            pyautogui.click(x, y, button='right', _pause=False)
 
     def cleanup(self):
         """清理資源"""
-        pass
+        # 確保拖曳中的左鍵被放開
+        self.update_gesture(None)
+        self.release_latch()
 
 class AirMouse:
     """Air Mouse 主要功能類"""
     
-    def __init__(self):
-        # 初始化攝像頭
-        self.cap = cv2.VideoCapture(0)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, CAMERA_BUFFER_SIZE)
+    def __init__(self, use_inference_worker=False, capture=None):
+        # 初始化攝像頭（capture 可傳入其他影格來源，例如工作階段重播 SessionReplay）
+        if capture is None:
+            capture = cv2.VideoCapture(0)
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, CAMERA_BUFFER_SIZE)
+        self.cap = capture
         
         # 初始化組件
         self.gpu_detector = GPUDetector()
         self.gesture_detector = GestureDetector()
         self.mouse_controller = MouseController()
+        self.pinch_detector = PinchDetector()
+        self.pinch_click_enabled = PINCH_CLICK_ENABLED
+        self.gesture_matcher = DTWGestureMatcher()  # 錄製手勢的即時範本比對
+        self.template_match = None  # 最近一次範本比對結果 (名稱, 距離)，未匹配時為 None
         self.image_processor = ImageProcessor()
         
+        # 獨立行程推論（影格經共享記憶體傳送；失敗時改回行程內偵測）
+        self.inference_worker = InferenceWorker(DETECTOR_HANDS_OPTIONS) if use_inference_worker else None
+        
+        # 影格緩衝區池（熱迴圈中重複使用，避免每幀配置記憶體）
+        self.frame_buffers = FrameBufferPool()
+        self._capture_frame = None
+        self.last_capture_time = None  # 最近一次擷取影格的時間 (perf_counter)，用於計算點擊延遲
+        self.capture_timestamp = None  # 最近一次擷取影格的時間戳記 (time.time 秒，重播時為錄製的時間)
+        self.frame_timestamp = None    # 目前處理中影格的時間戳記（process_frame 使用的時間）
+        
+        # 共享記憶體影格匯流排（方向調整後的 RGB 影格只寫入一次，推論與錄製直接讀取）
+        self.use_frame_bus = FRAME_BUS_ENABLED
+        self.frame_bus = None
+        self.frame_ref = None  # 目前處理中影格的引用，處理下一幀時釋放
+        
+        # 手部地標本機串流（LandmarkPublisher，由啟動程式設定）
+        self.landmark_publisher = None
+        
+        # 工作階段錄製（start_session_recording 啟動）
+        self.session_recorder = None
+        
+        # 預覽繪製（靜態圖層快取與批次地標繪製）
+        self.overlay_compositor = OverlayCompositor()
+        self.landmark_renderer = LandmarkRenderer(mp_hands.HAND_CONNECTIONS)
+        
         # 控制參數
         self.show_preview = True
         self.use_gpu = True
         self.frame_process_interval = DEFAULT_FRAME_PROCESS_INTERVAL
         self.last_process_time = 0
         
+        # 預覽控制（預覽頻率獨立於控制頻率）
+        self.preview_frame_interval = int(1000 / DEFAULT_PREVIEW_FPS)
+        self.last_preview_time = 0
+        self.preview_visible = True    # 視窗最小化或隱藏時由 UI 設為 False
+        self.preview_rendered = False  # 最近一次 process_frame 是否產生了預覽影格
+        self.draw_camera_overlays = True  # 只顯示手部模式下不需在攝像頭畫面上繪製
+        self.last_landmarks = None     # 最近一次處理影格的手部地標 (21, 3)，未偵測到時為 None
+        self.last_processed = False    # 最近一次 process_frame 是否執行了偵測（未到處理間隔時為 False）
+        self.last_event = None         # 最近一次 process_frame 送出的點擊事件（'click' / 'pinch'）
+        
         # 畫面方向控制（預設水平和垂直翻轉）
         self.frame_rotation = 0
         self.flip_horizontal = True  # 預設開啟水平翻轉
@@ -151,6 +288,16 @@ class AirMouse:
         # 低功耗模式
         self.low_power_mode = False
         
+        # 命令行模式的執行狀態（可由控制通訊端暫停或停止）
+        self.running = False
+        self.paused = False
+        self.start_time = time.perf_counter()
+        
+        # 每幀追蹤記錄（固定大小環形緩衝區，可隨時匯出）
+        self.trace = TraceRingBuffer()
+        self.frame_index = 0
+        self.click_latencies = deque(maxlen=CLICK_LATENCY_HISTORY)  # 擷取到送出點擊的延遲 (ms)
+        
         # 按鍵監聽
         self.space_pressed = False
         self.keyboard_available = False
@@ -166,7 +313,7 @@ class AirMouse:
                     pyautogui = get_pyautogui()
                     current_pos = pyautogui.position()
                     pyautogui.click(current_pos.x, current_pos.y, _pause=False)
-                    print(f"[DEBUG] 空白鍵點擊: ({current_pos.x}, {current_pos.y})")
+                    logger.debug("空白鍵點擊: (%s, %s)", current_pos.x, current_pos.y)
                     # 重置狀態
                     threading.Timer(0.1, lambda: setattr(self, 'space_pressed', False)).start()
             
@@ -196,7 +343,8 @@ class AirMouse:
     def adjust_frame_orientation(self, frame):
         """調整畫面方向"""
         return self.image_processor.adjust_frame_orientation(
-            frame, self.frame_rotation, self.flip_horizontal, self.flip_vertical
+            frame, self.frame_rotation, self.flip_horizontal, self.flip_vertical,
+            buffers=self.frame_buffers
         )
 
     def adjust_hand_landmarks_for_rotation(self, hand_landmarks, original_shape, rotated_shape):
@@ -206,131 +354,453 @@ class AirMouse:
             self.frame_rotation, self.flip_horizontal, self.flip_vertical
         )
 
-    def process_frame(self, frame):
-        """處理單個影格"""
-        current_time = time.time() * 1000
+    def read_frame(self):
+        """從攝影機讀取影格（重複使用擷取緩衝區）"""
+        success, frame = self.cap.read(self._capture_frame)
+        if success:
+            self._capture_frame = frame
+            self.last_capture_time = time.perf_counter()
+            # 重播來源提供錄製時的時間戳記，攝影機則使用目前時間
+            timestamp = getattr(self.cap, 'timestamp', None)
+            self.capture_timestamp = time.time() if timestamp is None else timestamp
+            if self.session_recorder is not None:
+                self.session_recorder.add_frame(frame, self.capture_timestamp)
+        return success, frame
+
+    def set_preview_fps(self, fps):
+        """設定預覽頻率"""
+        self.preview_frame_interval = int(1000 / max(1, fps))
+
+    def _preview_due(self, current_time):
+        """判斷此影格是否需要繪製預覽"""
+        if not (self.show_preview and self.preview_visible):
+            return False
+        if (current_time - self.last_preview_time) < self.preview_frame_interval:
+            return False
+        self.last_preview_time = current_time
+        return True
+
+    def process_frame(self, frame, timestamp=None):
+        """處理單個影格
+
+        timestamp 為影格的時間戳記（time.time 秒，通常為 capture_timestamp），所有依時間的判斷
+        （處理間隔、預覽、捏合速度）都使用此時間，重播時傳入錄製的時間即可得到相同結果；
+        未提供時使用目前時間。
+        只有在 preview_rendered 為 True 時，回傳的影格才包含預覽疊加圖層並需要顯示。
+        """
+        frame_start = time.perf_counter()
+        capture_time = self.last_capture_time or frame_start
+        if timestamp is None:
+            timestamp = time.time()
+        self.frame_timestamp = timestamp
+        current_time = timestamp * 1000
         should_process = (current_time - self.last_process_time) >= self.frame_process_interval
+        self.preview_rendered = False
+        self.last_processed = should_process
+        self.last_event = None
         
         # 在最開始就調整畫面方向（包括攝影機輸入翻轉）
         frame = self.adjust_frame_orientation(frame)
         
         if not should_process:
+            if self.session_recorder is not None:
+                self.session_recorder.log_frame(False, None, None, None, None, self.get_settings())
             return frame, None
         
         self.last_process_time = current_time
+        render_preview = self._preview_due(current_time)
+        self.preview_rendered = render_preview
         
         # 現在frame已經是調整後的，這就是我們要使用的版本
         frame_shape = frame.shape
         
-        # GPU 處理
-        rgb_frame, gpu_success = self.image_processor.process_frame_with_gpu(
-            frame, self.use_gpu and self.opencv_gpu_available
-        )
-        
-        if not gpu_success and self.use_gpu:
-            self.gpu_detector.opencv_gpu_available = False
+        # RGB 轉換：優先直接寫入影格匯流排的槽位，沒有空槽位時才使用私有緩衝區
+        if self.frame_ref is not None:
+            self.frame_ref.release()
+            self.frame_ref = None
+        if self.use_frame_bus:
+            self.frame_ref = self._publish_rgb(frame, capture_time)
+        if self.frame_ref is not None:
+            rgb_frame = self.frame_ref.array
+        else:
+            # GPU 處理
+            rgb_frame, gpu_success = self.image_processor.process_frame_with_gpu(
+                frame, self.use_gpu and self.opencv_gpu_available,
+                buffers=self.frame_buffers
+            )
+            
+            if not gpu_success and self.use_gpu:
+                self.gpu_detector.opencv_gpu_available = False
         
         # 手部檢測
-        results = self.gesture_detector.process_frame(rgb_frame)
+        inference_start = time.perf_counter()
+        landmarks = self._detect_landmarks(self.frame_ref or rgb_frame)
+        inference_end = time.perf_counter()
         
-        # 繪製交互區域
-        if self.show_preview:
-            self.image_processor.draw_interaction_area(frame, CAMERA_AREA_RATIO, CAMERA_VERTICAL_OFFSET)
+        # 預覽是否需要繪製在攝像頭畫面上
+        draw_overlays = render_preview and self.draw_camera_overlays
         
         # 處理手勢
         gesture = None
-        if results.multi_hand_landmarks:
-            hand_landmarks = results.multi_hand_landmarks[0]
-            
+        event = None
+        event_latency_ms = 0.0
+        if landmarks is NOT_READY:
+            # 推論工作行程尚未就緒：這一幀沒有結果，保留手勢、捏合與拖曳狀態（不當作手部離開）
+            pass
+        elif landmarks is not None:
+            self.last_landmarks = landmarks
             # 繪製手部標記點
-            if self.show_preview:
-                mp_drawing.draw_landmarks(
-                    frame, hand_landmarks, mp_hands.HAND_CONNECTIONS,
-                    mp_drawing_styles.get_default_hand_landmarks_style(),
-                    mp_drawing_styles.get_default_hand_connections_style()
-                )
+            if draw_overlays:
+                self.landmark_renderer.draw(frame, self.last_landmarks)
             
             # 檢測手勢（使用當前座標）
-            gesture = self.gesture_detector.detect_gesture(hand_landmarks, frame.shape)
+            gesture = self.gesture_detector.detect_gesture(self.last_landmarks, frame.shape)
+            
+            # 錄製手勢範本比對（每隔數幀以 DTW 比對一次）
+            self.template_match = self.gesture_matcher.push(self.last_landmarks, timestamp)
+            
+            # 捏合點擊快速路徑（每幀評估，不經過手勢去抖動）
+            if self.pinch_click_enabled and self._update_pinch(current_time / 1000, frame_shape):
+                event = 'pinch'
+            if self.pinch_detector.engaged:
+                gesture = Gestures.PINCH
             
             # 控制滑鼠（使用當前座標和當前形狀）
+            if self.mouse_controller.update_gesture(gesture):
+                event = 'click'
             if gesture:
-                self.mouse_controller.control_mouse(hand_landmarks, frame_shape, gesture)
+                self.mouse_controller.control_mouse(self.last_landmarks, frame_shape, gesture)
+        else:
+            # 手部離開畫面：清除手勢與捏合狀態並結束進行中的拖曳
+            self.last_landmarks = None
+            self.gesture_detector.reset()
+            self.pinch_detector.reset()
+            self.gesture_matcher.reset()
+            self.template_match = None
+            self.mouse_controller.release_latch()
+            self.mouse_controller.update_gesture(None)
+        control_end = time.perf_counter()
         
-        # 繪製信息文字
-        if self.show_preview:
+        if event is not None:
+            event_latency_ms = (control_end - capture_time) * 1000
+            self.click_latencies.append(event_latency_ms)
+            logger.debug("點擊事件 %s 延遲: %.1f ms", event, event_latency_ms)
+        
+        # 繪製交互區域與信息文字（靜態部分使用快取圖層）
+        if draw_overlays:
             fps = int(1000 / self.frame_process_interval)
-            self.image_processor.draw_info_text(
-                frame, fps, self.frame_rotation, 
-                self.flip_horizontal, self.flip_vertical, gesture
+            self.overlay_compositor.draw_static(
+                frame, CAMERA_AREA_RATIO, CAMERA_VERTICAL_OFFSET, fps,
+                self.frame_rotation, self.flip_horizontal, self.flip_vertical
             )
+            self.overlay_compositor.draw_gesture(frame, gesture)
+        
+        # 記錄本幀的追蹤資訊（只寫入預先配置的環形緩衝區）
+        self.frame_index += 1
+        self.trace.append(
+            self.frame_index, self.last_landmarks is not None,
+            self.gesture_detector.last_finger_mask if self.last_landmarks is not None else 0,
+            gesture,
+            (inference_end - inference_start) * 1000,
+            (control_end - inference_end) * 1000,
+            (time.perf_counter() - frame_start) * 1000,
+            timestamp=current_time / 1000,
+            event=event, event_latency_ms=event_latency_ms
+        )
+        if self.landmark_publisher is not None and landmarks is not NOT_READY:
+            # 推論尚未就緒的影格沒有地標結果，不發布（訂閱端由 seq 的間隔得知）
+            self.landmark_publisher.publish(self.frame_index, current_time / 1000,
+                                            self.last_landmarks, gesture)
+        self.last_event = event
+        if self.session_recorder is not None:
+            self.session_recorder.log_frame(True, self.last_landmarks, gesture, event,
+                                            self.template_match, self.get_settings())
         
         return frame, gesture
 
-    def run(self):
-        """運行 Air Mouse（命令行模式）"""
+    def _publish_rgb(self, frame, timestamp):
+        """將方向調整後的影格轉為 RGB 直接寫入匯流排的空槽位並發布，沒有空槽位時回傳 None"""
+        if self.frame_bus is None or self.frame_bus.frame_shape != frame.shape:
+            # 畫面旋轉造成形狀改變：建立新的匯流排（推論工作行程唯讀附加，不重新啟動）
+            if self.frame_bus is not None:
+                self.frame_bus.close()
+            self.frame_bus = FrameBus(frame.shape, slots=FRAME_BUS_SLOTS)
+        slot = self.frame_bus.acquire()
+        if slot is None:
+            return None
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.frame_bus.buffer(slot))
+        return self.frame_bus.publish(slot, timestamp)
+
+    def latest_frame(self, after_seq=None):
+        """取得匯流排中最新的 RGB 影格引用（用完須 release），沒有新影格時回傳 None"""
+        if self.frame_bus is None:
+            return None
+        return self.frame_bus.latest(after_seq)
+
+    def _detect_landmarks(self, frame):
+        """偵測手部地標（FrameRef 或 RGB 陣列），回傳 (21, 3) 陣列或 None（優先使用獨立推論行程）
+
+        推論工作行程尚未就緒時回傳 NOT_READY。
+        """
+        worker = self.inference_worker
+        if worker is not None and not worker.failed:
+            return worker.process(frame)
+        rgb_frame = frame.array if isinstance(frame, FrameRef) else frame
+        results = self.gesture_detector.process_frame(rgb_frame)
+        if results.multi_hand_landmarks:
+            return landmarks_to_array(results.multi_hand_landmarks[0])
+        return None
+
+    def load_gesture_templates(self, feature_index):
+        """以手勢庫特徵索引作為即時比對範本"""
+        self.gesture_matcher.set_index(feature_index)
+        self.template_match = None
+        logger.info("已載入 %d 個手勢範本", len(feature_index))
+
+    def _update_pinch(self, timestamp, frame_shape):
+        """更新捏合狀態並處理游標鎖定，回傳是否送出了點擊事件"""
+        pinch_event = self.pinch_detector.update(self.last_landmarks, frame_shape, timestamp)
+        if pinch_event == PinchDetector.ARMED:
+            self.mouse_controller.latch_cursor()
+        elif pinch_event == PinchDetector.CLICK:
+            return self.mouse_controller.pinch_click()
+        elif pinch_event == PinchDetector.RELEASED:
+            self.mouse_controller.release_latch()
+        return False
+
+    def get_click_latency_stats(self):
+        """取得最近點擊事件的延遲統計（毫秒），沒有記錄時回傳 None"""
+        if not self.click_latencies:
+            return None
+        latencies = sorted(list(self.click_latencies))
+        return {
+            'count': len(latencies),
+            'mean': sum(latencies) / len(latencies),
+            'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'max': latencies[-1],
+        }
+
+    def dump_trace(self, filepath=None):
+        """匯出每幀追蹤記錄"""
         try:
-            while self.cap.isOpened():
-                success, frame = self.cap.read()
+            path = self.trace.dump(filepath)
+            logger.info("追蹤記錄已匯出: %s (%d 筆)", path, len(self.trace))
+            return path
+        except Exception as e:
+            logger.error("匯出追蹤記錄失敗: %s", e)
+            return None
+
+    def start_session_recording(self, directory=SESSION_DIR, image_format=SESSION_FORMAT):
+        """開始錄製工作階段（原始影格與每幀結果），回傳工作階段目錄；無法建立時拋出 OSError"""
+        recorder = SessionRecorder(directory, image_format)
+        recorder.start(self.get_settings(), frame_rate=self.cap.get(cv2.CAP_PROP_FPS),
+                       pointer_backend=self.mouse_controller._pointer(),
+                       metadata={'inference_worker': self.inference_worker is not None})
+        self.mouse_controller.pointer = recorder.pointer
+        self.session_recorder = recorder
+        return recorder.path
+
+    def pause(self):
+        """暫停處理（放開進行中的拖曳，不再移動滑鼠）"""
+        self.paused = True
+        self.mouse_controller.release_latch()
+        self.mouse_controller.update_gesture(None)
+        self.pinch_detector.reset()
+        self.gesture_detector.reset()
+        if self.session_recorder is not None:
+            self.session_recorder.mark('pause')
+        logger.info("已暫停")
+
+    def resume(self):
+        """恢復處理"""
+        self.paused = False
+        self.last_process_time = 0
+        if self.session_recorder is not None:
+            self.session_recorder.mark('resume')
+        logger.info("已恢復")
+
+    def stop(self):
+        """要求命令行主迴圈結束（可從其他執行緒或訊號處理器呼叫）"""
+        self.running = False
+
+    def get_settings(self):
+        """取得目前的執行參數"""
+        return {
+            'fps': int(round(1000 / self.frame_process_interval)),
+            'preview_fps': int(round(1000 / self.preview_frame_interval)),
+            'rotation': self.frame_rotation,
+            'flip_h': self.flip_horizontal,
+            'flip_v': self.flip_vertical,
+            'jitter_filter': self.mouse_controller.jitter_filter_enabled,
+            'jitter_threshold': self.mouse_controller.min_move_distance,
+            'pinch_click': self.pinch_click_enabled,
+            'paused': self.paused,
+        }
+
+    def apply_settings(self, fps=None, preview_fps=None, rotation=None, flip_h=None, flip_v=None,
+                       jitter_filter=None, jitter_threshold=None, pinch_click=None):
+        """套用執行參數（只修改有提供的項目），回傳套用後的參數；數值不合法時拋出 ValueError"""
+        if rotation is not None and rotation not in (0, 90, 180, 270):
+            raise ValueError(f"不支援的旋轉角度: {rotation}")
+        if jitter_threshold is not None and jitter_threshold < 0:
+            raise ValueError(f"抖動閾值不可為負數: {jitter_threshold}")
+        if fps is not None:
+            self.frame_process_interval = int(1000 / max(10, min(100, int(fps))))
+        if preview_fps is not None:
+            self.set_preview_fps(int(preview_fps))
+        if rotation is not None:
+            self.frame_rotation = rotation
+        if flip_h is not None:
+            self.flip_horizontal = bool(flip_h)
+        if flip_v is not None:
+            self.flip_vertical = bool(flip_v)
+        if jitter_filter is not None:
+            self.mouse_controller.jitter_filter_enabled = bool(jitter_filter)
+        if jitter_threshold is not None:
+            self.mouse_controller.min_move_distance = jitter_threshold
+        if pinch_click is not None:
+            self.pinch_click_enabled = bool(pinch_click)
+            if not self.pinch_click_enabled:
+                self.pinch_detector.reset()
+                self.mouse_controller.release_latch()
+        return self.get_settings()
+
+    def get_stats(self):
+        """取得執行統計（處理幀數、點擊延遲、推論行程、影格匯流排與工作階段錄製）"""
+        uptime = time.perf_counter() - self.start_time
+        stats = {
+            'frames': self.frame_index,
+            'uptime': uptime,
+            'average_fps': self.frame_index / uptime if uptime > 0 else 0.0,
+            'hand_detected': self.last_landmarks is not None,
+            'gesture': self.mouse_controller.active_gesture,
+            'template_match': self.template_match,
+            'click_latency': self.get_click_latency_stats(),
+            'settings': self.get_settings(),
+        }
+        if self.inference_worker is not None:
+            stats['inference_worker'] = self.inference_worker.get_stats()
+        if self.frame_bus is not None:
+            stats['frame_bus'] = self.frame_bus.get_stats()
+        if self.session_recorder is not None:
+            stats['session_recorder'] = self.session_recorder.get_stats()
+        return stats
+
+    def run(self, control_server=None):
+        """運行 Air Mouse（命令行模式）
+
+        只有顯示預覽視窗時才呼叫 cv2.waitKey 讀取按鍵；無預覽時主迴圈不做任何 UI 輪詢，
+        執行參數改由 control_server（ControlServer）在兩幀之間套用。
+        """
+        self.running = True
+        try:
+            while self.running and self.cap.isOpened():
+                if control_server is not None:
+                    control_server.apply_pending()
+                if self.paused:
+                    time.sleep(CONTROL_PAUSED_POLL_INTERVAL)
+                    continue
+
+                success, frame = self.read_frame()
                 if not success:
                     print("無法讀取攝影機畫面")
                     break
-                
-                frame, gesture = self.process_frame(frame)
-                
+
+                frame, gesture = self.process_frame(frame, self.capture_timestamp)
+
                 if self.show_preview:
-                    cv2.imshow('Air Mouse', frame)
-                
-                # 檢測按鍵
-                key = cv2.waitKey(1) & 0xFF
-                
-                # 除錯：顯示按下的按鍵
-                if key != 255:  # 255 表示沒有按鍵
-                    print(f"[DEBUG] 按鍵檢測: key={key}, char='{chr(key) if 32 <= key <= 126 else 'special'}'")
-                
-                if key == 27:  # ESC鍵
-                    break
-                elif key == ord('p') or key == ord('P'):
-                    self.show_preview = not self.show_preview
-                    if not self.show_preview:
-                        cv2.destroyWindow('Air Mouse')
-                    print(f"畫面預覽: {'開啟' if self.show_preview else '關閉'}")
-                elif key == ord('+'):
-                    self.frame_process_interval = max(10, self.frame_process_interval - 5)
-                    print(f"處理頻率: 約 {int(1000/self.frame_process_interval)} FPS")
-                elif key == ord('-'):
-                    self.frame_process_interval = min(100, self.frame_process_interval + 5)
-                    print(f"處理頻率: 約 {int(1000/self.frame_process_interval)} FPS")
-                elif key == ord('r') or key == ord('R'):
-                    self.frame_rotation = (self.frame_rotation + 90) % 360
-                    print(f"畫面旋轉: {self.frame_rotation}度")
-                elif key == ord('h') or key == ord('H'):
-                    self.flip_horizontal = not self.flip_horizontal
-                    print(f"水平翻轉: {'開啟' if self.flip_horizontal else '關閉'}")
-                elif key == ord('v') or key == ord('V'):
-                    self.flip_vertical = not self.flip_vertical
-                    print(f"垂直翻轉: {'開啟' if self.flip_vertical else '關閉'}")
-                elif key == ord('0'):
-                    self.frame_rotation = 0
-                    self.flip_horizontal = False
-                    self.flip_vertical = False
-                    print("已重置畫面方向")
-        
+                    if self.preview_rendered:
+                        cv2.imshow('Air Mouse', frame)
+                    # 檢測按鍵（需要預覽視窗才能收到按鍵）
+                    if not self._handle_key(cv2.waitKey(1) & 0xFF):
+                        break
+
         finally:
+            self.running = False
             self.cleanup()
 
+    def _handle_key(self, key):
+        """處理預覽視窗的按鍵，回傳 False 表示結束"""
+        # 除錯：顯示按下的按鍵
+        if key != 255:  # 255 表示沒有按鍵
+            logger.debug("按鍵檢測: key=%s, char='%s'", key, chr(key) if 32 <= key <= 126 else 'special')
+
+        if key == 27:  # ESC鍵
+            return False
+        elif key == ord('p') or key == ord('P'):
+            # 關閉預覽後不再呼叫 waitKey（沒有視窗也收不到按鍵）
+            self.show_preview = False
+            cv2.destroyWindow('Air Mouse')
+            logger.info("畫面預覽: 關閉")
+        elif key == ord('+'):
+            self.frame_process_interval = max(10, self.frame_process_interval - 5)
+            logger.info(f"處理頻率: 約 {int(1000/self.frame_process_interval)} FPS")
+        elif key == ord('-'):
+            self.frame_process_interval = min(100, self.frame_process_interval + 5)
+            logger.info(f"處理頻率: 約 {int(1000/self.frame_process_interval)} FPS")
+        elif key == ord('r') or key == ord('R'):
+            self.frame_rotation = (self.frame_rotation + 90) % 360
+            logger.info(f"畫面旋轉: {self.frame_rotation}度")
+        elif key == ord('h') or key == ord('H'):
+            self.flip_horizontal = not self.flip_horizontal
+            logger.info(f"水平翻轉: {'開啟' if self.flip_horizontal else '關閉'}")
+        elif key == ord('v') or key == ord('V'):
+            self.flip_vertical = not self.flip_vertical
+            logger.info(f"垂直翻轉: {'開啟' if self.flip_vertical else '關閉'}")
+        elif key == ord('0'):
+            self.frame_rotation = 0
+            self.flip_horizontal = False
+            self.flip_vertical = False
+            logger.info("已重置畫面方向")
+        elif key == ord('t') or key == ord('T'):
+            self.dump_trace()
+        return True
+
     def cleanup(self):
         """清理資源"""
+        latency_stats = self.get_click_latency_stats() if hasattr(self, 'click_latencies') else None
+        if latency_stats:
+            logger.info("點擊延遲: 平均 %.1f ms, p95 %.1f ms, 最大 %.1f ms (%d 次)",
+                        latency_stats['mean'], latency_stats['p95'],
+                        latency_stats['max'], latency_stats['count'])
         if hasattr(self, 'cap') and self.cap.isOpened():
             self.cap.release()
         cv2.destroyAllWindows()
+        if getattr(self, 'inference_worker', None) is not None:
+            stats = self.inference_worker.get_stats()
+            logger.info("獨立行程推論: %d 幀, 推論 %.1f ms, 往返 %.1f ms, 重新啟動 %d 次",
+                        stats['frames'], stats['inference_ms'], stats['roundtrip_ms'],
+                        stats['restarts'])
+            self.inference_worker.close()
+        if getattr(self, 'frame_bus', None) is not None:
+            stats = self.frame_bus.get_stats()
+            logger.info("影格匯流排: 發布 %d 幀, 丟棄 %d 幀, 最高佔用 %d/%d 槽位",
+                        stats['published'], stats['dropped'], stats['peak'], stats['slots'])
+            if self.frame_ref is not None:
+                self.frame_ref.release()
+                self.frame_ref = None
+            self.frame_bus.close()
+            self.frame_bus = None
+        if getattr(self, 'landmark_publisher', None) is not None:
+            stats = self.landmark_publisher.get_stats()
+            logger.info("地標串流: 送出 %d 筆, 訂閱端緩衝區已滿丟棄 %d 筆",
+                        stats['sent'], stats['dropped'])
+            self.landmark_publisher.close()
+            self.landmark_publisher = None
+        if getattr(self, 'session_recorder', None) is not None:
+            self.session_recorder.close()
+            stats = self.session_recorder.get_stats()
+            logger.info("工作階段錄製: %d 幀（寫入 %d 幀, 丟棄 %d 幀, 編碼 %.1f ms/幀）: %s",
+                        stats['frames'], stats['recorded'], stats['dropped'],
+                        stats['encode_ms'], stats['path'])
+            self.session_recorder = None
         if hasattr(self, 'gesture_detector'):
             self.gesture_detector.close()
         if hasattr(self, 'mouse_controller'):
             self.mouse_controller.cleanup()
         # 清理按鍵監聽器
         keyboard.unhook_all()
-        print("[DEBUG] 已清理按鍵監聽器")
+        logger.debug("已清理按鍵監聽器")
     
     def manual_click(self):
         """手動點擊（用於 GUI 按鈕）"""
@@ -2,6 +2,9 @@
 Air Mouse 配置和常數
 """
 import os
+import sys
+import tempfile
+from collections import namedtuple
 
 # 設定 GPU 加速環境變數
 os.environ['TF_FORCE_GPU_ALLOW_GROWTH'] = 'true'
@@ -21,13 +24,14 @@ def setup_x11_auth():
             os.environ['DISPLAY'] = ':0'
             
     except Exception as e:
-        print(f"警告: 無法設置 X11 認證: {e}")
+        print(f"警告: 無法設置 X11 認證: {e}", file=sys.stderr)
 
 # 初始化 X11 認證
 setup_x11_auth()
 
 # 延遲導入 pyautogui 並添加錯誤處理
 _pyautogui = None
+_MockPoint = namedtuple('Point', 'x y')
 _screen_width = 1920  # 默認寬度
 _screen_height = 1080  # 默認高度
 
@@ -50,8 +54,8 @@ def get_pyautogui():
             _pyautogui = pyautogui
             
         except Exception as e:
-            print(f"錯誤: 無法初始化 pyautogui: {e}")
-            print("請確保您在支援 GUI 的環境中運行此程序")
+            print(f"錯誤: 無法初始化 pyautogui: {e}", file=sys.stderr)
+            print("請確保您在支援 GUI 的環境中運行此程序", file=sys.stderr)
             # 創建一個模擬對象以防止程序崩潰
             class MockPyAutoGUI:
                 FAILSAFE = False
@@ -67,9 +71,21 @@ def get_pyautogui():
                 def moveTo(*args, **kwargs):
                     pass
                 
+                @staticmethod
+                def position():
+                    return _MockPoint(_screen_width // 2, _screen_height // 2)
+                
                 @staticmethod
                 def click(*args, **kwargs):
                     pass
+                
+                @staticmethod
+                def mouseDown(*args, **kwargs):
+                    pass
+                
+                @staticmethod
+                def mouseUp(*args, **kwargs):
+                    pass
                     
             _pyautogui = MockPyAutoGUI()
     
@@ -111,8 +127,65 @@ CAMERA_VERTICAL_OFFSET = -0.1  # 框向上偏移 10%
 
 # 手勢檢測參數
 FINGER_BENT_THRESHOLD = 0.05  # 降低閾值，讓手指接近更容易被識別
-CLICK_TIME_THRESHOLD = 0.1    # 縮短點擊時間，讓點擊更靈敏
+# 手指伸直分數 =（指尖到基準點距離 − 關節到基準點距離）/ 手掌大小，與旋轉及縮放無關
+# 分數以 FINGER_BENT_THRESHOLD 為中心，加上各手指偏移（拇指, 食指, 中指, 無名指, 小指）
+# 高於「中心 + 遲滯」才判定伸直，低於「中心 − 遲滯」才判定彎曲
+FINGER_EXTEND_OFFSETS = (0.0, 0.0, 0.0, 0.0, 0.0)  # 可依手指個別微調
+FINGER_EXTEND_HYSTERESIS = 0.05
+CLICK_TIME_THRESHOLD = 0.1    # 縮短點擊時間，讓點擊更靈敏（兩次點擊的最短間隔，秒）
+DRAG_HOLD_TIME = 0.3          # 拖曳手勢需持續此秒數才按下左鍵（短暫經過不會誤觸拖曳）
 GESTURE_HISTORY_LENGTH = 3    # 減少歷史長度，讓手勢反應更快
+GESTURE_ENTER_COUNT = 2       # 候選手勢在歷史中至少出現此次數才切換
+GESTURE_EXIT_COUNT = 1        # 目前手勢在歷史中少於此次數才離開
+
+# 捏合點擊參數（拇指與食指指尖 3D 距離，以手掌大小正規化）
+PINCH_CLICK_ENABLED = True
+PINCH_ARM_THRESHOLD = 0.5       # 距離低於此值開始捏合：鎖定游標位置
+PINCH_CLOSE_THRESHOLD = 0.25    # 距離低於此值視為捏合完成：觸發點擊
+PINCH_RELEASE_THRESHOLD = 0.6   # 距離高於此值視為放開：解除鎖定
+PINCH_CLOSING_VELOCITY = 2.5    # 閉合速度（手掌大小/秒）超過此值時提前觸發點擊
+CLICK_LATENCY_HISTORY = 100     # 點擊延遲統計保留的筆數
+
+# 錄製手勢的即時範本比對（DTW）
+GESTURE_MATCH_WINDOW = 30        # 範本與即時視窗重新取樣的點數（各自依持續時間取樣）
+GESTURE_MATCH_BAND = 0.1         # Sakoe-Chiba 帶寬（視窗長度的比例）
+GESTURE_MATCH_THRESHOLD = 0.5    # 平均每幀 DTW 距離低於此值才視為匹配
+GESTURE_MATCH_INTERVAL = 3       # 每隔幾個處理影格比對一次
+GESTURE_MATCH_DURATION_STEP = 0.1  # 範本持續時間的分組間隔（秒，同組共用一個即時視窗特徵）
+GESTURE_MATCH_BATCH = 64           # 每批同時計算 DTW 的候選範本數
+GESTURE_MATCH_ABANDON_INTERVAL = 4 # DTW 每隔幾條反對角線檢查一次提前放棄
+GESTURE_FEATURE_LENGTH = GESTURE_MATCH_WINDOW  # 手勢庫特徵索引的重新取樣幀數
+GESTURE_SIMILARITY_BLOCK_ELEMENTS = 1 << 24    # 全配對距離每個區塊最多的元素數（float32 約 64MB）
+
+# 手勢儲存格式（'binary' 為 .gesture 二進位格式，'json' 為舊版格式；兩者皆可讀取）
+GESTURE_STORAGE_FORMAT = 'binary'
+GESTURE_QUANTIZE = False  # 以 int16 量化儲存（檔案大小減半，誤差小於 1e-4）
+GESTURE_CACHE_SIZE = 64   # 已載入手勢資料的 LRU 快取數量
+
+# 串流錄製：每幀附加寫入 .gesture.part 檔案，記憶體用量與錄製長度無關
+RECORDING_CHUNK_FRAMES = 30    # 每累積幾幀寫出一次（崩潰時最多遺失一個區塊）
+RECORDING_FSYNC_CHUNKS = False # 每個區塊都 fsync（可抵抗斷電，但寫入延遲較高）
+RECORDING_MAX_TIME = None      # 最大錄製時間（秒），None 表示不限制
+
+# 由錄製手勢訓練的靜態姿勢分類器（kNN；以 python -m tools.train_pose_classifier 訓練）
+# 辨識到已訓練的姿勢時優先於手勢對照表；姿勢名稱與對照表相同時可取代內建手勢
+POSE_CLASSIFIER_ENABLED = True
+POSE_MODEL_PATH = os.path.join('gestures', '_pose_classifier.npz')
+POSE_KNN_K = 5
+POSE_REJECT_DISTANCE = 0.05        # 最近鄰的平均每地標平方距離（手掌大小為單位）超過此值視為未知
+POSE_MAX_SAMPLES_PER_CLASS = 300   # 每個姿勢保留的訓練樣本數上限（限制推論時間）
+# 沒有標記種類的舊錄製：手形變化與手腕移動都低於以下值才視為靜態姿勢（不是動態手勢範本）
+POSE_STATIC_MAX_SPREAD = 0.05      # 各幀特徵與平均特徵的平均每地標平方距離
+POSE_STATIC_MAX_TRAVEL = 0.5       # 手腕位置的標準差（手掌大小為單位）
+
+# 手勢對照表：手指狀態 (拇指, 食指, 中指, 無名指, 小指) -> 手勢名稱
+# 未列出的組合視為無手勢，分類器會展開為 32 項查表
+GESTURE_TABLE = {
+    (0, 1, 0, 0, 0): "move",         # 只伸出食指：移動
+    (0, 1, 1, 0, 0): "left click",   # 食指 + 中指：左鍵點擊
+    (0, 1, 1, 1, 0): "right click",  # 食指 + 中指 + 無名指：右鍵點擊
+    (0, 1, 0, 0, 1): "drag",         # 食指 + 小指：按住左鍵拖曳（拇指+食指是常見的放鬆姿勢，容易誤觸）
+}
 
 # 效能參數
 DEFAULT_FPS = 60  # 提高到60FPS
@@ -120,24 +193,67 @@ MIN_FPS = 30
 MAX_FPS = 120
 DEFAULT_FRAME_PROCESS_INTERVAL = 16  # 約60FPS (1000/60≈16)
 
+# 預覽參數（預覽頻率獨立於控制頻率，非預覽影格不繪製任何疊加圖層）
+DEFAULT_PREVIEW_FPS = 30
+MIN_PREVIEW_FPS = 5
+MAX_PREVIEW_FPS = 60
+
+# 獨立行程推論（GUI 模式：MediaPipe 在另一個行程執行，不與 Tk 搶 GIL）
+INFERENCE_WORKER_ENABLED = True
+INFERENCE_RING_SLOTS = 2              # 同時進行中的推論上限
+INFERENCE_WORKER_TIMEOUT = 1.0        # 單幀推論逾時（秒），逾時視為工作行程卡住並重新啟動
+INFERENCE_WORKER_START_TIMEOUT = 30.0 # 工作行程載入模型的逾時（秒）
+INFERENCE_WORKER_MAX_RESTARTS = 5     # 超過此重啟次數後改回行程內偵測
+
+# 共享記憶體影格匯流排（擷取端寫入一次 RGB 影格，推論行程與錄製直接讀取視圖）
+FRAME_BUS_ENABLED = True
+FRAME_BUS_SLOTS = 4  # 槽位數（最新影格 + 寫入中 + 推論與錄製持有中的影格）
+
+# 背景模式控制通訊端（Unix 網域通訊端，每行一個 JSON 指令）
+CONTROL_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'air-mouse.sock')
+CONTROL_COMMAND_TIMEOUT = 2.0        # 等待主迴圈套用指令的逾時（秒）
+CONTROL_PAUSED_POLL_INTERVAL = 0.05  # 暫停時主迴圈檢查指令的間隔（秒）
+
+# 手部地標本機串流（Unix 網域資料包通訊端，每幀一筆固定大小的二進位記錄）
+LANDMARK_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'air-mouse-landmarks.sock')
+LANDMARK_SUBSCRIBER_TIMEOUT = 5.0  # 訂閱端超過此秒數未重送訂閱要求即移除
+LANDMARK_PUBLISH_QUEUE = 8         # 傳送執行緒落後時最多保留的記錄數（超過時丟棄最舊的）
+
+# 工作階段錄製（原始影格 + 每幀地標/手勢/滑鼠事件，用於重現現場問題）
+SESSION_DIR = "sessions"
+SESSION_FORMAT = 'video'     # 'video'：單一影片檔；'images'：PNG 影像序列（兩者預設皆無損，重播結果與現場一致）
+SESSION_FOURCC = 'FFV1'     # video 格式的編碼（FFV1 無損；'MJPG' 檔案小但有損，重播的地標會略有差異）
+SESSION_QUEUE_SIZE = 16      # 等待編碼的影格上限（預先配置的緩衝區數，滿時丟棄影格並計數）
+SESSION_FLUSH_INTERVAL = 30  # 每寫入幾行事件記錄就 flush 一次（程式崩潰時最多遺失這些行）
+SESSION_ENCODER_NICE = 10    # 編碼執行緒的 nice 值（CPU 不足時讓出給主迴圈，改為丟棄影格）
+SESSION_PNG_COMPRESSION = 1  # images 格式的 PNG 壓縮等級（0-9，越高越慢）
+
 # 平滑參數（提高響應速度）
 DEFAULT_SMOOTHING_FACTOR = 0.8  # 提高平滑係數，減少延遲
 MIN_SMOOTHING = 0.5
 MAX_SMOOTHING = 1.0
 
+# 日誌與追蹤設定（熱迴圈只在 DEBUG 等級輸出，預設不寫出任何內容）
+LOG_LEVEL = 'INFO'
+LOG_RATE_LIMIT_SECONDS = 1.0  # 同一行日誌的最短輸出間隔
+TRACE_BUFFER_SIZE = 1024      # 每幀追蹤記錄的環形緩衝區大小（60FPS 約 17 秒）
+TRACE_DUMP_DIR = "traces"
+
 # UI 設定
 UI_WINDOW_SIZE = "800x600"
 UI_BG_COLOR = '#2b2b2b'
 VIDEO_DISPLAY_SIZE = (480, 360)
+VIDEO_DISPLAY_MAX_FPS = 30  # 畫面顯示的最高更新頻率（超過的影格會被丟棄）
+VIDEO_THREAD_JOIN_TIMEOUT = 2.0  # 關閉視窗時等待視頻執行緒結束的逾時（秒，需涵蓋一次推論）
 
 # 在模組載入時顯示螢幕解析度
 def print_screen_info():
-    """顯示螢幕解析度信息"""
+    """顯示螢幕解析度信息（寫到 stderr，不混入工具的 JSON 輸出）"""
     try:
         width, height = get_screen_size()
-        print(f"螢幕解析度: {width} x {height}")
+        print(f"螢幕解析度: {width} x {height}", file=sys.stderr)
     except Exception as e:
-        print(f"無法獲取螢幕解析度: {e}")
+        print(f"無法獲取螢幕解析度: {e}", file=sys.stderr)
 
 # 延遲執行螢幕信息顯示
 if __name__ != "__main__":
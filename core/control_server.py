@@ -0,0 +1,154 @@
+"""
+本機控制通訊端模組
+"""
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+
+from .config import CONTROL_SOCKET_PATH, CONTROL_COMMAND_TIMEOUT
+from .logger import get_logger
+
+logger = get_logger('control_server')
+
+
+def _json_default(value):
+    """JSON 無法直接序列化的值（numpy 純量等）"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    """每個連線一個執行緒：逐行讀取 JSON 指令並逐行回覆"""
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("指令必須是 JSON 物件")
+                response = self.server.control.handle_request(request)
+            except Exception as e:
+                response = {'ok': False, 'error': str(e)}
+            reply = json.dumps(response, ensure_ascii=False, default=_json_default)
+            self.wfile.write((reply + '\n').encode('utf-8'))
+
+
+class ControlServer:
+    """以 Unix 網域通訊端控制命令行模式的 AirMouse
+
+    通訊協定為每行一個 JSON 物件，例如 {"cmd": "set", "fps": 60, "rotation": 90}，
+    每個指令回覆一行 {"ok": true, ...} 或 {"ok": false, "error": "..."}。
+    指令放進佇列，由主迴圈在兩幀之間以 apply_pending() 執行（與處理影格的狀態不會
+    同時被兩個執行緒修改，也不需加鎖），連線執行緒等待執行完成後才回覆；
+    主迴圈只做一次不阻塞的佇列檢查。
+    """
+
+    COMMANDS = ('stats', 'settings', 'set', 'pause', 'resume', 'dump_trace', 'stop')
+
+    def __init__(self, air_mouse, path=CONTROL_SOCKET_PATH, timeout=CONTROL_COMMAND_TIMEOUT):
+        self.air_mouse = air_mouse
+        self.path = path
+        self.timeout = timeout
+        self._pending = queue.SimpleQueue()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """建立通訊端並在背景執行緒接受連線"""
+        if not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+            raise OSError("此平台不支援 Unix 網域通訊端")
+        self._remove_stale_socket()
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, _ControlHandler)
+        self._server.daemon_threads = True
+        self._server.control = self
+        os.chmod(self.path, 0o600)  # 只允許同一使用者控制
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='control-server', daemon=True)
+        self._thread.start()
+        logger.info("控制通訊端: %s", self.path)
+        return self
+
+    def _remove_stale_socket(self):
+        """移除上次異常結束留下的通訊端檔案（仍有程式在監聽時拋出 OSError）"""
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise OSError(f"控制通訊端已在使用中: {self.path}")
+
+    def close(self):
+        """停止接受連線並刪除通訊端檔案"""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    # ===== 指令處理 =====
+
+    def handle_request(self, request):
+        """處理一個指令（在連線執行緒呼叫），回傳回覆內容"""
+        command = request.get('cmd')
+        if command not in self.COMMANDS:
+            return {'ok': False, 'error': f"未知的指令: {command}（可用: {', '.join(self.COMMANDS)}）"}
+
+        air_mouse = self.air_mouse
+        if command == 'stop':
+            # 只設定旗標（主迴圈可能正在等待攝影機），不等待主迴圈
+            air_mouse.stop()
+            return {'ok': True}
+        if command == 'stats':
+            return self._call_in_loop(lambda: {'stats': air_mouse.get_stats()})
+        if command == 'dump_trace':
+            return self._call_in_loop(lambda: {'path': air_mouse.dump_trace()})
+
+        def update():
+            if command == 'set':
+                return {'settings': air_mouse.apply_settings(**params)}
+            if command == 'pause':
+                air_mouse.pause()
+            elif command == 'resume':
+                air_mouse.resume()
+            return {'settings': air_mouse.get_settings()}
+
+        params = {key: value for key, value in request.items() if key != 'cmd'}
+        return self._call_in_loop(update)
+
+    def _call_in_loop(self, func):
+        """將指令交給主迴圈執行並等待結果（主迴圈沒有回應時回覆逾時）"""
+        done = threading.Event()
+        result = {}
+        self._pending.put((func, done, result))
+        if not done.wait(self.timeout):
+            return {'ok': False, 'error': "主迴圈沒有回應"}
+        return result
+
+    def apply_pending(self):
+        """套用所有待處理的指令（在主迴圈呼叫，沒有指令時立即返回）"""
+        while True:
+            try:
+                func, done, result = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                result.update(ok=True, **func())
+            except Exception as e:
+                result.update(ok=False, error=str(e))
+            done.set()
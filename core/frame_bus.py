@@ -0,0 +1,265 @@
+"""
+共享記憶體影格匯流排模組
+"""
+import multiprocessing as mp_process
+from contextlib import nullcontext
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .config import FRAME_BUS_SLOTS
+from .logger import get_logger
+
+logger = get_logger('frame_bus')
+
+# 每個槽位的控制資訊（與影格放在同一塊共享記憶體的開頭，所有行程看到同一份）
+SLOT_DTYPE = np.dtype([('refs', '<i4'), ('seq', '<i8'), ('timestamp', '<f8')])
+# 全域計數器：已發布影格數、沒有空槽而丟棄的影格數、最高同時佔用槽位數、最新影格槽位
+PUBLISHED, DROPPED, PEAK, LATEST = range(4)
+COUNTER_COUNT = 4
+CONTROL_ALIGN = 64
+
+
+class FrameRef:
+    """匯流排中一個影格的引用
+
+    持有該槽位的一個參考計數，array 為唯讀視圖（不複製）；用完必須呼叫 release()
+    （或以 with 使用），所有引用都釋放後槽位才會被重新寫入。
+    """
+
+    __slots__ = ('bus', 'slot', 'seq', 'timestamp', 'array')
+
+    def __init__(self, bus, slot, seq, timestamp):
+        self.bus = bus
+        self.slot = slot
+        self.seq = seq
+        self.timestamp = timestamp
+        self.array = bus.view(slot)
+
+    def retain(self):
+        """增加一個參考並回傳新的引用（交給另一個執行緒時使用）"""
+        self.bus.retain(self.slot)
+        return FrameRef(self.bus, self.slot, self.seq, self.timestamp)
+
+    def detach(self):
+        """放棄此引用但不釋放參考，回傳 (槽位, 序號)；由另一個行程以 FrameBus.adopt() 接手"""
+        self.array = None
+        return self.slot, self.seq
+
+    def release(self):
+        """釋放參考（重複呼叫無作用）"""
+        if self.array is not None:
+            self.array = None
+            self.bus.release(self.slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class FrameBus:
+    """以參考計數管理的共享記憶體影格槽位池
+
+    擷取端以 acquire() 取得空槽位、直接寫入 buffer(slot) 後 publish()；
+    推論、錄製等讀取端透過 FrameRef 取得唯讀視圖，不複製影格。
+    所有讀取端釋放後槽位自動回收；沒有空槽位時擷取端的影格記為丟棄，不會等待讀取端。
+    匯流排本身對最新影格保留一個參考，latest() 隨時可取得最新一幀。
+
+    參考計數與統計放在同一塊共享記憶體中，以 multiprocessing 鎖保護，
+    因此可跨執行緒使用；以 Process 參數傳給子行程時會自動附加到同一塊記憶體，
+    子行程可讀取視圖，或以 adopt() 接手父行程交出的參考。
+    """
+
+    def __init__(self, frame_shape, slots=FRAME_BUS_SLOTS, dtype=np.uint8):
+        self.frame_shape = tuple(frame_shape)
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+        self._lock = mp_process.get_context('spawn').Lock()
+        frame_bytes = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=self._control_size(slots) + frame_bytes * slots)
+        self._owner = True
+        self._map()
+        self._slot_info['refs'] = 0
+        self._slot_info['seq'] = -1
+        self._slot_info['timestamp'] = 0.0
+        self._counters[:] = 0
+        self._counters[LATEST] = -1
+
+    @staticmethod
+    def _control_size(slots):
+        """控制區大小（對齊到 CONTROL_ALIGN，讓影格資料從對齊的位址開始）"""
+        size = SLOT_DTYPE.itemsize * slots + 8 * COUNTER_COUNT
+        return -(-size // CONTROL_ALIGN) * CONTROL_ALIGN
+
+    def _map(self):
+        """建立控制區與影格區的 numpy 視圖"""
+        buffer = self._shm.buf
+        self._slot_info = np.ndarray(self.slots, dtype=SLOT_DTYPE, buffer=buffer)
+        self._counters = np.ndarray(COUNTER_COUNT, dtype='<i8', buffer=buffer,
+                                    offset=SLOT_DTYPE.itemsize * self.slots)
+        self._frames = np.ndarray((self.slots,) + self.frame_shape, dtype=self.dtype,
+                                  buffer=buffer, offset=self._control_size(self.slots))
+        self._refs = self._slot_info['refs']
+        self._next = 0
+        self._closed = False
+
+    def __getstate__(self):
+        # 只傳送共享記憶體名稱與鎖（鎖只能在建立子行程時傳遞）
+        return {
+            'name': self._shm.name,
+            'frame_shape': self.frame_shape,
+            'slots': self.slots,
+            'dtype': self.dtype.str,
+            'lock': self._lock,
+        }
+
+    def __setstate__(self, state):
+        self.frame_shape = tuple(state['frame_shape'])
+        self.slots = state['slots']
+        self.dtype = np.dtype(state['dtype'])
+        # 唯讀附加時沒有鎖，只能使用 view()
+        self._lock = state['lock'] or nullcontext()
+        self._shm = shared_memory.SharedMemory(name=state['name'])
+        self._owner = False
+        self._map()
+
+    def reader_state(self):
+        """唯讀附加所需的資訊（不含鎖，可在子行程執行中透過 Pipe 傳送）"""
+        state = self.__getstate__()
+        state['lock'] = None
+        return state
+
+    @classmethod
+    def attach_reader(cls, state):
+        """以 reader_state() 的資訊唯讀附加到既有的匯流排（只能使用 view()，不可改變參考計數）"""
+        bus = cls.__new__(cls)
+        bus.__setstate__(state)
+        return bus
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    # ===== 寫入端 =====
+
+    def acquire(self):
+        """取得一個空槽位（持有寫入者的參考），沒有空槽位時記為丟棄並回傳 None"""
+        with self._lock:
+            for offset in range(self.slots):
+                slot = (self._next + offset) % self.slots
+                if self._refs[slot] == 0:
+                    self._refs[slot] = 1
+                    self._next = slot + 1
+                    occupied = int(np.count_nonzero(self._refs))
+                    if occupied > self._counters[PEAK]:
+                        self._counters[PEAK] = occupied
+                    return slot
+            self._counters[DROPPED] += 1
+        return None
+
+    def buffer(self, slot):
+        """取得可寫入的槽位視圖（只有持有寫入者參考的擷取端可以使用）"""
+        return self._frames[slot]
+
+    def publish(self, slot, timestamp=0.0):
+        """發布寫好的槽位成為最新影格，回傳持有寫入者參考的 FrameRef"""
+        with self._lock:
+            seq = int(self._counters[PUBLISHED])
+            self._counters[PUBLISHED] += 1
+            self._slot_info['seq'][slot] = seq
+            self._slot_info['timestamp'][slot] = timestamp
+            # 匯流排改為保留新的最新影格，釋放前一幀
+            self._refs[slot] += 1
+            previous = int(self._counters[LATEST])
+            if previous >= 0:
+                self._refs[previous] -= 1
+            self._counters[LATEST] = slot
+        return FrameRef(self, slot, seq, timestamp)
+
+    # ===== 讀取端 =====
+
+    def latest(self, after_seq=None):
+        """取得最新影格的引用；沒有影格或序號不比 after_seq 新時回傳 None"""
+        with self._lock:
+            slot = int(self._counters[LATEST])
+            if slot < 0:
+                return None
+            seq = int(self._slot_info['seq'][slot])
+            if after_seq is not None and seq <= after_seq:
+                return None
+            self._refs[slot] += 1
+            timestamp = float(self._slot_info['timestamp'][slot])
+        return FrameRef(self, slot, seq, timestamp)
+
+    def adopt(self, token):
+        """接手 FrameRef.detach() 交出的參考（不增加計數），回傳 FrameRef"""
+        slot, seq = token
+        with self._lock:
+            if self._refs[slot] <= 0 or self._slot_info['seq'][slot] != seq:
+                raise ValueError(f"槽位 {slot} 已不是影格 {seq}")
+            timestamp = float(self._slot_info['timestamp'][slot])
+        return FrameRef(self, slot, seq, timestamp)
+
+    def view(self, slot):
+        """取得槽位的唯讀視圖（呼叫端須持有參考，或由持有參考的行程保證內容不變）"""
+        frame = self._frames[slot].view()
+        frame.flags.writeable = False
+        return frame
+
+    def retain(self, slot):
+        """增加槽位的參考計數"""
+        with self._lock:
+            self._refs[slot] += 1
+
+    def release(self, slot):
+        """減少槽位的參考計數（匯流排已關閉時不做任何事）"""
+        with self._lock:
+            if self._closed:
+                return
+            if self._refs[slot] <= 0:
+                raise ValueError(f"槽位 {slot} 沒有可釋放的參考")
+            self._refs[slot] -= 1
+
+    # ===== 統計與清理 =====
+
+    def get_stats(self):
+        """取得佔用與丟棄統計（關閉後為最後一次的數值）"""
+        with self._lock:
+            if self._closed:
+                return dict(self._last_stats)
+            occupied = int(np.count_nonzero(self._refs))
+            published = int(self._counters[PUBLISHED])
+            dropped = int(self._counters[DROPPED])
+            peak = int(self._counters[PEAK])
+        attempts = published + dropped
+        self._last_stats = {
+            'slots': self.slots,
+            'occupied': occupied,
+            'occupancy': occupied / self.slots,
+            'peak': peak,
+            'published': published,
+            'dropped': dropped,
+            'drop_rate': dropped / attempts if attempts else 0.0,
+        }
+        return dict(self._last_stats)
+
+    def close(self):
+        """中斷與共享記憶體的連結，建立者同時刪除共享記憶體
+
+        其他執行緒仍持有視圖時，對應的記憶體在視圖釋放後才由垃圾回收解除對應。
+        """
+        if self._closed:
+            return
+        self.get_stats()
+        with self._lock:
+            self._closed = True
+            self._slot_info = self._counters = self._frames = self._refs = None
+        try:
+            self._shm.close()
+        except BufferError:
+            logger.debug("影格匯流排 %s 仍有視圖存在，延後解除對應", self._shm.name)
+        if self._owner:
+            self._shm.unlink()
@@ -0,0 +1,250 @@
+"""
+手勢庫目錄索引與快取模組
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .config import GESTURE_CACHE_SIZE
+from .gesture_storage import CATALOG_FILENAME, is_gesture_file, atomic_write
+from .logger import get_logger
+
+logger = get_logger('gesture_catalog')
+
+CATALOG_VERSION = 1
+
+
+def landmarks_checksum(landmarks):
+    """地標資料的檢查碼（相同內容的手勢有相同檢查碼）"""
+    data = np.ascontiguousarray(landmarks, dtype=np.float32)
+    return hashlib.blake2b(data.tobytes(), digest_size=8).hexdigest()
+
+
+class GestureCatalog:
+    """手勢庫目錄
+
+    在儲存目錄中維護 _catalog.json，記錄每個手勢檔案的名稱、幀數、持續時間、
+    錄製時間、檔案大小、修改時間與資料檢查碼。列表與篩選只讀取目錄，
+    不開啟手勢檔案；儲存與刪除時增量更新，啟動時只以 os.scandir 比對
+    大小與修改時間，重新讀取有變動的檔案。
+
+    另外以 OrderedDict 實作已載入 GestureData 的 LRU 快取，
+    取用時以檔案的修改時間與大小驗證，檔案被外部修改時自動重新載入。
+
+    寫出目錄檔案時只在鎖內複製記錄，序列化與寫檔不持有鎖（list() 等查詢不被阻塞）；
+    每次變動遞增版本號，較舊的快照不會覆蓋已寫出的較新版本。
+    """
+
+    def __init__(self, save_dir, loader, cache_size=GESTURE_CACHE_SIZE, sync=True):
+        self.save_dir = save_dir
+        self.loader = loader  # filepath -> GestureData 或 None
+        self.cache_size = cache_size
+        self.path = os.path.join(save_dir, CATALOG_FILENAME)
+        self.entries = {}
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()  # 依序寫出目錄檔案
+        self._generation = 0        # 記錄變動的版本號
+        self._saved_generation = 0  # 已寫入檔案的版本號
+
+        # 統計資訊
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self._load()
+        if sync:
+            self.sync()
+
+    def _load(self):
+        """讀取目錄檔案（不存在或損毀時從空目錄開始）"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CATALOG_VERSION:
+                self.entries = data.get('entries', {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("手勢目錄損毀，將重新建立: %s", e)
+
+    def _changed(self):
+        """記錄已變動（須持有 self._lock，之後在鎖外呼叫 save()）"""
+        self._generation += 1
+
+    def save(self):
+        """寫出目錄檔案（先寫暫存檔再取代，避免寫到一半損毀）
+
+        記錄只在鎖內淺複製（每筆記錄整筆替換、不原地修改），序列化與寫檔在鎖外進行；
+        已有較新版本寫出時略過。
+        """
+        with self._lock:
+            generation = self._generation
+            entries = dict(self.entries)
+        with self._save_lock:
+            if generation <= self._saved_generation and os.path.exists(self.path):
+                return
+            data = {'version': CATALOG_VERSION, 'entries': entries}
+            with atomic_write(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            self._saved_generation = generation
+
+    def sync(self):
+        """比對儲存目錄與目錄檔案，只重新讀取新增或變動的檔案，回傳是否有變動
+
+        掃描與載入檔案時不持有鎖（list() 等查詢不會被阻塞），
+        完成後才在鎖內套用結果；期間被 add/remove 更新的記錄保持不變。
+        """
+        with self._lock:
+            known = dict(self.entries)
+
+        present = set()
+        loaded = {}
+        try:
+            scanned = [entry for entry in os.scandir(self.save_dir)
+                       if entry.is_file() and is_gesture_file(entry.name)]
+        except FileNotFoundError:
+            scanned = []
+
+        for dir_entry in scanned:
+            present.add(dir_entry.name)
+            stat = dir_entry.stat()
+            entry = known.get(dir_entry.name)
+            if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                continue
+            gesture_data = self.loader(dir_entry.path)
+            if gesture_data is None:
+                continue
+            loaded[dir_entry.name] = self._make_entry(gesture_data, stat)
+
+        with self._lock:
+            changed = False
+            for filename, entry in loaded.items():
+                if self.entries.get(filename) is known.get(filename):
+                    self.entries[filename] = entry
+                    changed = True
+
+            for filename, entry in known.items():
+                if filename not in present and self.entries.get(filename) is entry:
+                    del self.entries[filename]
+                    self._cache.pop(filename, None)
+                    changed = True
+
+            if changed:
+                self._changed()
+                logger.debug("手勢目錄已同步: %d 個手勢", len(self.entries))
+        if changed:
+            self.save()
+        return changed
+
+    @staticmethod
+    def _make_entry(gesture_data, stat):
+        """建立一筆目錄記錄"""
+        return {
+            'name': gesture_data.name,
+            'frame_count': gesture_data.frame_count,
+            'duration': gesture_data.duration,
+            'timestamp': gesture_data.timestamp,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'checksum': landmarks_checksum(gesture_data.landmarks),
+        }
+
+    def add(self, filename, gesture_data):
+        """記錄新儲存的手勢並放入快取"""
+        with self._lock:
+            stat = os.stat(os.path.join(self.save_dir, filename))
+            self.entries[filename] = self._make_entry(gesture_data, stat)
+            self._put_cache(filename, stat, gesture_data)
+            self._changed()
+        self.save()
+
+    def add_summary(self, filename, summary):
+        """以已知的摘要（name, frame_count, duration, timestamp, checksum）記錄新手勢，不載入檔案"""
+        with self._lock:
+            stat = os.stat(os.path.join(self.save_dir, filename))
+            self.entries[filename] = dict(summary, size=stat.st_size, mtime=stat.st_mtime_ns)
+            self._cache.pop(filename, None)
+            self._changed()
+        self.save()
+
+    def remove(self, filename):
+        """移除已刪除的手勢"""
+        with self._lock:
+            self._cache.pop(filename, None)
+            removed = self.entries.pop(filename, None) is not None
+            if removed:
+                self._changed()
+        if removed:
+            self.save()
+
+    def list(self, filter_text=''):
+        """依檔名排序列出手勢檔案，可依名稱或檔名篩選（不分大小寫）"""
+        with self._lock:
+            filter_text = filter_text.strip().lower()
+            if not filter_text:
+                return sorted(self.entries)
+            return sorted(filename for filename, entry in self.entries.items()
+                          if filter_text in entry['name'].lower() or filter_text in filename.lower())
+
+    def get_entry(self, filename):
+        """取得目錄記錄（不載入手勢資料）"""
+        with self._lock:
+            return self.entries.get(filename)
+
+    def get(self, filename):
+        """取得手勢資料（LRU 快取，以修改時間與大小驗證）"""
+        filepath = os.path.join(self.save_dir, filename)
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            self.remove(filename)
+            return None
+
+        with self._lock:
+            cached = self._cache.get(filename)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                self._cache.move_to_end(filename)
+                self.cache_hits += 1
+                return cached[2]
+
+        self.cache_misses += 1
+        gesture_data = self.loader(filepath)
+        if gesture_data is None:
+            return None
+
+        with self._lock:
+            entry = self.entries.get(filename)
+            changed = (not entry or entry['mtime'] != stat.st_mtime_ns
+                       or entry['size'] != stat.st_size)
+            if changed:
+                self.entries[filename] = self._make_entry(gesture_data, stat)
+                self._changed()
+            self._put_cache(filename, stat, gesture_data)
+        if changed:
+            self.save()
+        return gesture_data
+
+    def _put_cache(self, filename, stat, gesture_data):
+        """放入快取並淘汰最久未使用的項目"""
+        self._cache[filename] = (stat.st_mtime_ns, stat.st_size, gesture_data)
+        self._cache.move_to_end(filename)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def find_duplicates(self):
+        """依檢查碼找出內容完全相同的手勢檔案，回傳 [[檔名, ...], ...]"""
+        with self._lock:
+            groups = {}
+            for filename, entry in self.entries.items():
+                groups.setdefault(entry['checksum'], []).append(filename)
+            return [sorted(files) for files in groups.values() if len(files) > 1]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, filename):
+        return filename in self.entries
@@ -0,0 +1,270 @@
+"""
+手勢特徵正規化模組
+"""
+import numpy as np
+
+from .config import (CAMERA_WIDTH, CAMERA_HEIGHT, GESTURE_FEATURE_LENGTH,
+                     GESTURE_SIMILARITY_BLOCK_ELEMENTS)
+
+WRIST = 0
+MIDDLE_MCP = 9
+
+# 正規化座標的寬高比（x 以影格寬度正規化、y 以高度正規化）
+DEFAULT_ASPECT = CAMERA_WIDTH / CAMERA_HEIGHT
+
+
+def gesture_to_array(landmarks):
+    """將手勢地標（每幀 63 個浮點數的列表或陣列）轉為 (幀數, 21, 3) float32 陣列"""
+    return np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+
+
+def normalize_sequence(landmarks, aspect=DEFAULT_ASPECT):
+    """正規化手勢序列 (幀數, 21, 3)
+
+    每幀以手腕為原點、除以手掌大小（手腕到中指根部），與手的位置和遠近無關。
+    手腕本身正規化後恆為零，因此該位置改存手腕相對於整段序列平均位置的軌跡
+    （同樣以平均手掌大小為單位），讓揮動等動態手勢仍可區分。
+    """
+    points = np.array(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+    points[..., 0] *= aspect
+    points[..., 2] *= aspect
+
+    wrist = points[:, WRIST:WRIST + 1, :]
+    palm_size = np.linalg.norm(points[:, MIDDLE_MCP] - points[:, WRIST], axis=-1)
+    palm_size = np.maximum(palm_size, 1e-6)[:, None, None]
+
+    features = (points - wrist) / palm_size
+    features[:, WRIST] = (wrist[:, 0] - wrist[:, 0].mean(axis=0)) / palm_size.mean()
+    return features
+
+
+def _valid_timestamps(timestamps, frame_count):
+    """時間戳記是否可用於重新取樣（數量相符、非遞減且總長大於零）"""
+    if timestamps is None or len(timestamps) != frame_count or frame_count < 2:
+        return False
+    steps = np.diff(timestamps)
+    return bool(np.all(steps >= 0) and timestamps[-1] > timestamps[0])
+
+
+def resample_sequence(sequence, length, timestamps=None):
+    """以線性內插將序列重新取樣為固定幀數
+
+    提供每幀時間戳記時，在錄製起訖之間取 length 個等間隔的時間點內插
+    （與錄製 FPS 及掉幀無關）；否則假設幀間隔固定，依幀索引內插。
+    """
+    sequence = np.asarray(sequence, dtype=np.float32)
+    frame_count = len(sequence)
+    if frame_count == 1:
+        return np.repeat(sequence, length, axis=0)
+
+    if _valid_timestamps(timestamps, frame_count):
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        # 等同於對每個維度呼叫 np.interp，但一次以索引與權重處理所有維度
+        targets = np.linspace(timestamps[0], timestamps[-1], length)
+        upper = np.clip(np.searchsorted(timestamps, targets, side='right'), 1, frame_count - 1)
+        lower = upper - 1
+        span = timestamps[upper] - timestamps[lower]
+        weight = np.divide(targets - timestamps[lower], span, out=np.zeros(length), where=span > 0)
+        weight = np.clip(weight, 0.0, 1.0).astype(np.float32)
+    else:
+        if frame_count == length:
+            return sequence.copy()
+        position = np.linspace(0, frame_count - 1, length, dtype=np.float32)
+        lower = np.floor(position).astype(np.intp)
+        upper = np.minimum(lower + 1, frame_count - 1)
+        weight = position - lower
+
+    weight = weight.reshape((-1,) + (1,) * (sequence.ndim - 1))
+    return sequence[lower] * (1 - weight) + sequence[upper] * weight
+
+
+def sequence_duration(frame_count, timestamps=None):
+    """序列的持續時間（秒）；沒有可用的時間戳記時假設為 30FPS（與 GestureData.duration 相同）"""
+    if _valid_timestamps(timestamps, frame_count):
+        return float(timestamps[-1] - timestamps[0])
+    return frame_count * 0.033
+
+
+def sequence_features(landmarks, length, aspect=DEFAULT_ASPECT, timestamps=None):
+    """正規化並重新取樣為 (length, 63) float32 特徵矩陣"""
+    features = resample_sequence(normalize_sequence(landmarks, aspect), length, timestamps)
+    return np.ascontiguousarray(features.reshape(length, -1), dtype=np.float32)
+
+
+def feature_distance(features1, features2):
+    """兩組 (length, 63) 特徵的平均每幀平方距離"""
+    diff = np.asarray(features1, dtype=np.float32) - np.asarray(features2, dtype=np.float32)
+    return float((diff * diff).sum() / len(diff))
+
+
+class GestureFeatureIndex:
+    """手勢庫的正規化特徵索引
+
+    每個手勢只在加入時正規化並重新取樣一次，所有特徵連續存放在
+    (容量, length * 63) 的 float32 矩陣中（容量不足時倍增），並快取每列的平方範數
+    與錄製的持續時間（即時比對依此決定每個範本的視窗長度）。
+    最近範本查詢以 |q|^2 + |t|^2 - 2 q·t 一次矩陣乘法算出所有距離；
+    手勢庫的全配對距離則分成固定元素數的區塊計算，記憶體用量有上限。
+    新增與刪除都是 O(1) 的單列操作（刪除時以最後一列補位），不需重建整個索引。
+    """
+
+    def __init__(self, length=GESTURE_FEATURE_LENGTH, aspect=DEFAULT_ASPECT):
+        self.length = length
+        self.aspect = aspect
+        self.dim = length * 63
+        self.keys = []   # 每列對應的鍵（手勢檔名）
+        self.names = []  # 每列對應的手勢名稱
+        self._rows = {}  # 鍵 -> 列索引
+        self._matrix = np.empty((0, self.dim), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._durations = np.empty(0, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    @property
+    def matrix(self):
+        """目前所有特徵的 (數量, length * 63) 視圖"""
+        return self._matrix[:len(self.keys)]
+
+    @property
+    def durations(self):
+        """目前所有手勢的持續時間（秒）視圖"""
+        return self._durations[:len(self.keys)]
+
+    def features(self, landmarks, timestamps=None):
+        """將地標序列轉為一列特徵向量（有時間戳記時依時間重新取樣）"""
+        return sequence_features(gesture_to_array(landmarks), self.length, self.aspect,
+                                 timestamps).ravel()
+
+    def build(self, items):
+        """以 (鍵, 名稱, 地標序列[, 時間戳記]) 的可疊代物件重建整個索引"""
+        self.clear()
+        for key, name, landmarks, *timestamps in items:
+            self.add(key, name, landmarks, *timestamps)
+
+    def clear(self):
+        """清除所有項目"""
+        self.keys = []
+        self.names = []
+        self._rows = {}
+
+    def add(self, key, name, landmarks=None, timestamps=None, features=None, duration=None):
+        """新增（或取代）一個手勢（features 為已計算的特徵向量時不再重新計算）
+
+        duration 未提供時由地標與時間戳記計算；只提供 features 時為 NaN（未知）。
+        """
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self._matrix):
+                self._grow(max(16, row * 2))
+            self.keys.append(key)
+            self.names.append(name)
+            self._rows[key] = row
+        else:
+            self.names[row] = name
+        self._matrix[row] = self.features(landmarks, timestamps) if features is None else features
+        self._norms[row] = self._matrix[row] @ self._matrix[row]
+        if duration is None:
+            duration = np.nan if landmarks is None else sequence_duration(
+                len(gesture_to_array(landmarks)), timestamps)
+        self._durations[row] = duration
+
+    def remove(self, key):
+        """刪除一個手勢（以最後一列補位），回傳是否存在"""
+        row = self._rows.pop(key, None)
+        if row is None:
+            return False
+        last = len(self.keys) - 1
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            self._norms[row] = self._norms[last]
+            self._durations[row] = self._durations[last]
+            self.keys[row] = self.keys[last]
+            self.names[row] = self.names[last]
+            self._rows[self.keys[row]] = row
+        self.keys.pop()
+        self.names.pop()
+        return True
+
+    def _grow(self, capacity):
+        """擴充矩陣容量"""
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        norms = np.empty(capacity, dtype=np.float32)
+        durations = np.empty(capacity, dtype=np.float64)
+        count = len(self.keys)
+        matrix[:count] = self._matrix[:count]
+        norms[:count] = self._norms[:count]
+        durations[:count] = self._durations[:count]
+        self._matrix = matrix
+        self._norms = norms
+        self._durations = durations
+
+    def distances(self, queries, start=0):
+        """計算查詢特徵 (查詢數, length * 63) 對所有範本的平均每幀平方距離 (查詢數, 範本數)
+
+        start > 0 時只計算第 start 列之後的範本（用於全配對的上三角）。
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        count = len(self.keys)
+        squared = ((queries * queries).sum(axis=1)[:, None] + self._norms[start:count][None, :]
+                   - 2.0 * queries @ self._matrix[start:count].T)
+        return np.maximum(squared, 0.0) / self.length
+
+    def distance_blocks(self, block_elements=GESTURE_SIMILARITY_BLOCK_ELEMENTS, upper=False):
+        """逐區塊產生全配對距離 (起始列, (區塊列數, 欄數) 距離)
+
+        每個區塊最多 block_elements 個元素；upper=True 時只計算第 起始列 欄之後的上三角部分。
+        """
+        count = len(self.keys)
+        rows = max(1, block_elements // max(count, 1))
+        for start in range(0, count, rows):
+            stop = min(start + rows, count)
+            yield start, self.distances(self._matrix[start:stop], start if upper else 0)
+
+    def distance_matrix(self, block_elements=GESTURE_SIMILARITY_BLOCK_ELEMENTS):
+        """完整的 (數量, 數量) 平均每幀平方距離矩陣（以區塊計算，對角線為 0）"""
+        count = len(self.keys)
+        matrix = np.empty((count, count), dtype=np.float32)
+        for start, block in self.distance_blocks(block_elements):
+            matrix[start:start + len(block)] = block
+        np.fill_diagonal(matrix, 0.0)
+        return matrix
+
+    def close_pairs(self, threshold, block_elements=GESTURE_SIMILARITY_BLOCK_ELEMENTS,
+                    different_names=False):
+        """找出距離小於 threshold 的所有手勢配對，依距離排序回傳 [(鍵1, 鍵2, 距離), ...]
+
+        只掃描上三角，不建立完整矩陣；different_names=True 時只回傳名稱不同的配對
+        （容易混淆的手勢），否則包含同名的近似重複錄製。
+        """
+        names = np.array(self.names, dtype=object)
+        pairs = []
+        for start, block in self.distance_blocks(block_elements, upper=True):
+            rows, columns = np.nonzero(block < threshold)
+            rows += start
+            columns += start
+            keep = columns > rows
+            if different_names:
+                keep &= names[rows] != names[columns]
+            for row, column in zip(rows[keep], columns[keep]):
+                pairs.append((self.keys[row], self.keys[column], float(block[row - start, column - start])))
+        pairs.sort(key=lambda pair: pair[2])
+        return pairs
+
+    def nearest(self, landmarks, k=1, exclude=None, timestamps=None):
+        """查詢與地標序列最接近的 k 個手勢，回傳 [(鍵, 名稱, 距離), ...]"""
+        if not self.keys:
+            return []
+        distances = self.distances(self.features(landmarks, timestamps))[0]
+        if exclude in self._rows:
+            distances[self._rows[exclude]] = np.inf
+        k = min(k, len(distances))
+        candidates = np.argpartition(distances, k - 1)[:k]
+        candidates = candidates[np.argsort(distances[candidates])]
+        return [(self.keys[i], self.names[i], float(distances[i]))
+                for i in candidates if np.isfinite(distances[i])]
@@ -0,0 +1,333 @@
+"""
+即時手勢範本比對模組（DTW）
+"""
+import time
+import numpy as np
+
+from .config import (GESTURE_MATCH_WINDOW, GESTURE_MATCH_BAND, GESTURE_MATCH_THRESHOLD,
+                     GESTURE_MATCH_INTERVAL, GESTURE_MATCH_DURATION_STEP, GESTURE_MATCH_BATCH,
+                     GESTURE_MATCH_ABANDON_INTERVAL, MAX_FPS)
+from .gesture_features import gesture_to_array, sequence_duration, sequence_features
+from .logger import get_logger
+
+logger = get_logger('gesture_matcher')
+
+
+def keogh_envelope(sequences, band):
+    """計算 LB_Keogh 上下包絡 (範本數, 長度, 維度)
+
+    包絡為每個位置在 ±band 範圍內的最大值與最小值，一次對所有範本計算。
+    """
+    length = sequences.shape[1]
+    upper = sequences.copy()
+    lower = sequences.copy()
+    for offset in range(1, band + 1):
+        np.maximum(upper[:, offset:], sequences[:, :length - offset], out=upper[:, offset:])
+        np.maximum(upper[:, :length - offset], sequences[:, offset:], out=upper[:, :length - offset])
+        np.minimum(lower[:, offset:], sequences[:, :length - offset], out=lower[:, offset:])
+        np.minimum(lower[:, :length - offset], sequences[:, offset:], out=lower[:, :length - offset])
+    return upper, lower
+
+
+def dtw_band_diagonals(length, band):
+    """Sakoe-Chiba 帶內格子依反對角線（i + j 固定）排列的索引
+
+    回傳 (列索引, 欄索引, 區段)：列與欄索引（1 起算）依反對角線順序列出帶內所有格子，
+    區段為每條反對角線的 (i + j, 第一列, 最後一列, 起始位置, 結束位置)。
+    同一條反對角線上的格子只依賴前兩條反對角線，可以一次向量化更新。
+    """
+    rows, segments = [], []
+    position = 0
+    for total in range(2, 2 * length + 1):
+        first = max(1, total - length, -((band - total) // 2))
+        last = min(length, total - 1, (total + band) // 2)
+        if first > last:
+            continue
+        rows.append(np.arange(first, last + 1))
+        segments.append((total, first, last, position, position + last - first + 1))
+        position += last - first + 1
+    rows = np.concatenate(rows)
+    columns = np.concatenate([total - np.arange(first, last + 1)
+                              for total, first, last, _, _ in segments])
+    return rows, columns, segments
+
+
+def dtw_distances(queries, candidates, band, diagonals=None, best_so_far=np.inf, remaining=None,
+                  check_interval=GESTURE_MATCH_ABANDON_INTERVAL):
+    """批次計算 Sakoe-Chiba 帶狀限制的 DTW 距離（平方歐氏距離累加）
+
+    queries 與 candidates 為 (數量, 長度, 維度)，第 k 個查詢只與第 k 個候選比對，回傳 (數量,)。
+    局部成本以批次矩陣乘法求出；累積成本以反對角線為主的排列存放
+    （accumulated[:, i + j, i]），每一步以切片同時更新所有候選的整條反對角線，
+    Python 迴圈次數只與長度有關、與候選數無關。
+
+    每 check_interval 條反對角線提前放棄一次：任何路徑都會經過相鄰兩條反對角線之一，
+    兩條線上「累積成本 + 該列之後的下界」的最小值已不低於 best_so_far 的候選不可能更好，
+    從批次中移除並回傳 inf。remaining 為 (數量, 長度 + 1)，remaining[:, i] 為第 i 列
+    （1 起算）之後所有列的 LB_Keogh 下界總和，未提供時只以累積成本判斷。
+    """
+    count, length = queries.shape[:2]
+    rows, columns, segments = diagonals or dtw_band_diagonals(length, band)
+    cost = ((queries * queries).sum(axis=2)[:, :, None] + (candidates * candidates).sum(axis=2)[:, None, :]
+            - 2.0 * np.matmul(queries, candidates.transpose(0, 2, 1)))
+    band_cost = np.maximum(cost[:, rows - 1, columns - 1], 0.0)
+    if remaining is None:
+        remaining = np.zeros((count, length + 1), dtype=np.float32)
+
+    distances = np.full(count, np.inf, dtype=np.float32)
+    alive = np.arange(count)  # 尚未放棄的候選在原批次中的位置
+    accumulated = np.full((count, 2 * length + 1, length + 1), np.inf, dtype=np.float32)
+    accumulated[:, 0, 0] = 0.0
+    previous = None
+    for step, (total, first, last, start, stop) in enumerate(segments):
+        # 上方 (i-1, j)、左方 (i, j-1) 在前一條反對角線，左上 (i-1, j-1) 在前兩條
+        best = np.minimum(accumulated[:, total - 1, first - 1:last],
+                          accumulated[:, total - 1, first:last + 1])
+        np.minimum(best, accumulated[:, total - 2, first - 1:last], out=best)
+        np.add(best, band_cost[:, start:stop], out=accumulated[:, total, first:last + 1])
+
+        if np.isfinite(best_so_far) and previous is not None and step % check_interval == 0:
+            bound = np.minimum(
+                (accumulated[:, total, first:last + 1] + remaining[:, first:last + 1]).min(axis=1),
+                (accumulated[:, total - 1, previous[0]:previous[1] + 1]
+                 + remaining[:, previous[0]:previous[1] + 1]).min(axis=1))
+            keep = bound < best_so_far
+            if not keep.all():
+                alive = alive[keep]
+                if not len(alive):
+                    return distances
+                accumulated = accumulated[keep]
+                band_cost = band_cost[keep]
+                remaining = remaining[keep]
+        previous = (first, last)
+    distances[alive] = accumulated[:, 2 * length, length]
+    return distances
+
+
+class LiveWindow:
+    """即時地標與時間戳記的環形緩衝區（容量固定，範本庫需要更長的緩衝區時整個替換）"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.frames = np.zeros((capacity, 21, 3), dtype=np.float32)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self.next = 0
+        self.count = 0
+        self.frames_since_match = 0
+
+    def append(self, landmarks, timestamp):
+        position = self.next % self.capacity  # 與 reset() 同時執行時也不會超出範圍
+        self.frames[position] = landmarks
+        self.times[position] = timestamp
+        self.next = (position + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.frames_since_match += 1
+
+    def ordered(self):
+        """依時間順序回傳 (地標, 時間戳記) 的副本"""
+        count = min(self.count, self.capacity)
+        order = (self.next - count + np.arange(count)) % self.capacity
+        return self.frames[order], self.times[order]
+
+
+class DTWGestureMatcher:
+    """串流 DTW 手勢比對器
+
+    範本預先正規化並依錄製時間重新取樣為 window_length 個點，連同 LB_Keogh 包絡
+    存成連續陣列，並保留每個範本的持續時間。即時地標與時間戳記寫入環形緩衝區
+    （長度足以涵蓋最長的範本），每 match_interval 幀比對一次：每個範本與「最近
+    一段與其持續時間相同」的即時畫面比對（持續時間以 duration_step 分組，同組共用
+    一次正規化與重新取樣），因此不同長度的錄製都能匹配。
+    比對時先以向量化的 LB_Keogh 算出所有範本的下界並由小到大排序，
+    依序取出下界低於目前最佳距離的範本，每批 batch_size 個以 dtw_distances 一次計算，
+    計算中以累積成本加上剩餘列的下界提前放棄。距離以取樣點數平均，低於 threshold 才視為匹配。
+
+    範本庫與環形緩衝區放在同一個狀態中整組替換（set_index 可能在背景執行緒呼叫），
+    push 與比對只使用一開始取得的狀態，不會看到容量與範本不一致的組合。
+    """
+
+    def __init__(self, window_length=GESTURE_MATCH_WINDOW, band_ratio=GESTURE_MATCH_BAND,
+                 threshold=GESTURE_MATCH_THRESHOLD, match_interval=GESTURE_MATCH_INTERVAL,
+                 duration_step=GESTURE_MATCH_DURATION_STEP, batch_size=GESTURE_MATCH_BATCH,
+                 max_fps=MAX_FPS):
+        self.window_length = window_length
+        self.band = max(1, int(round(window_length * band_ratio)))
+        self.threshold = threshold
+        self.match_interval = max(1, match_interval)
+        self.duration_step = duration_step
+        self.batch_size = max(1, batch_size)
+        self.max_fps = max_fps
+        self._diagonals = dtw_band_diagonals(window_length, self.band)
+
+        # (名稱, 範本, 上包絡, 下包絡, 各組持續時間, 範本所屬組別, 各組起始位置, 即時視窗)
+        # 整組替換；範本依持續時間排序，同組範本連續存放
+        self._library = ([], None, None, None, None, None, None, LiveWindow(window_length))
+
+        # 統計資訊
+        self.last_match = None
+        self.last_match_ms = 0.0
+        self.dtw_evaluations = 0
+        self.lb_pruned = 0
+        self.dtw_abandoned = 0
+
+    @property
+    def names(self):
+        return self._library[0]
+
+    def __len__(self):
+        return len(self.names)
+
+    def set_templates(self, names, sequences, timestamps=None):
+        """設定範本（sequences 為每個範本的地標序列，可為 63 浮點數列表或 (幀數, 21, 3) 陣列；
+        timestamps 為對應的每幀時間戳記列表，沒有時假設為 30FPS）"""
+        timestamps = timestamps or [None] * len(sequences)
+        arrays = [gesture_to_array(sequence) for sequence in sequences]
+        features = [sequence_features(array, self.window_length, timestamps=times)
+                    for array, times in zip(arrays, timestamps)]
+        durations = [sequence_duration(len(array), times) for array, times in zip(arrays, timestamps)]
+        self.set_features(names, np.stack(features) if features else None, durations)
+
+    def set_index(self, index):
+        """直接使用手勢庫特徵索引中已正規化的特徵與持續時間作為範本（不重新計算特徵）"""
+        if index.length != self.window_length:
+            raise ValueError(f"特徵長度 {index.length} 與比對視窗 {self.window_length} 不符")
+        self.set_features(list(index.names), index.matrix.reshape(len(index), index.length, -1),
+                          index.durations)
+
+    def set_features(self, names, features, durations):
+        """設定已正規化的範本特徵 (範本數, window_length, 63) 與各範本的持續時間（秒）"""
+        self.last_match = None
+        window = self._library[7]
+        if not names:
+            self._library = ([], None, None, None, None, None, None, window)
+            return
+
+        # 持續時間未知時假設為 window_length 幀（30FPS），並以 duration_step 分組
+        durations = np.asarray(durations, dtype=np.float64)
+        durations = np.where(np.isfinite(durations), durations, self.window_length * 0.033)
+        steps = np.maximum(np.round(durations / self.duration_step), 1.0)
+        order = np.argsort(steps, kind='stable')
+        group_steps, group_starts, group_counts = np.unique(steps[order], return_index=True,
+                                                             return_counts=True)
+        group_durations = group_steps * self.duration_step
+        groups = np.repeat(np.arange(len(group_steps)), group_counts)
+
+        templates = np.array(features, dtype=np.float32)[order]  # 複製，與索引後續的原地修改分離
+        upper, lower = keogh_envelope(templates, self.band)
+        names = [names[index] for index in order]
+
+        # 環形緩衝區需涵蓋最長範本在最高處理頻率下的幀數
+        capacity = max(self.window_length, int(np.ceil(group_durations[-1] * self.max_fps)) + 1)
+        if capacity != window.capacity:
+            window = LiveWindow(capacity)
+        self._library = (names, templates, upper, lower, group_durations, groups,
+                         np.append(group_starts, len(names)), window)
+        logger.debug("已載入 %d 個手勢範本（%d 種持續時間）", len(names), len(group_durations))
+
+    def reset(self):
+        """清除即時視窗（手部離開畫面時呼叫）"""
+        self._library[7].reset()
+        self.last_match = None
+
+    def push(self, landmarks, timestamp=None):
+        """加入一幀地標 (21, 3) 與其時間戳記（秒，未提供時使用目前時間）；
+        到達比對間隔時回傳 (名稱, 距離) 或 None，否則回傳上次結果"""
+        library = self._library
+        window = library[7]
+        window.append(landmarks, time.time() if timestamp is None else timestamp)
+        if not library[0] or window.count < 2 or window.frames_since_match < self.match_interval:
+            return self.last_match
+
+        window.frames_since_match = 0
+        frames, times = window.ordered()
+        start = time.perf_counter()
+        self.last_match = self.match_live(frames, times, library)
+        self.last_match_ms = (time.perf_counter() - start) * 1000
+        return self.last_match
+
+    def window_queries(self, frames, times, library=None):
+        """將即時畫面依各組持續時間取最近的一段並轉為特徵，回傳 ((組數, 長度, 63), 組別是否可比對)
+
+        緩衝區涵蓋的時間不足某組持續時間（差距超過半個分組間隔）時，該組尚不可比對。
+        """
+        group_durations = (library or self._library)[4]
+        queries = np.zeros((len(group_durations), self.window_length, 63), dtype=np.float32)
+        ready = np.zeros(len(group_durations), dtype=bool)
+        end = times[-1]
+        tolerance = self.duration_step / 2
+        for group, duration in enumerate(group_durations):
+            if end - times[0] < duration - tolerance:
+                break  # 持續時間遞增，之後的組別也不足
+            first = max(0, int(np.searchsorted(times, end - duration, side='right')) - 1)
+            if len(times) - first < 2:
+                continue
+            queries[group] = sequence_features(frames[first:], self.window_length,
+                                               timestamps=times[first:])
+            ready[group] = True
+        return queries, ready
+
+    @staticmethod
+    def lower_bounds(query, upper, lower):
+        """以 LB_Keogh 計算查詢 (長度, 63) 對範本的逐位置下界 (範本數, 長度)"""
+        excess = query - np.clip(query, lower, upper)
+        return np.einsum('tld,tld->tl', excess, excess)
+
+    def match_live(self, frames, times, library=None):
+        """比對依時間排序的即時畫面 (幀數, 21, 3) 與時間戳記，回傳 (名稱, 平均距離) 或 None"""
+        library = library or self._library
+        if not library[0]:
+            return None
+        queries, ready = self.window_queries(frames, times, library)
+        return self._match(queries, ready, library)
+
+    def match(self, query):
+        """以同一組 (長度, 63) 查詢特徵比對所有範本（不考慮持續時間），回傳 (名稱, 平均距離) 或 None"""
+        library = self._library
+        if not library[0]:
+            return None
+        group_count = len(library[4])
+        return self._match(np.broadcast_to(query, (group_count,) + query.shape),
+                           np.ones(group_count, dtype=bool), library)
+
+    def _match(self, queries, ready, library):
+        """queries[g] 為第 g 組持續時間的查詢特徵，只比對 ready 為 True 的組別"""
+        names, templates, upper, lower, _, groups, group_starts, _ = library
+        length = self.window_length
+
+        # 各組範本連續存放，以切片計算逐位置下界；不可比對的組別下界為 inf。
+        # remaining[:, i] 為第 i 列（1 起算）之後的下界總和，供 DTW 提前放棄使用
+        remaining = np.zeros((len(names), length + 1), dtype=np.float32)
+        totals = np.full(len(names), np.inf)
+        for group in np.flatnonzero(ready):
+            start, stop = group_starts[group], group_starts[group + 1]
+            bounds = self.lower_bounds(queries[group], upper[start:stop], lower[start:stop])
+            remaining[start:stop, :length] = np.cumsum(bounds[:, ::-1], axis=1)[:, ::-1]
+            totals[start:stop] = remaining[start:stop, 0]
+
+        best = self.threshold * length
+        best_index = -1
+        order = np.argsort(totals)
+        position = 0
+        while position < len(order):
+            # 下界已不低於目前最佳距離的範本不可能更好，其餘範本的下界只會更大
+            batch = order[position:position + self.batch_size]
+            batch = batch[totals[batch] < best]
+            if not len(batch):
+                break
+            position += len(batch)
+            self.dtw_evaluations += len(batch)
+            distances = dtw_distances(queries[groups[batch]], templates[batch], self.band,
+                                      self._diagonals, best, remaining[batch])
+            self.dtw_abandoned += int(np.count_nonzero(np.isinf(distances)))
+            nearest = int(np.argmin(distances))
+            if distances[nearest] < best:
+                best = float(distances[nearest])
+                best_index = int(batch[nearest])
+        self.lb_pruned += len(order) - position
+
+        if best_index < 0:
+            return None
+        return names[best_index], best / length
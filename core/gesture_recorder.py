@@ -2,6 +2,7 @@
 手勢錄入和管理模組
 """
 import json
+import threading
 import time
 import os
 from datetime import datetime
@@ -9,25 +10,64 @@ import numpy as np
 import mediapipe as mp
 from typing import List, Dict, Optional, Tuple
 
+from .config import (GESTURE_STORAGE_FORMAT, GESTURE_QUANTIZE, RECORDING_CHUNK_FRAMES,
+                     RECORDING_FSYNC_CHUNKS, RECORDING_MAX_TIME, GESTURE_MATCH_THRESHOLD,
+                     GESTURE_FEATURE_LENGTH)
+from .gesture_features import GestureFeatureIndex, sequence_features, feature_distance
+from .gesture_catalog import GestureCatalog
+from .gesture_storage import (GESTURE_FILE_EXTENSION, PART_SUFFIX, GestureStreamWriter,
+                              write_gesture_file, read_any, atomic_write, recover_partial)
+
 mp_hands = mp.solutions.hands
 
 class GestureData:
-    """手勢資料類別"""
+    """手勢資料類別
+
+    landmarks 為連續的 (幀數, 21, 3) float32 陣列；timestamps 為每幀相對於
+    錄製開始的秒數 (幀數,) float64，舊版資料沒有時為 None。
+    metadata 為錄製條件（METADATA_KEYS：種類、錄製時的畫面方向與影格大小），舊版資料沒有時為空。
+    """
+    
+    __slots__ = ('name', 'landmarks', 'timestamps', 'timestamp', 'metadata')
+    
+    # kind: 'pose'（靜態姿勢）或 'motion'（動態手勢）；orientation: {rotation, flip_h, flip_v}；
+    # frame_shape: 方向調整後的 [高, 寬]
+    METADATA_KEYS = ('kind', 'orientation', 'frame_shape')
     
-    def __init__(self, name: str, landmarks: List[List[float]], timestamp: str = None):
+    def __init__(self, name: str, landmarks, timestamp: str = None, timestamps=None,
+                 metadata: Dict = None):
         self.name = name
-        self.landmarks = landmarks  # 手部地標點座標
+        # 接受 (幀數, 21, 3) 陣列或舊版每幀 63 個浮點數的列表；
+        # 'records' 格式的地標是跨步視圖，複製為連續陣列（連續的映射則不複製）
+        self.landmarks = np.ascontiguousarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+        self.timestamps = None if timestamps is None else np.asarray(timestamps, dtype=np.float64)
         self.timestamp = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.frame_count = len(landmarks)
+        self.metadata = {key: value for key, value in (metadata or {}).items()
+                         if key in self.METADATA_KEYS and value is not None}
+    
+    @property
+    def frame_count(self) -> int:
+        return len(self.landmarks)
+    
+    @property
+    def duration(self) -> float:
+        """持續時間（秒）；沒有時間戳記的舊版資料假設為 30FPS"""
+        if self.timestamps is not None and len(self.timestamps) > 1:
+            return float(self.timestamps[-1] - self.timestamps[0])
+        return self.frame_count * 0.033
     
     def to_dict(self) -> Dict:
-        """轉換為字典格式"""
-        return {
+        """轉換為字典格式（地標為每幀 63 個浮點數的列表，與舊版 JSON 相容）"""
+        data = {
             'name': self.name,
-            'landmarks': self.landmarks,
+            'landmarks': self.landmarks.reshape(self.frame_count, -1).tolist(),
             'timestamp': self.timestamp,
             'frame_count': self.frame_count
         }
+        if self.timestamps is not None:
+            data['timestamps'] = self.timestamps.tolist()
+        data.update(self.metadata)
+        return data
     
     @classmethod
     def from_dict(cls, data: Dict):
@@ -35,23 +75,54 @@ class GestureData:
         return cls(
             name=data['name'],
             landmarks=data['landmarks'],
-            timestamp=data.get('timestamp', '')
+            timestamp=data.get('timestamp', ''),
+            timestamps=data.get('timestamps'),
+            metadata=data
         )
+    
+    @classmethod
+    def load(cls, filepath: str, mmap: bool = False):
+        """從二進位或舊版 JSON 手勢檔案載入（讀取失敗時拋出例外）"""
+        header, landmarks, timestamps = read_any(filepath, mmap=mmap)
+        return cls(name=header['name'], landmarks=landmarks,
+                   timestamp=header.get('timestamp', ''), timestamps=timestamps, metadata=header)
 
 class GestureRecorder:
-    """手勢錄入器"""
+    """手勢錄入器
+
+    錄製時每幀以單調時鐘的時間戳記附加寫入 .gesture.part 串流檔案
+    （見 GestureStreamWriter），記憶體用量固定，沒有錄製長度上限；
+    停止時只改寫標頭並更名。程式崩潰留下的 .part 檔案會在下次啟動時復原。
+    """
     
-    def __init__(self, save_dir: str = "gestures"):
+    def __init__(self, save_dir: str = "gestures", storage_format: str = GESTURE_STORAGE_FORMAT,
+                 quantize: bool = GESTURE_QUANTIZE, sync_catalog: bool = True):
         self.save_dir = save_dir
+        self.storage_format = storage_format
+        self.quantize = quantize
         self.recording = False
         self.current_gesture_name = ""
-        self.recorded_landmarks = []
         self.recording_start_time = None
-        self.max_recording_time = 10.0  # 最大錄製時間（秒）
+        
+        # 串流寫入器（錄製中才存在）；影像執行緒寫入與停止錄製以鎖保護
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self.frame_count = 0
+        self.max_recording_time = RECORDING_MAX_TIME  # 最大錄製時間（秒），None 表示不限制
         self.min_frames = 5  # 最少錄製幀數
         
-        # 建立儲存目錄
+        # 建立儲存目錄並復原上次未完成的錄製
         os.makedirs(self.save_dir, exist_ok=True)
+        self.recover_partial_recordings()
+        
+        # 手勢庫目錄（列表與篩選不需開啟手勢檔案）與已載入手勢的 LRU 快取
+        # sync_catalog=False 時由呼叫端稍後（例如在背景執行緒）呼叫 catalog.sync()
+        self.catalog = GestureCatalog(self.save_dir, self.load_gesture, sync=sync_catalog)
+        
+        # 正規化特徵索引（第一次使用時建立，之後隨儲存/刪除增量更新）
+        self.feature_index = GestureFeatureIndex()
+        self._index_built = False
+        self._unindexed = set()  # 索引建立後才錄製完成、尚未加入索引的檔案
         
         # MediaPipe 手部追蹤
         self.hands = mp_hands.Hands(
@@ -62,54 +133,110 @@ class GestureRecorder:
             model_complexity=1
         )
     
-    def start_recording(self, gesture_name: str) -> bool:
-        """開始錄製手勢"""
+    def start_recording(self, gesture_name: str, kind: str = None,
+                        orientation: Dict = None) -> bool:
+        """開始錄製手勢
+
+        kind 為 'pose'（靜態姿勢）或 'motion'（動態手勢），orientation 為錄製時的畫面方向
+        （rotation, flip_h, flip_v），都記錄在檔案標頭供姿勢分類器訓練使用。
+        影格必須是方向調整後（與即時偵測相同方向）的畫面。
+        """
         if self.recording:
             return False
         
-        self.recording = True
-        self.current_gesture_name = gesture_name
-        self.recorded_landmarks = []
-        self.recording_start_time = time.time()
+        timestamp = datetime.now()
+        filename = f"{gesture_name}_{timestamp.strftime('%Y%m%d_%H%M%S')}{GESTURE_FILE_EXTENSION}"
+        metadata = {key: value for key, value in (('kind', kind), ('orientation', orientation))
+                    if value is not None}
+        try:
+            writer = GestureStreamWriter(os.path.join(self.save_dir, filename), gesture_name,
+                                         timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                                         RECORDING_CHUNK_FRAMES, fsync=RECORDING_FSYNC_CHUNKS,
+                                         **metadata)
+        except Exception as e:
+            print(f"[錄入] 無法建立錄製檔案: {e}")
+            return False
+        
+        with self._writer_lock:
+            self._writer = writer
+            self.current_gesture_name = gesture_name
+            self.frame_count = 0
+            self.recording_start_time = time.monotonic()
+            self.recording = True
         
         print(f"[錄入] 開始錄製手勢: {gesture_name}")
         return True
     
-    def stop_recording(self) -> Optional[GestureData]:
-        """停止錄製手勢"""
-        if not self.recording:
+    def _detach_writer(self):
+        """結束錄製狀態並取出串流寫入器"""
+        with self._writer_lock:
+            writer = self._writer
+            self._writer = None
+            self.recording = False
+            return writer
+    
+    def stop_recording(self) -> Optional[Dict]:
+        """停止錄製手勢並完成檔案（可在背景執行緒呼叫），回傳手勢庫目錄記錄
+
+        目錄記錄由寫入器累計的幀數、時間與檢查碼建立，不重新讀取檔案；
+        特徵索引已建立時，新檔案在下次取用索引時才載入（延遲索引）。
+        """
+        writer = self._detach_writer()
+        if writer is None:
             return None
         
-        self.recording = False
-        
         # 檢查錄製的資料是否足夠
-        if len(self.recorded_landmarks) < self.min_frames:
-            print(f"[錄入] 錄製失敗: 幀數不足 ({len(self.recorded_landmarks)} < {self.min_frames})")
+        if writer.frame_count < self.min_frames:
+            writer.discard()
+            print(f"[錄入] 錄製失敗: 幀數不足 ({writer.frame_count} < {self.min_frames})")
             return None
         
-        # 建立手勢資料
-        gesture_data = GestureData(
-            name=self.current_gesture_name,
-            landmarks=self.recorded_landmarks
-        )
+        try:
+            filepath = writer.finalize()
+        except Exception as e:
+            print(f"[錄入] 儲存失敗: {e}")
+            return None
         
-        print(f"[錄入] 錄製完成: {self.current_gesture_name} ({len(self.recorded_landmarks)} 幀)")
-        return gesture_data
+        filename = os.path.basename(filepath)
+        summary = writer.summary()
+        self.catalog.add_summary(filename, summary)
+        if self._index_built:
+            self._unindexed.add(filename)
+        
+        print(f"[錄入] 錄製完成: {self.current_gesture_name} ({writer.frame_count} 幀) -> {filepath}")
+        return self.catalog.get_entry(filename)
     
     def cancel_recording(self):
-        """取消錄製"""
-        if self.recording:
-            self.recording = False
-            self.recorded_landmarks = []
+        """取消錄製（刪除串流檔案）"""
+        writer = self._detach_writer()
+        if writer is not None:
+            writer.discard()
             print(f"[錄入] 取消錄製: {self.current_gesture_name}")
     
-    def process_frame(self, rgb_frame) -> Tuple[bool, Optional[List[float]]]:
-        """處理影格並錄製手部地標"""
+    def recover_partial_recordings(self) -> List[str]:
+        """復原儲存目錄中未完成的串流錄製（上次程式崩潰時留下），回傳復原的檔名"""
+        recovered = []
+        for entry in os.scandir(self.save_dir):
+            if not entry.name.endswith(GESTURE_FILE_EXTENSION + PART_SUFFIX):
+                continue
+            try:
+                filepath = recover_partial(entry.path)
+            except Exception as e:
+                print(f"[錄入] 無法復原 {entry.name}: {e}")
+                continue
+            if filepath:
+                recovered.append(os.path.basename(filepath))
+                print(f"[錄入] 已復原未完成的錄製: {os.path.basename(filepath)}")
+        return recovered
+    
+    def process_frame(self, rgb_frame) -> Tuple[bool, Optional[np.ndarray]]:
+        """處理影格並將手部地標附加寫入串流檔案，偵測到手部時回傳 (21, 3) 地標"""
         if not self.recording:
             return False, None
         
-        # 檢查錄製時間是否超時
-        if time.time() - self.recording_start_time > self.max_recording_time:
+        # 檢查錄製時間是否超時（未設定上限時不檢查）
+        if (self.max_recording_time is not None
+                and time.monotonic() - self.recording_start_time > self.max_recording_time):
             print(f"[錄入] 錄製超時，自動停止")
             return False, None
         
@@ -119,25 +246,42 @@ class GestureRecorder:
         if results.multi_hand_landmarks:
             # 取得第一隻手的地標點
             hand_landmarks = results.multi_hand_landmarks[0]
-            
-            # 將地標點轉換為列表格式
-            landmarks_list = []
-            for landmark in hand_landmarks.landmark:
-                landmarks_list.extend([landmark.x, landmark.y, landmark.z])
-            
-            self.recorded_landmarks.append(landmarks_list)
-            return True, landmarks_list
+            landmarks = np.array([(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark],
+                                 dtype=np.float32)
+            with self._writer_lock:
+                if self._writer is None:  # 偵測期間已停止錄製
+                    return False, None
+                if not self._writer.frame_count:
+                    self._writer.set_header(frame_shape=list(rgb_frame.shape[:2]))
+                self._writer.append(time.monotonic() - self.recording_start_time, landmarks)
+                self.frame_count = self._writer.frame_count
+            return True, landmarks
         
         return False, None
     
+    def _register(self, filename: str, gesture_data: GestureData):
+        """將已寫入的手勢加入目錄與特徵索引"""
+        self.catalog.add(filename, gesture_data)
+        if self._index_built:
+            self.feature_index.add(filename, gesture_data.name, gesture_data.landmarks,
+                                   gesture_data.timestamps)
+    
     def save_gesture(self, gesture_data: GestureData) -> bool:
-        """儲存手勢資料到檔案"""
+        """儲存手勢資料到檔案（原子寫入，可在背景執行緒呼叫）"""
         try:
-            filename = f"{gesture_data.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            extension = GESTURE_FILE_EXTENSION if self.storage_format == 'binary' else '.json'
+            filename = f"{gesture_data.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
             filepath = os.path.join(self.save_dir, filename)
             
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(gesture_data.to_dict(), f, ensure_ascii=False, indent=2)
+            if self.storage_format == 'binary':
+                write_gesture_file(filepath, gesture_data.name, gesture_data.landmarks,
+                                   gesture_data.timestamp, timestamps=gesture_data.timestamps,
+                                   quantized=self.quantize, **gesture_data.metadata)
+            else:
+                with atomic_write(filepath, 'w', encoding='utf-8') as f:
+                    json.dump(gesture_data.to_dict(), f, ensure_ascii=False, indent=2)
+            
+            self._register(filename, gesture_data)
             
             print(f"[錄入] 手勢已儲存: {filepath}")
             return True
@@ -146,25 +290,62 @@ class GestureRecorder:
             print(f"[錄入] 儲存失敗: {e}")
             return False
     
-    def load_gesture(self, filepath: str) -> Optional[GestureData]:
-        """載入手勢資料"""
+    def load_gesture(self, filepath: str, mmap: bool = False) -> Optional[GestureData]:
+        """載入手勢資料（舊版 JSON 仍可讀取）
+
+        mmap=True 時二進位檔案以唯讀 memmap 映射，適合只讀取一次的批次處理；
+        映射期間 Windows 無法刪除該檔案，因此預設會讀入記憶體。
+        """
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            return GestureData.from_dict(data)
+            return GestureData.load(filepath, mmap=mmap)
         
         except Exception as e:
             print(f"[錄入] 載入失敗: {e}")
             return None
     
-    def list_saved_gestures(self) -> List[str]:
-        """列出所有已儲存的手勢檔案"""
-        try:
-            files = [f for f in os.listdir(self.save_dir) if f.endswith('.json')]
-            return sorted(files)
-        except:
-            return []
+    def list_saved_gestures(self, filter_text: str = '') -> List[str]:
+        """列出已儲存的手勢檔案（由目錄提供，可依名稱篩選）"""
+        return self.catalog.list(filter_text)
+    
+    def get_gesture(self, filename: str) -> Optional[GestureData]:
+        """取得已儲存的手勢（經由 LRU 快取）"""
+        return self.catalog.get(filename)
+    
+    def get_feature_index(self) -> GestureFeatureIndex:
+        """取得手勢庫特徵索引（第一次呼叫時從磁碟建立）"""
+        if not self._index_built:
+            self.feature_index.clear()
+            self._unindexed.clear()
+            self._index_files(self.list_saved_gestures())
+            self._index_built = True
+        elif self._unindexed:
+            filenames, self._unindexed = self._unindexed, set()
+            self._index_files(sorted(filename for filename in filenames if filename in self.catalog))
+        return self.feature_index
+    
+    def _index_files(self, filenames):
+        """以記憶體映射載入手勢並加入特徵索引"""
+        for filename in filenames:
+            gesture_data = self.load_gesture(os.path.join(self.save_dir, filename), mmap=True)
+            if gesture_data and gesture_data.frame_count > 0:
+                # 加入索引時即計算特徵，不保留映射
+                self.feature_index.add(filename, gesture_data.name, gesture_data.landmarks,
+                                       gesture_data.timestamps)
+    
+    def find_similar(self, gesture_data: GestureData, k: int = 3,
+                     exclude: str = None) -> List[Tuple[str, str, float]]:
+        """在手勢庫中查詢最相似的手勢，回傳 [(檔名, 名稱, 距離), ...]"""
+        return self.get_feature_index().nearest(gesture_data.landmarks, k, exclude=exclude,
+                                                timestamps=gesture_data.timestamps)
+    
+    def find_similar_pairs(self, threshold: float = GESTURE_MATCH_THRESHOLD,
+                           different_names: bool = False) -> List[Tuple[str, str, float]]:
+        """找出手勢庫中距離小於 threshold 的所有配對，回傳 [(檔名1, 檔名2, 距離), ...]
+
+        different_names=True 時只列出名稱不同、即時比對容易混淆的手勢；
+        threshold 設為很小的值可找出近似重複的錄製。
+        """
+        return self.get_feature_index().close_pairs(threshold, different_names=different_names)
     
     def delete_gesture(self, filename: str) -> bool:
         """刪除手勢檔案"""
@@ -172,6 +353,9 @@ class GestureRecorder:
             filepath = os.path.join(self.save_dir, filename)
             if os.path.exists(filepath):
                 os.remove(filepath)
+                self.catalog.remove(filename)
+                self.feature_index.remove(filename)
+                self._unindexed.discard(filename)
                 print(f"[錄入] 已刪除手勢: {filename}")
                 return True
             return False
@@ -187,16 +371,18 @@ class GestureRecorder:
                 'gesture_name': '',
                 'frame_count': 0,
                 'elapsed_time': 0,
-                'remaining_time': 0
+                'remaining_time': None
             }
         
-        elapsed_time = time.time() - self.recording_start_time
-        remaining_time = max(0, self.max_recording_time - elapsed_time)
+        elapsed_time = time.monotonic() - self.recording_start_time
+        remaining_time = None  # 未設定上限
+        if self.max_recording_time is not None:
+            remaining_time = max(0, self.max_recording_time - elapsed_time)
         
         return {
             'recording': True,
             'gesture_name': self.current_gesture_name,
-            'frame_count': len(self.recorded_landmarks),
+            'frame_count': self.frame_count,
             'elapsed_time': elapsed_time,
             'remaining_time': remaining_time
         }
@@ -212,45 +398,44 @@ class GestureAnalyzer:
     @staticmethod
     def analyze_gesture(gesture_data: GestureData) -> Dict:
         """分析手勢特徵"""
-        if not gesture_data.landmarks:
+        if len(gesture_data.landmarks) == 0:
             return {}
         
-        landmarks_array = np.array(gesture_data.landmarks)
+        landmarks = gesture_data.landmarks  # (幀數, 21, 3)
+        flat = landmarks.reshape(gesture_data.frame_count, -1)
+        low = landmarks.min(axis=(0, 1))
+        high = landmarks.max(axis=(0, 1))
         
-        # 基本統計資訊
+        # 基本統計資訊（有時間戳記時以實際錄製時間計算持續時間與 FPS）
+        duration = gesture_data.duration
         analysis = {
             'frame_count': gesture_data.frame_count,
-            'duration': gesture_data.frame_count * 0.033,  # 假設30FPS
-            'landmark_mean': landmarks_array.mean(axis=0).tolist(),
-            'landmark_std': landmarks_array.std(axis=0).tolist(),
+            'duration': duration,
+            'fps': (gesture_data.frame_count - 1) / duration if duration > 0 else 0.0,
+            'landmark_mean': flat.mean(axis=0).tolist(),
+            'landmark_std': flat.std(axis=0).tolist(),
             'movement_range': {
-                'x_range': landmarks_array[:, ::3].max() - landmarks_array[:, ::3].min(),
-                'y_range': landmarks_array[:, 1::3].max() - landmarks_array[:, 1::3].min(),
-                'z_range': landmarks_array[:, 2::3].max() - landmarks_array[:, 2::3].min(),
+                'x_range': float(high[0] - low[0]),
+                'y_range': float(high[1] - low[1]),
+                'z_range': float(high[2] - low[2]),
             }
         }
         
         return analysis
     
     @staticmethod
-    def compare_gestures(gesture1: GestureData, gesture2: GestureData) -> float:
-        """比較兩個手勢的相似度（0-1，1為完全相同）"""
-        if not gesture1.landmarks or not gesture2.landmarks:
+    def compare_gestures(gesture1: GestureData, gesture2: GestureData,
+                         length: int = GESTURE_FEATURE_LENGTH) -> float:
+        """比較兩個手勢的相似度（0-1，1為完全相同）
+
+        兩個手勢先正規化並依時間戳記重新取樣到相同的時間基準，
+        以不同 FPS 錄製的同一手勢也能正確比較。
+        """
+        if len(gesture1.landmarks) == 0 or len(gesture2.landmarks) == 0:
             return 0.0
         
-        # 簡單的相似度計算（基於平均地標點距離）
-        arr1 = np.array(gesture1.landmarks)
-        arr2 = np.array(gesture2.landmarks)
-        
-        # 標準化長度
-        min_length = min(len(arr1), len(arr2))
-        arr1 = arr1[:min_length]
-        arr2 = arr2[:min_length]
-        
-        # 計算平均差異
-        diff = np.mean(np.abs(arr1 - arr2))
-        
-        # 轉換為相似度（0-1）
-        similarity = max(0, 1 - diff * 10)  # 調整係數
+        features1 = sequence_features(gesture1.landmarks, length, timestamps=gesture1.timestamps)
+        features2 = sequence_features(gesture2.landmarks, length, timestamps=gesture2.timestamps)
         
-        return similarity
+        # 平均每幀平方距離轉換為相似度（0-1）
+        return 1.0 / (1.0 + feature_distance(features1, features2))
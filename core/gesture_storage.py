@@ -0,0 +1,328 @@
+"""
+手勢二進位儲存格式模組
+
+檔案格式（.gesture）:
+    [0:8)            魔術字串 b'AIRMGST\\x01'
+    [8:HEADER_SIZE)  UTF-8 JSON 標頭，以空白補齊到固定長度（可原地改寫）
+    [HEADER_SIZE:)   原始資料（little-endian），依標頭 layout 分為兩種：
+                     'arrays'（預設）: (幀數, 21, 3) 的 float32 或 int16 量化值，
+                         標頭 has_timestamps 為 True 時其後接著 (幀數,) float64 的每幀時間戳記
+                     'records': 串流錄製使用的固定大小記錄，每幀為
+                         float64 時間戳記 + 63 個 float32 地標（RECORD_DTYPE）
+
+資料從固定位移開始，可直接以 np.memmap 映射；int16 量化時
+實際值 = 量化值 * scale + offset，最大誤差為 scale / 2。
+串流錄製先寫入 .part 檔案，完成時只改寫標頭並更名；
+未完成的 .part 檔案可由檔案大小推算已寫入的幀數並復原。
+"""
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+MAGIC = b'AIRMGST\x01'
+HEADER_SIZE = 4096
+GESTURE_FILE_EXTENSION = '.gesture'
+LEGACY_FILE_EXTENSION = '.json'
+CATALOG_FILENAME = '_catalog.json'  # 手勢庫目錄檔案（不是手勢檔案）
+PART_SUFFIX = '.part'               # 錄製中（尚未完成）的串流檔案
+
+RECORD_DTYPE = np.dtype([('timestamp', '<f8'), ('landmarks', '<f4', (21, 3))])
+
+_DTYPES = {'float32': np.dtype('<f4'), 'int16': np.dtype('<i2')}
+_INT16_LEVELS = 65534  # 對稱使用 -32767 ~ 32767
+
+
+def is_gesture_file(filename):
+    """是否為可讀取的手勢檔案（二進位或舊版 JSON）"""
+    if filename == CATALOG_FILENAME:
+        return False
+    return filename.endswith(GESTURE_FILE_EXTENSION) or filename.endswith(LEGACY_FILE_EXTENSION)
+
+
+@contextmanager
+def atomic_write(filepath, mode='wb', **kwargs):
+    """原子寫入：先寫入同目錄的暫存檔並 fsync，成功後才以 os.replace 取代目標檔案
+
+    寫入中途發生例外或程式崩潰時，目標檔案維持原狀（只會留下 .tmp 暫存檔）。
+    """
+    temp_path = filepath + '.tmp'
+    try:
+        with open(temp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def quantize(landmarks):
+    """將地標量化為 int16，回傳 (量化值, scale, offset)"""
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    low = float(landmarks.min()) if landmarks.size else 0.0
+    high = float(landmarks.max()) if landmarks.size else 0.0
+    offset = (high + low) / 2
+    scale = max((high - low) / _INT16_LEVELS, 1e-9)
+    quantized = np.rint((landmarks - offset) / scale).astype('<i2')
+    return quantized, scale, offset
+
+
+def _encode_header(header):
+    """編碼並補齊標頭"""
+    payload = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    if len(payload) > HEADER_SIZE - len(MAGIC):
+        raise ValueError(f"標頭過大: {len(payload)} 位元組")
+    return MAGIC + payload.ljust(HEADER_SIZE - len(MAGIC), b' ')
+
+
+def write_gesture_file(filepath, name, landmarks, timestamp, timestamps=None, quantized=False,
+                       **extra):
+    """寫入二進位手勢檔案"""
+    landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+    header = {
+        'name': name,
+        'timestamp': timestamp,
+        'frame_count': int(len(landmarks)),
+        'shape': [21, 3],
+        'has_timestamps': timestamps is not None,
+    }
+    if quantized:
+        data, scale, offset = quantize(landmarks)
+        header.update(dtype='int16', scale=scale, offset=offset, max_error=scale / 2)
+    else:
+        data = landmarks.astype('<f4', copy=False)
+        header['dtype'] = 'float32'
+    header.update(extra)
+
+    with atomic_write(filepath) as f:
+        f.write(_encode_header(header))
+        f.write(np.ascontiguousarray(data).tobytes())
+        if timestamps is not None:
+            f.write(np.ascontiguousarray(timestamps, dtype='<f8').tobytes())
+    return header
+
+
+def read_header(filepath):
+    """讀取二進位手勢檔案的標頭"""
+    with open(filepath, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE or not raw.startswith(MAGIC):
+        raise ValueError(f"不是有效的手勢檔案: {filepath}")
+    return json.loads(raw[len(MAGIC):].decode('utf-8'))
+
+
+def update_header(filepath, **fields):
+    """原地改寫標頭欄位（資料區不變）"""
+    header = read_header(filepath)
+    header.update(fields)
+    with open(filepath, 'r+b') as f:
+        f.write(_encode_header(header))
+    return header
+
+
+def read_gesture_file(filepath, mmap=True):
+    """讀取二進位手勢檔案，回傳 (標頭, (幀數, 21, 3) float32 地標, 時間戳記或 None)
+
+    float32 檔案預設以唯讀 memmap 映射，不會一次讀入整個檔案；
+    int16 檔案會映射後再還原為 float32。
+    """
+    header = read_header(filepath)
+    if header.get('layout') == 'records':
+        return _read_records(filepath, header, mmap)
+
+    dtype = _DTYPES[header.get('dtype', 'float32')]
+    shape = (header['frame_count'],) + tuple(header.get('shape', (21, 3)))
+
+    if header['frame_count'] == 0:
+        return header, np.empty(shape, dtype=np.float32), None
+
+    count = int(np.prod(shape))
+    timestamps_offset = HEADER_SIZE + count * dtype.itemsize
+    timestamps = None
+    if mmap:
+        data = np.memmap(filepath, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=shape)
+        if header.get('has_timestamps'):
+            timestamps = np.memmap(filepath, dtype='<f8', mode='r', offset=timestamps_offset,
+                                   shape=(header['frame_count'],))
+    else:
+        with open(filepath, 'rb') as f:
+            f.seek(HEADER_SIZE)
+            data = np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+            if header.get('has_timestamps'):
+                timestamps = np.fromfile(f, dtype='<f8', count=header['frame_count'])
+
+    if header.get('dtype') == 'int16':
+        landmarks = data.astype(np.float32)
+        landmarks *= header['scale']
+        landmarks += header['offset']
+        return header, landmarks, timestamps
+    return header, data, timestamps
+
+
+def _record_count(filepath):
+    """由檔案大小推算完整寫入的記錄數（忽略結尾不完整的記錄）"""
+    return max(0, (os.path.getsize(filepath) - HEADER_SIZE) // RECORD_DTYPE.itemsize)
+
+
+def _read_records(filepath, header, mmap):
+    """讀取串流記錄格式（未完成的檔案以檔案大小決定幀數）"""
+    frame_count = header['frame_count'] if header.get('complete') else _record_count(filepath)
+    header['frame_count'] = frame_count
+    if frame_count == 0:
+        return header, np.empty((0, 21, 3), dtype=np.float32), np.empty(0, dtype=np.float64)
+    if mmap:
+        records = np.memmap(filepath, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE,
+                            shape=(frame_count,))
+    else:
+        with open(filepath, 'rb') as f:
+            f.seek(HEADER_SIZE)
+            records = np.fromfile(f, dtype=RECORD_DTYPE, count=frame_count)
+    return header, records['landmarks'], records['timestamp']
+
+
+class GestureStreamWriter:
+    """串流手勢錄製寫入器
+
+    記錄先累積在固定大小的區塊緩衝區，每滿 chunk_frames 幀就附加寫入 .part 檔案並 flush，
+    記憶體用量與錄製長度無關，程式崩潰時最多遺失最後一個未寫出的區塊。
+    fsync=True 時每個區塊都會 fsync（可抵抗斷電，但寫入延遲較高）。
+    finalize() 只改寫固定大小的標頭並更名，時間與錄製長度無關。
+    寫出區塊時同時累計地標的檢查碼與時間範圍，完成後 summary() 可直接建立
+    手勢庫目錄記錄，不必重新讀取整個檔案。
+    """
+
+    def __init__(self, filepath, name, timestamp, chunk_frames, fsync=False, **extra):
+        self.filepath = filepath
+        self.part_path = filepath + PART_SUFFIX
+        self.fsync = fsync
+        self.frame_count = 0
+        self._chunk = np.empty(chunk_frames, dtype=RECORD_DTYPE)
+        self._pending = 0
+        # 與 gesture_catalog.landmarks_checksum 相同（float32 地標位元組的 blake2b）
+        self._checksum = hashlib.blake2b(digest_size=8)
+        self._first_timestamp = None
+        self._last_timestamp = None
+        self._header = {
+            'name': name,
+            'timestamp': timestamp,
+            'frame_count': 0,
+            'shape': [21, 3],
+            'dtype': 'float32',
+            'layout': 'records',
+            'has_timestamps': True,
+            'complete': False,
+        }
+        self._header.update(extra)
+        self._file = open(self.part_path, 'wb')
+        self._file.write(_encode_header(self._header))
+        self._file.flush()
+
+    def set_header(self, **fields):
+        """設定標頭欄位（完成錄製時寫入）"""
+        self._header.update(fields)
+
+    def append(self, timestamp, landmarks):
+        """附加一幀（landmarks 為 21 組 (x, y, z)）"""
+        index = self._pending
+        self._chunk['timestamp'][index] = timestamp
+        self._chunk['landmarks'][index] = landmarks
+        self._pending += 1
+        self.frame_count += 1
+        if self._pending == len(self._chunk):
+            self.flush()
+
+    def flush(self):
+        """將目前區塊寫出到檔案"""
+        if self._pending:
+            records = self._chunk[:self._pending]
+            self._file.write(records.tobytes())
+            self._checksum.update(np.ascontiguousarray(records['landmarks']).tobytes())
+            if self._first_timestamp is None:
+                self._first_timestamp = float(records['timestamp'][0])
+            self._last_timestamp = float(records['timestamp'][-1])
+            self._pending = 0
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def finalize(self):
+        """寫出剩餘區塊、改寫標頭並更名為正式檔案，回傳檔案路徑"""
+        self.flush()
+        self._header.update(frame_count=self.frame_count, complete=True)
+        self._file.seek(0)
+        self._file.write(_encode_header(self._header))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.part_path, self.filepath)
+        return self.filepath
+
+    def summary(self):
+        """已寫出內容的摘要（名稱、幀數、持續時間、錄製時間、地標檢查碼）"""
+        duration = self.frame_count * 0.033
+        if self.frame_count > 1 and self._first_timestamp is not None:
+            duration = self._last_timestamp - self._first_timestamp
+        return {
+            'name': self._header['name'],
+            'frame_count': self.frame_count,
+            'duration': duration,
+            'timestamp': self._header['timestamp'],
+            'checksum': self._checksum.hexdigest(),
+        }
+
+    def discard(self):
+        """放棄錄製並刪除 .part 檔案"""
+        self._file.close()
+        try:
+            os.remove(self.part_path)
+        except OSError:
+            pass
+
+
+def recover_partial(part_path):
+    """復原未完成的串流錄製檔案，回傳正式檔案路徑（沒有任何完整幀時刪除並回傳 None）"""
+    read_header(part_path)  # 驗證魔術字串
+    frame_count = _record_count(part_path)
+    if frame_count == 0:
+        os.remove(part_path)
+        return None
+    # 截掉結尾不完整的記錄後改寫標頭
+    os.truncate(part_path, HEADER_SIZE + frame_count * RECORD_DTYPE.itemsize)
+    update_header(part_path, frame_count=frame_count, complete=True, recovered=True)
+    filepath = part_path[:-len(PART_SUFFIX)]
+    os.replace(part_path, filepath)
+    return filepath
+
+
+def read_legacy_json(filepath):
+    """讀取舊版 JSON 手勢檔案，回傳 (標頭, (幀數, 21, 3) float32 地標, 時間戳記或 None)"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    landmarks = np.asarray(data.get('landmarks', []), dtype=np.float32).reshape(-1, 21, 3)
+    timestamps = data.get('timestamps')
+    header = {
+        'name': data['name'],
+        'timestamp': data.get('timestamp', ''),
+        'frame_count': int(len(landmarks)),
+        'has_timestamps': timestamps is not None,
+    }
+    return header, landmarks, None if timestamps is None else np.asarray(timestamps, np.float64)
+
+
+def read_any(filepath, mmap=True):
+    """依副檔名讀取二進位或舊版 JSON 手勢檔案"""
+    if filepath.endswith(LEGACY_FILE_EXTENSION):
+        return read_legacy_json(filepath)
+    return read_gesture_file(filepath, mmap=mmap)
+
+
+def migrated_path(filepath):
+    """舊版 JSON 檔案對應的二進位檔案路徑"""
+    return os.path.splitext(filepath)[0] + GESTURE_FILE_EXTENSION
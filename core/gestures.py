@@ -4,79 +4,314 @@
 import time
 import numpy as np
 import mediapipe as mp
-from .config import FINGER_BENT_THRESHOLD, CLICK_TIME_THRESHOLD, GESTURE_HISTORY_LENGTH
+from .config import (FINGER_BENT_THRESHOLD, CLICK_TIME_THRESHOLD, GESTURE_HISTORY_LENGTH,
+                     GESTURE_ENTER_COUNT, GESTURE_EXIT_COUNT, GESTURE_TABLE,
+                     FINGER_EXTEND_OFFSETS, FINGER_EXTEND_HYSTERESIS,
+                     CAMERA_WIDTH, CAMERA_HEIGHT,
+                     PINCH_ARM_THRESHOLD, PINCH_CLOSE_THRESHOLD, PINCH_RELEASE_THRESHOLD,
+                     PINCH_CLOSING_VELOCITY, POSE_CLASSIFIER_ENABLED, POSE_MODEL_PATH)
+from .logger import get_logger
+from .pose_classifier import load_pose_classifier
+
+logger = get_logger('gestures')
 
 # 設定 MediaPipe 手部追蹤
 mp_hands = mp.solutions.hands
 mp_drawing = mp.solutions.drawing_utils
 mp_drawing_styles = mp.solutions.drawing_styles
 
+# 即時偵測使用的 MediaPipe Hands 設定（行程內與獨立推論行程共用）
+DETECTOR_HANDS_OPTIONS = {
+    'static_image_mode': False,
+    'max_num_hands': 1,
+    'min_detection_confidence': 0.5,
+    'min_tracking_confidence': 0.3,
+    'model_complexity': 0,
+}
+
+def landmarks_to_array(hand_landmarks):
+    """將 MediaPipe 手部地標轉為 (21, 3) float32 陣列"""
+    return np.array([(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark], dtype=np.float32)
+
 class Gestures:
     """手勢定義常數類"""
     MOVE = "move"        # 移動滑鼠
     LEFT_CLICK = "left click"  # 左鍵點擊
+    RIGHT_CLICK = "right click"  # 右鍵點擊
+    DRAG = "drag"        # 按住左鍵拖曳
+    PINCH = "pinch"      # 拇指與食指捏合（游標鎖定，閉合時左鍵點擊）
+
+def finger_mask(fingers_up):
+    """將五指狀態 (拇指, 食指, 中指, 無名指, 小指) 編碼為 5 位元遮罩（拇指為最高位）"""
+    return (fingers_up[0] << 4 | fingers_up[1] << 3 | fingers_up[2] << 2
+            | fingers_up[3] << 1 | fingers_up[4])
+
+class FingerStateEstimator:
+    """與旋轉及縮放無關的手指伸直判斷
+
+    每根手指的伸直分數 =（指尖到基準點距離 − 關節到基準點距離）/ 手掌大小，
+    四指以手腕為基準點、比較 PIP 關節，拇指以小指 MCP 為基準點、比較 IP 關節。
+    距離只取決於手部形狀，因此不受畫面旋轉、翻轉與手部遠近影響。
+    每根手指有各自的進入/離開閾值，在閾值附近不會來回跳動。
+    """
+    
+    WRIST = 0
+    MIDDLE_MCP = 9
+    TIPS = np.array([4, 8, 12, 16, 20])
+    JOINTS = np.array([3, 6, 10, 14, 18])    # 拇指 IP，其餘為 PIP
+    ANCHORS = np.array([17, 0, 0, 0, 0])     # 拇指以小指 MCP 為基準，其餘為手腕
+    
+    def __init__(self, threshold=FINGER_BENT_THRESHOLD, offsets=FINGER_EXTEND_OFFSETS,
+                 hysteresis=FINGER_EXTEND_HYSTERESIS):
+        center = threshold + np.asarray(offsets, dtype=np.float32)
+        self.enter_thresholds = center + hysteresis
+        self.exit_thresholds = center - hysteresis
+        self.state = np.zeros(5, dtype=bool)
+        self.last_scores = np.zeros(5, dtype=np.float32)
+    
+    @classmethod
+    def extension_scores(cls, landmarks, frame_shape=(CAMERA_HEIGHT, CAMERA_WIDTH)):
+        """計算五指伸直分數
+
+        Args:
+            landmarks: (21, 3) 正規化地標，或 (N, 21, 3) 批次
+            frame_shape: 影格形狀，用於把正規化座標還原為等比例座標
+        """
+        frame_h, frame_w = frame_shape[:2]
+        points = np.asarray(landmarks, dtype=np.float32) * np.array(
+            (frame_w, frame_h, frame_w), dtype=np.float32)
+        palm_size = np.linalg.norm(points[..., cls.MIDDLE_MCP, :] - points[..., cls.WRIST, :], axis=-1)
+        anchors = points[..., cls.ANCHORS, :]
+        tip_distance = np.linalg.norm(points[..., cls.TIPS, :] - anchors, axis=-1)
+        joint_distance = np.linalg.norm(points[..., cls.JOINTS, :] - anchors, axis=-1)
+        return (tip_distance - joint_distance) / np.maximum(palm_size, 1e-6)[..., None]
+    
+    def update(self, landmarks, frame_shape=(CAMERA_HEIGHT, CAMERA_WIDTH)):
+        """以遲滯更新五指狀態並回傳布林陣列（拇指, 食指, 中指, 無名指, 小指）"""
+        scores = self.extension_scores(landmarks, frame_shape)
+        self.last_scores = scores
+        self.state = np.where(self.state, scores > self.exit_thresholds, scores > self.enter_thresholds)
+        return self.state
+    
+    def reset(self):
+        """清除遲滯狀態"""
+        self.state[:] = False
+
+class PinchDetector:
+    """拇指與食指捏合點擊偵測
+
+    以指尖 3D 距離除以手掌大小判斷捏合，每個處理影格都會評估。
+    距離低於 arm 閾值時進入「捏合中」並通知呼叫端鎖定游標位置；
+    之後只要距離低於 close 閾值，或閉合速度超過 closing_velocity，
+    就立即觸發點擊，不等待去抖動視窗。距離回到 release 閾值以上才重新啟用。
+    """
+    
+    ARMED = "armed"        # 開始捏合（鎖定游標）
+    CLICK = "click"        # 觸發點擊
+    RELEASED = "released"  # 放開或取消（解除鎖定）
+    
+    THUMB_TIP = 4
+    INDEX_TIP = 8
+    
+    def __init__(self, arm_threshold=PINCH_ARM_THRESHOLD, close_threshold=PINCH_CLOSE_THRESHOLD,
+                 release_threshold=PINCH_RELEASE_THRESHOLD, closing_velocity=PINCH_CLOSING_VELOCITY):
+        self.arm_threshold = arm_threshold
+        self.close_threshold = close_threshold
+        self.release_threshold = release_threshold
+        self.closing_velocity = closing_velocity
+        self.reset()
+    
+    def reset(self):
+        """清除捏合狀態"""
+        self.armed = False
+        self.clicked = False
+        self.last_distance = None
+        self.last_time = None
+    
+    @property
+    def engaged(self):
+        """是否正在捏合（游標應保持鎖定）"""
+        return self.armed or self.clicked
+    
+    @classmethod
+    def pinch_distance(cls, landmarks, frame_shape=(CAMERA_HEIGHT, CAMERA_WIDTH)):
+        """拇指與食指指尖的正規化 3D 距離"""
+        frame_h, frame_w = frame_shape[:2]
+        scale = np.array((frame_w, frame_h, frame_w), dtype=np.float32)
+        palm_size = np.linalg.norm((landmarks[FingerStateEstimator.MIDDLE_MCP]
+                                    - landmarks[FingerStateEstimator.WRIST]) * scale)
+        distance = np.linalg.norm((landmarks[cls.THUMB_TIP] - landmarks[cls.INDEX_TIP]) * scale)
+        return float(distance / max(palm_size, 1e-6))
+    
+    def update(self, landmarks, frame_shape, timestamp):
+        """更新一幀並回傳事件（ARMED / CLICK / RELEASED），無事件時為 None"""
+        distance = self.pinch_distance(landmarks, frame_shape)
+        velocity = 0.0
+        if self.last_distance is not None and timestamp > self.last_time:
+            velocity = (distance - self.last_distance) / (timestamp - self.last_time)
+        self.last_distance = distance
+        self.last_time = timestamp
+        
+        if self.engaged:
+            if distance > self.release_threshold:
+                self.armed = False
+                self.clicked = False
+                return self.RELEASED
+            if self.armed and not self.clicked and (
+                    distance < self.close_threshold or -velocity > self.closing_velocity):
+                self.clicked = True
+                return self.CLICK
+            return None
+        
+        if distance < self.arm_threshold:
+            self.armed = True
+            # 已經快速閉合或已閉合時同一幀直接點擊
+            if distance < self.close_threshold or -velocity > self.closing_velocity:
+                self.clicked = True
+                return self.CLICK
+            return self.ARMED
+        return None
+
+class GestureClassifier:
+    """查表式手勢分類器
+
+    手指狀態編碼為 5 位元遮罩後直接查 32 項對照表取得候選手勢，
+    再以固定長度的環形歷史做進入/離開遲滯：候選手勢至少出現
+    enter_count 次且多於目前手勢才切換，目前手勢少於 exit_count 次才離開。
+    各手勢的出現次數隨歷史增量維護，每幀只有常數次操作。
+    update 可直接給定候選手勢名稱（例如姿勢分類器的結果），取代查表。
+    """
+    
+    NONE = 0  # 無手勢的編號
+    
+    def __init__(self, table=GESTURE_TABLE, history_length=GESTURE_HISTORY_LENGTH,
+                 enter_count=GESTURE_ENTER_COUNT, exit_count=GESTURE_EXIT_COUNT):
+        # 編號 0 保留給「無手勢」
+        self.gesture_names = [None] + sorted(set(table.values()))
+        self._ids = {name: index for index, name in enumerate(self.gesture_names)}
+        self.lookup = [self.NONE] * 32
+        for fingers, name in table.items():
+            self.lookup[finger_mask(fingers)] = self._ids[name]
+        
+        self.history_length = history_length
+        self.enter_count = min(enter_count, history_length)
+        self.exit_count = exit_count
+        self.reset()
+    
+    def reset(self):
+        """清除歷史（例如手部離開畫面時）"""
+        self._history = [self.NONE] * self.history_length
+        self._counts = [0] * len(self.gesture_names)
+        self._counts[self.NONE] = self.history_length
+        self._position = 0
+        self.current = self.NONE
+    
+    def register(self, names):
+        """加入對照表以外的手勢名稱（例如姿勢分類器的姿勢）"""
+        for name in names:
+            if name not in self._ids:
+                self._ids[name] = len(self.gesture_names)
+                self.gesture_names.append(name)
+                self._counts.append(0)
+    
+    def update(self, mask, candidate_name=None):
+        """加入一幀的手指遮罩並回傳穩定後的手勢名稱（無手勢時為 None）
+
+        candidate_name 不為 None 時以該名稱（需已註冊）作為候選手勢，不查表。
+        """
+        candidate = self.lookup[mask] if candidate_name is None else self._ids[candidate_name]
+        
+        # 更新環形歷史與各手勢出現次數
+        counts = self._counts
+        counts[self._history[self._position]] -= 1
+        self._history[self._position] = candidate
+        counts[candidate] += 1
+        self._position = (self._position + 1) % self.history_length
+        
+        current = self.current
+        if candidate != current and counts[candidate] >= self.enter_count \
+                and counts[candidate] > counts[current]:
+            self.current = candidate
+        elif counts[current] < self.exit_count:
+            self.current = self.NONE
+        
+        return self.gesture_names[self.current]
 
 class GestureDetector:
     """手勢檢測器"""
     
     def __init__(self):
-        self.hands = mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=1,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.3,
-            model_complexity=0
-        )
+        self.hands = mp_hands.Hands(**DETECTOR_HANDS_OPTIONS)
         
         self.prev_hand_landmarks = None
+        self.last_finger_mask = 0  # 最近一次的 5 位元手指狀態（拇指為最高位）
+        self.finger_estimator = FingerStateEstimator()
+        self.classifier = GestureClassifier()
         
-    def get_finger_up_status(self, hand_landmarks):
-        """判斷五指是否伸直"""
-        fingers_up = [0, 0, 0, 0, 0]  # 大拇指, 食指, 中指, 無名指, 小指
-        
-        # 大拇指判斷 (基於大拇指尖與大拇指關節的水平位置)
-        if hand_landmarks.landmark[mp_hands.HandLandmark.THUMB_TIP].x < hand_landmarks.landmark[mp_hands.HandLandmark.THUMB_IP].x:
-            fingers_up[0] = 1
-        
-        # 其他四指判斷 (基於指尖與第二關節的垂直位置)
-        finger_tips = [
-            mp_hands.HandLandmark.INDEX_FINGER_TIP, 
-            mp_hands.HandLandmark.MIDDLE_FINGER_TIP,
-            mp_hands.HandLandmark.RING_FINGER_TIP, 
-            mp_hands.HandLandmark.PINKY_TIP
-        ]
-        finger_pips = [
-            mp_hands.HandLandmark.INDEX_FINGER_PIP, 
-            mp_hands.HandLandmark.MIDDLE_FINGER_PIP,
-            mp_hands.HandLandmark.RING_FINGER_PIP, 
-            mp_hands.HandLandmark.PINKY_PIP
-        ]
-        
-        for i in range(4):
-            if hand_landmarks.landmark[finger_tips[i]].y < hand_landmarks.landmark[finger_pips[i]].y:
-                fingers_up[i+1] = 1
+        # 由錄製手勢訓練的姿勢分類器（沒有模型檔案時只使用對照表）
+        self.pose_classifier = None
+        self.last_pose = None  # 最近一次的 (姿勢名稱或 None, 最近鄰距離)
+        self._pending_pose_classifier = None
+        if POSE_CLASSIFIER_ENABLED:
+            self.set_pose_classifier(load_pose_classifier(POSE_MODEL_PATH))
+    
+    def set_pose_classifier(self, pose_classifier):
+        """設定姿勢分類器（None 表示停用）
+
+        可從其他執行緒呼叫：實際替換延到影像執行緒下一次 detect_gesture 時進行。
+        """
+        self._pending_pose_classifier = (pose_classifier,)
+    
+    def _apply_pose_classifier(self):
+        """在影像執行緒套用新的姿勢分類器"""
+        pending = self._pending_pose_classifier
+        self._pending_pose_classifier = None
+        self.pose_classifier = pending[0]
+        if self.pose_classifier is not None:
+            self.classifier.register(self.pose_classifier.classes)
         
-        return fingers_up
+    def get_finger_up_status(self, landmarks, frame_shape=(CAMERA_HEIGHT, CAMERA_WIDTH)):
+        """判斷五指是否伸直（含遲滯），回傳 [拇指, 食指, 中指, 無名指, 小指]"""
+        if not isinstance(landmarks, np.ndarray):
+            landmarks = landmarks_to_array(landmarks)
+        return self.finger_estimator.update(landmarks, frame_shape).astype(int).tolist()
     
     def detect_gesture(self, hand_landmarks, frame_shape):
-        """超簡化的手勢檢測：只檢測食指位置進行移動"""
-        fingers_up = self.get_finger_up_status(hand_landmarks)
+        """查表式手勢檢測：手指狀態遮罩查表後經時間遲滯穩定
+
+        hand_landmarks 可為 MediaPipe 地標或 (21, 3) 陣列。
+        """
+        if not isinstance(hand_landmarks, np.ndarray):
+            hand_landmarks = landmarks_to_array(hand_landmarks)
+        fingers_up = self.get_finger_up_status(hand_landmarks, frame_shape)
+        self.last_finger_mask = finger_mask(fingers_up)
         
-        # 除錯輸出
-        print(f"[DEBUG] 手指狀態: {fingers_up} (拇指,食指,中指,無名指,小指)")
+        # 除錯輸出（預設等級下不輸出，且受頻率限制）
+        logger.debug("手指狀態: %s (拇指,食指,中指,無名指,小指)", fingers_up)
         
-        gesture = None
+        # 已訓練的姿勢優先於對照表
+        if self._pending_pose_classifier is not None:
+            self._apply_pose_classifier()
+        pose = None
+        if self.pose_classifier is not None:
+            self.last_pose = self.pose_classifier.predict_landmarks(hand_landmarks, frame_shape)
+            pose = self.last_pose[0]
         
-        # 檢查是否有食指伸直（移動模式）
-        if fingers_up == [1, 0, 1, 1, 1] or fingers_up == [0, 1, 0, 0, 0]:
-            gesture = Gestures.MOVE
-            print(f"[DEBUG] 移動模式: {fingers_up}")
+        gesture = self.classifier.update(self.last_finger_mask, pose)
         
         # 更新前一個手部地標
         self.prev_hand_landmarks = hand_landmarks
         
         return gesture
     
+    def reset(self):
+        """手部離開畫面時清除手勢歷史"""
+        self.classifier.reset()
+        self.finger_estimator.reset()
+        self.prev_hand_landmarks = None
+        self.last_finger_mask = 0
+        self.last_pose = None
+    
     def process_frame(self, rgb_frame):
         """處理影格並返回手部檢測結果"""
         return self.hands.process(rgb_frame)
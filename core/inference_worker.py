@@ -0,0 +1,307 @@
+"""
+獨立行程的 MediaPipe 推論模組
+"""
+import multiprocessing as mp_process
+import time
+from collections import deque
+
+import numpy as np
+
+from .config import (INFERENCE_RING_SLOTS, INFERENCE_WORKER_TIMEOUT,
+                     INFERENCE_WORKER_START_TIMEOUT, INFERENCE_WORKER_MAX_RESTARTS)
+from .frame_bus import FrameBus, FrameRef
+from .logger import get_logger
+
+logger = get_logger('inference_worker')
+
+# 推論結果的固定格式（以 send_bytes 傳送，不經過 pickle）
+RESULT_DTYPE = np.dtype([
+    ('seq', '<i8'),
+    ('detected', 'u1'),
+    ('inference_ms', '<f4'),
+    ('landmarks', '<f4', (21, 3)),
+])
+READY = b'ready'
+TIMING_HISTORY = 100
+
+
+class _NotReady:
+    """process() 沒有這一幀結果時的回傳值（與「沒有偵測到手」的 None 區分）"""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'NOT_READY'
+
+    def __bool__(self):
+        return False
+
+
+NOT_READY = _NotReady()
+
+
+def _worker_main(bus, conn, hands_options):
+    """工作行程主迴圈：讀取影格匯流排槽位中的 RGB 影格並回傳地標
+
+    槽位的參考由父行程持有到收到結果為止，這裡只讀取視圖。
+    收到匯流排資訊（dict）時改為唯讀附加到新的匯流排，不重新載入模型。
+    """
+    import mediapipe as mp
+
+    hands = mp.solutions.hands.Hands(**hands_options)
+    result = np.zeros(1, dtype=RESULT_DTYPE)
+    try:
+        conn.send_bytes(READY)
+        while True:
+            request = conn.recv()
+            if request is None:
+                break
+            if isinstance(request, dict):
+                bus.close()
+                bus = FrameBus.attach_reader(request)
+                continue
+            seq, slot = request
+            start = time.perf_counter()
+            results = hands.process(bus.view(slot))
+            result['seq'] = seq
+            result['detected'] = bool(results.multi_hand_landmarks)
+            if results.multi_hand_landmarks:
+                result['landmarks'][0] = [(lm.x, lm.y, lm.z) for lm
+                                          in results.multi_hand_landmarks[0].landmark]
+            result['inference_ms'] = (time.perf_counter() - start) * 1000
+            conn.send_bytes(result.tobytes())
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        hands.close()
+        bus.close()
+
+
+class InferenceWorker:
+    """在獨立行程執行 MediaPipe 手部偵測
+
+    影格放在共享記憶體的 FrameBus 中，只透過 Pipe 傳送 (序號, 槽位)，
+    結果以固定大小的位元組記錄傳回，影格不會被 pickle。傳入 FrameRef 時直接使用
+    擷取端的匯流排（不複製，工作行程附加到該匯流排）；傳入陣列時複製到工作器自己的匯流排。
+    推論在另一個行程中進行，不與 Tk 和 NumPy 工作搶 GIL。
+    匯流排更換（畫面旋轉造成形狀改變）時只傳送新匯流排的資訊讓工作行程重新附加，
+    不重新啟動行程也不重新載入模型。
+    工作行程崩潰或逾時會自動重新啟動（超過 max_restarts 次後標記為失敗，
+    由呼叫端改回行程內偵測）；啟動中（模型載入）的影格由 process() 回傳 NOT_READY。
+    """
+
+    def __init__(self, hands_options, slots=INFERENCE_RING_SLOTS, timeout=INFERENCE_WORKER_TIMEOUT,
+                 start_timeout=INFERENCE_WORKER_START_TIMEOUT,
+                 max_restarts=INFERENCE_WORKER_MAX_RESTARTS):
+        self.hands_options = dict(hands_options)
+        self.slots = slots
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.max_restarts = max_restarts
+        self._context = mp_process.get_context('spawn')
+
+        self._bus = None          # 工作行程目前附加的匯流排
+        self._private_bus = None  # 傳入陣列時使用的匯流排
+        self._process = None
+        self._conn = None
+        self._ready = False
+        self._start_time = 0.0
+        self._next_seq = 0
+        self._in_flight = deque()  # (序號, 送出時間, FrameRef)
+
+        # 統計資訊
+        self.failed = False
+        self.restarts = 0
+        self.frames = 0
+        self.inference_ms = deque(maxlen=TIMING_HISTORY)  # 工作行程內的推論時間
+        self.roundtrip_ms = deque(maxlen=TIMING_HISTORY)  # 送出到收到結果的時間
+
+    # ===== 行程管理 =====
+
+    def _copy_to_private_bus(self, rgb_frame):
+        """將陣列複製到工作器自己的匯流排，回傳 FrameRef（沒有空槽位時回傳 None）"""
+        bus = self._private_bus
+        if bus is None or bus.frame_shape != rgb_frame.shape:
+            if bus is not None:
+                bus.close()
+            # 匯流排對最新影格保留一個參考，因此多配置一個槽位
+            bus = self._private_bus = FrameBus(rgb_frame.shape, slots=self.slots + 1)
+        slot = bus.acquire()
+        if slot is None:
+            return None
+        np.copyto(bus.buffer(slot), rgb_frame)
+        return bus.publish(slot)
+
+    def _start(self):
+        """啟動工作行程（不等待模型載入完成）"""
+        parent_conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_worker_main,
+            args=(self._bus, child_conn, self.hands_options),
+            name='inference-worker', daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self._ready = False
+        self._start_time = time.perf_counter()
+        self._release_in_flight()
+
+    def _stop(self):
+        """停止工作行程"""
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._process.join(timeout=1.0)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join(timeout=1.0)
+        self._conn.close()
+        self._process = None
+        self._conn = None
+        self._release_in_flight()
+
+    def _attach(self, bus):
+        """讓工作行程改讀另一個匯流排（Pipe 依序處理，先前送出的要求仍讀取舊匯流排）"""
+        self._bus = bus
+        if self._process is None:
+            return
+        try:
+            self._conn.send(bus.reader_state())
+        except (OSError, ValueError):
+            self._restart("傳送失敗")
+
+    def _release_in_flight(self):
+        """釋放所有進行中推論持有的影格參考"""
+        while self._in_flight:
+            self._in_flight.popleft()[2].release()
+
+    def _restart(self, reason):
+        """重新啟動工作行程（超過次數上限時標記為失敗）"""
+        self._stop()
+        self.restarts += 1
+        if self.restarts > self.max_restarts:
+            self.failed = True
+            logger.error("推論工作行程已重新啟動 %d 次仍失敗（%s），改用行程內偵測",
+                         self.max_restarts, reason)
+            return
+        logger.warning("推論工作行程重新啟動（%s），第 %d 次", reason, self.restarts)
+        self._start()
+
+    def _check_ready(self):
+        """檢查工作行程是否已載入模型"""
+        if self._ready:
+            return True
+        try:
+            if self._conn.poll(0):
+                self._ready = self._conn.recv_bytes() == READY
+                if self._ready:
+                    logger.info("推論工作行程已就緒 (%.1f 秒)", time.perf_counter() - self._start_time)
+                return self._ready
+        except (EOFError, OSError):
+            self._restart("啟動失敗")
+            return False
+        if not self._process.is_alive():
+            self._restart("啟動時結束")
+        elif time.perf_counter() - self._start_time > self.start_timeout:
+            self._restart("啟動逾時")
+        return False
+
+    # ===== 推論 =====
+
+    def submit(self, frame):
+        """送出推論要求，回傳序號（尚未就緒、進行中的推論已達上限或沒有空槽位時回傳 None）
+
+        frame 可以是 FrameRef（持有一個額外參考直到收到結果，不複製）或 RGB 陣列。
+        """
+        if self.failed:
+            return None
+        if isinstance(frame, FrameRef):
+            ref = frame.retain()
+        else:
+            if len(self._in_flight) >= self.slots:
+                return None
+            ref = self._copy_to_private_bus(frame)
+            if ref is None:
+                return None
+        if ref.bus is not self._bus:
+            # 換了匯流排（畫面旋轉等造成形狀改變）：工作行程重新附加
+            self._attach(ref.bus)
+        if self._process is None:
+            self._start()
+        if not self._check_ready() or len(self._in_flight) >= self.slots:
+            ref.release()
+            return None
+
+        seq = self._next_seq
+        self._next_seq += 1
+        try:
+            self._conn.send((seq, ref.slot))
+        except (OSError, ValueError):
+            ref.release()
+            self._restart("傳送失敗")
+            return None
+        self._in_flight.append((seq, time.perf_counter(), ref))
+        return seq
+
+    def collect(self, timeout=None):
+        """取得最早送出的推論結果，回傳 (序號, 地標 (21, 3) 或 None)；逾時或失敗時回傳 None"""
+        if not self._in_flight:
+            return None
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            if not self._conn.poll(timeout):
+                self._restart("推論逾時")
+                return None
+            record = np.frombuffer(self._conn.recv_bytes(), dtype=RESULT_DTYPE)[0]
+        except (EOFError, OSError):
+            self._restart("工作行程已結束")
+            return None
+
+        seq, sent_time, ref = self._in_flight.popleft()
+        ref.release()
+        self.frames += 1
+        self.inference_ms.append(float(record['inference_ms']))
+        self.roundtrip_ms.append((time.perf_counter() - sent_time) * 1000)
+        landmarks = record['landmarks'].copy() if record['detected'] else None
+        return seq, landmarks
+
+    def process(self, frame):
+        """同步推論一個影格（FrameRef 或 RGB 陣列），回傳 (21, 3) 地標或 None（沒有偵測到手）
+
+        工作行程啟動中、重新啟動或沒有空槽位而沒有這一幀的結果時回傳 NOT_READY。
+        """
+        if self.submit(frame) is None:
+            return NOT_READY
+        result = self.collect()
+        return result[1] if result else NOT_READY
+
+    @property
+    def ready(self):
+        return self._ready and not self.failed
+
+    def get_stats(self):
+        """取得推論時間統計（毫秒）"""
+        def mean(values):
+            return sum(values) / len(values) if values else 0.0
+        inference = mean(self.inference_ms)
+        roundtrip = mean(self.roundtrip_ms)
+        return {
+            'frames': self.frames,
+            'restarts': self.restarts,
+            'failed': self.failed,
+            'inference_ms': inference,
+            'roundtrip_ms': roundtrip,
+            'overhead_ms': max(0.0, roundtrip - inference),
+        }
+
+    def close(self):
+        """停止工作行程並釋放工作器自己的匯流排"""
+        self._stop()
+        self._bus = None
+        if self._private_bus is not None:
+            self._private_bus.close()
+            self._private_bus = None
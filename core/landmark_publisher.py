@@ -0,0 +1,279 @@
+"""
+手部地標本機串流模組
+"""
+import collections
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from .config import (LANDMARK_SOCKET_PATH, LANDMARK_SUBSCRIBER_TIMEOUT, LANDMARK_PUBLISH_QUEUE)
+from .gestures import Gestures
+from .logger import get_logger
+
+logger = get_logger('landmark_publisher')
+
+# 每幀固定 272 位元組的記錄（小端序），未偵測到手部時 detected 為 0、地標為 0
+RECORD_VERSION = 1
+RECORD_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('timestamp', '<f8'),           # time.time() 秒
+    ('landmarks', '<f4', (21, 3)),  # MediaPipe 正規化座標（方向調整後的畫面）
+    ('gesture', '<u2'),             # gesture_id()，0 表示沒有手勢
+    ('detected', 'u1'),
+    ('version', 'u1'),
+])
+# 與 RECORD_DTYPE 相同的打包格式（主迴圈以 struct 打包，比逐欄位寫入 numpy 記錄快）
+RECORD_STRUCT = struct.Struct('<Qd252sHBB')
+NO_LANDMARKS = bytes(21 * 3 * 4)
+assert RECORD_STRUCT.size == RECORD_DTYPE.itemsize
+
+# 內建手勢的固定編號；自訂姿勢名稱的編號為 0x8000 | (crc32(名稱) & 0x7fff)
+GESTURE_IDS = {
+    None: 0,
+    Gestures.MOVE: 1,
+    Gestures.LEFT_CLICK: 2,
+    Gestures.RIGHT_CLICK: 3,
+    Gestures.DRAG: 4,
+    Gestures.PINCH: 5,
+}
+CUSTOM_GESTURE_FLAG = 0x8000
+
+SUBSCRIBE = b'SUB'
+UNSUBSCRIBE = b'UNSUB'
+POLL_INTERVAL = 0.1  # 沒有新記錄時檢查訂閱要求的間隔（秒）
+
+
+def gesture_id(name):
+    """手勢名稱轉為記錄中的編號（不需要查表，訂閱端可自行計算）"""
+    if name in GESTURE_IDS:
+        return GESTURE_IDS[name]
+    return CUSTOM_GESTURE_FLAG | (zlib.crc32(name.encode('utf-8')) & 0x7fff)
+
+
+def gesture_name(value, custom_names=()):
+    """記錄中的編號轉回手勢名稱（自訂姿勢需提供候選名稱），無法辨識時回傳 None"""
+    for name, known in GESTURE_IDS.items():
+        if known == value:
+            return name
+    for name in custom_names:
+        if gesture_id(name) == value:
+            return name
+    return None
+
+
+class LandmarkPublisher:
+    """以 Unix 網域資料包通訊端將每幀地標串流給本機的其他程式
+
+    訂閱端從自己綁定的位址送出 SUBSCRIBE（並在 LANDMARK_SUBSCRIBER_TIMEOUT 內定期重送），
+    發布端對每個訂閱端以非阻塞 sendto 送出固定大小的記錄：訂閱端接收緩衝區已滿時
+    該幀直接丟棄並計數，不會為慢的訂閱端緩衝或等待；訂閱端消失時自動移除。
+
+    主迴圈的 publish() 只把記錄放進有上限的佇列（沒有訂閱端時直接返回），
+    實際傳送在背景執行緒進行，不會拖慢主迴圈。
+    """
+
+    def __init__(self, path=LANDMARK_SOCKET_PATH, subscriber_timeout=LANDMARK_SUBSCRIBER_TIMEOUT,
+                 queue_size=LANDMARK_PUBLISH_QUEUE):
+        self.path = path
+        self.subscriber_timeout = subscriber_timeout
+        self._queue = collections.deque(maxlen=queue_size)
+        self._wakeup = threading.Event()
+        self._subscribers = {}  # 位址 -> 最後一次收到訂閱要求的時間（只在傳送執行緒修改）
+        self._sock = None
+        self._thread = None
+        self._running = False
+
+        # 統計資訊
+        self.subscriber_count = 0
+        self.published = 0
+        self.sent = 0
+        self.dropped = 0        # 訂閱端接收緩衝區已滿而丟棄的記錄
+        self.queue_dropped = 0  # 傳送執行緒落後而丟棄的記錄
+
+    def start(self):
+        """綁定通訊端並啟動傳送執行緒"""
+        if not hasattr(socket, 'AF_UNIX'):
+            raise OSError("此平台不支援 Unix 網域通訊端")
+        self._remove_stale_socket()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._sock.setblocking(False)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='landmark-publisher', daemon=True)
+        self._thread.start()
+        logger.info("地標串流: %s", self.path)
+        return self
+
+    def _remove_stale_socket(self):
+        """移除上次異常結束留下的通訊端檔案（仍有發布端在使用時拋出 OSError）"""
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            probe.connect(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise OSError(f"地標串流通訊端已在使用中: {self.path}")
+
+    def publish(self, seq, timestamp, landmarks, gesture):
+        """發布一幀（在主迴圈呼叫；landmarks 為 (21, 3) 陣列或 None）"""
+        if not self.subscriber_count:
+            return
+        if landmarks is not None:
+            points = np.ascontiguousarray(landmarks, dtype=np.float32).tobytes()
+        else:
+            points = NO_LANDMARKS
+        record = RECORD_STRUCT.pack(seq, timestamp, points, gesture_id(gesture),
+                                    landmarks is not None, RECORD_VERSION)
+        if len(self._queue) == self._queue.maxlen:
+            self.queue_dropped += 1
+        self._queue.append(record)
+        self.published += 1
+        self._wakeup.set()
+
+    def _run(self):
+        """傳送執行緒：處理訂閱要求並送出佇列中的記錄"""
+        while self._running:
+            self._wakeup.wait(POLL_INTERVAL)
+            self._wakeup.clear()
+            self._receive_requests()
+            while self._queue:
+                self._send(self._queue.popleft())
+
+    def _receive_requests(self):
+        """處理訂閱與取消訂閱要求，並移除逾時的訂閱端"""
+        now = time.monotonic()
+        while True:
+            try:
+                message, address = self._sock.recvfrom(64)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                return
+            if not address:
+                continue  # 未綁定位址的傳送端無法接收記錄
+            if message == SUBSCRIBE:
+                if address not in self._subscribers:
+                    logger.info("地標訂閱端加入: %s", address)
+                self._subscribers[address] = now
+            elif message == UNSUBSCRIBE:
+                self._remove(address)
+
+        for address, last_seen in list(self._subscribers.items()):
+            if now - last_seen > self.subscriber_timeout:
+                self._remove(address, "逾時")
+        self.subscriber_count = len(self._subscribers)
+
+    def _remove(self, address, reason="取消訂閱"):
+        if self._subscribers.pop(address, None) is not None:
+            logger.info("地標訂閱端離開（%s）: %s", reason, address)
+        self.subscriber_count = len(self._subscribers)
+
+    def _send(self, data):
+        """以非阻塞方式送給每個訂閱端（緩衝區已滿時丟棄，訂閱端已不存在時移除）"""
+        for address in list(self._subscribers):
+            try:
+                self._sock.sendto(data, address)
+                self.sent += 1
+            except (BlockingIOError, InterruptedError):
+                self.dropped += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                self._remove(address, "已關閉")
+            except OSError as e:
+                self._remove(address, str(e))
+
+    def get_stats(self):
+        """取得傳送統計"""
+        return {
+            'subscribers': self.subscriber_count,
+            'published': self.published,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'queue_dropped': self.queue_dropped,
+        }
+
+    def close(self):
+        """停止傳送執行緒並刪除通訊端檔案"""
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        self._thread.join(timeout=1.0)
+        self._sock.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class LandmarkSubscriber:
+    """地標串流的訂閱端（供其他本機程式使用）
+
+    綁定一個暫存的資料包位址並向發布端訂閱，receive() 時依需要重送訂閱要求
+    （發布端重新啟動後會自動重新訂閱）。處理太慢時記錄會在發布端被丟棄，
+    可從 seq 的間隔得知丟棄了幾幀。
+    """
+
+    def __init__(self, path=LANDMARK_SOCKET_PATH, heartbeat=LANDMARK_SUBSCRIBER_TIMEOUT / 3):
+        self.path = path
+        self.heartbeat = heartbeat
+        self.address = os.path.join(tempfile.gettempdir(),
+                                    f"air-mouse-sub-{os.getpid()}-{id(self):x}.sock")
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.address)
+        self._last_subscribe = 0.0
+        self._subscribe()
+
+    def _subscribe(self):
+        """送出訂閱要求（發布端尚未啟動時忽略）"""
+        self._last_subscribe = time.monotonic()
+        try:
+            self._sock.sendto(SUBSCRIBE, self.path)
+        except (ConnectionRefusedError, FileNotFoundError, BlockingIOError):
+            pass
+
+    def receive(self, timeout=None):
+        """接收下一筆記錄（RECORD_DTYPE 的 numpy 純量），逾時回傳 None"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if time.monotonic() - self._last_subscribe >= self.heartbeat:
+                self._subscribe()
+            wait = self.heartbeat
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return None
+            self._sock.settimeout(wait)
+            try:
+                data = self._sock.recv(RECORD_DTYPE.itemsize)
+            except socket.timeout:
+                continue
+            if len(data) == RECORD_DTYPE.itemsize:
+                return np.frombuffer(data, dtype=RECORD_DTYPE)[0]
+
+    def close(self):
+        """取消訂閱並刪除暫存位址"""
+        try:
+            self._sock.sendto(UNSUBSCRIBE, self.path)
+        except OSError:
+            pass
+        self._sock.close()
+        try:
+            os.unlink(self.address)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
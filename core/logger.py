@@ -0,0 +1,217 @@
+"""
+日誌與追蹤記錄模組
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from .config import LOG_LEVEL, LOG_RATE_LIMIT_SECONDS, TRACE_BUFFER_SIZE, TRACE_DUMP_DIR
+
+LOGGER_NAME = 'air_mouse'
+
+_listener = None
+
+
+class RateLimitFilter(logging.Filter):
+    """依呼叫位置限制日誌頻率
+
+    同一行程式碼在 min_interval 秒內只放行一筆記錄，其餘直接丟棄並計數。
+    只限制 max_level（含）以下的記錄，警告與錯誤一律放行。
+    """
+
+    def __init__(self, min_interval=LOG_RATE_LIMIT_SECONDS, max_level=logging.DEBUG):
+        super().__init__()
+        self.min_interval = min_interval
+        self.max_level = max_level
+        self.suppressed = 0
+        self._last_emit = {}
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        key = (record.pathname, record.lineno)
+        last = self._last_emit.get(key)
+        if last is not None and record.created - last < self.min_interval:
+            self.suppressed += 1
+            return False
+        self._last_emit[key] = record.created
+        return True
+
+
+def setup_logging(level=LOG_LEVEL, rate_limit=LOG_RATE_LIMIT_SECONDS, stream=None):
+    """設定非同步日誌
+
+    呼叫端只把記錄放入佇列（QueueHandler），實際格式化與寫出由背景執行緒
+    （QueueListener）處理，熱迴圈不會因為 stdout 或主控台渲染而阻塞。
+    """
+    global _listener
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.propagate = False
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    if rate_limit:
+        queue_handler.addFilter(RateLimitFilter(rate_limit))
+    logger.addHandler(queue_handler)
+
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return logger
+
+
+def shutdown_logging():
+    """停止背景寫出執行緒並送出剩餘記錄"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name=None):
+    """取得 Air Mouse 的日誌器（未設定時不會輸出任何內容）"""
+    if name:
+        return logging.getLogger(f'{LOGGER_NAME}.{name}')
+    return logging.getLogger(LOGGER_NAME)
+
+
+# 未呼叫 setup_logging 前不輸出任何記錄
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+
+TRACE_DTYPE = np.dtype([
+    ('timestamp', 'f8'),      # time.time()
+    ('frame_index', 'u8'),
+    ('hand_detected', '?'),
+    ('finger_mask', 'u1'),    # 5 位元手指狀態（拇指為最高位）
+    ('gesture_id', 'u2'),     # 手勢名稱表中的索引（0 表示無手勢），匯出時轉回完整名稱
+    ('inference_ms', 'f4'),
+    ('control_ms', 'f4'),
+    ('total_ms', 'f4'),
+    ('event', 'U8'),          # 本幀送出的滑鼠事件（click / pinch），無事件時為空字串
+    ('event_latency_ms', 'f4'),  # 從擷取影格到送出事件的延遲
+])
+
+
+class TraceRingBuffer:
+    """固定大小的每幀追蹤記錄環形緩衝區
+
+    記錄寫入預先配置的結構化陣列，超過容量時覆寫最舊的記錄，
+    可隨時或在程式崩潰時匯出到磁碟。手勢名稱長度不固定（自訂姿勢），
+    緩衝區只存名稱表的索引，匯出時才轉回完整名稱。
+    """
+
+    def __init__(self, capacity=TRACE_BUFFER_SIZE):
+        self.capacity = capacity
+        self._records = np.zeros(capacity, dtype=TRACE_DTYPE)
+        self._next = 0
+        self._count = 0
+        self._gesture_names = ['']
+        self._gesture_ids = {'': 0}
+        self._lock = threading.Lock()
+
+    def append(self, frame_index, hand_detected, finger_mask, gesture,
+               inference_ms, control_ms, total_ms, timestamp=None,
+               event=None, event_latency_ms=0.0):
+        """新增一筆每幀記錄"""
+        with self._lock:
+            gesture_id = self._gesture_ids.get(gesture or '')
+            if gesture_id is None:
+                gesture_id = self._gesture_ids[gesture] = len(self._gesture_names)
+                self._gesture_names.append(gesture)
+            self._records[self._next] = (
+                time.time() if timestamp is None else timestamp, frame_index, hand_detected,
+                finger_mask, gesture_id, inference_ms, control_ms, total_ms,
+                event or '', event_latency_ms
+            )
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def snapshot(self):
+        """依時間順序複製目前的記錄（gesture_id 欄位換成完整的 gesture 名稱）"""
+        with self._lock:
+            if self._count < self.capacity:
+                records = self._records[:self._count].copy()
+            else:
+                records = np.concatenate((self._records[self._next:], self._records[:self._next]))
+            names = np.array(self._gesture_names)
+
+        fields = [('gesture', names.dtype) if name == 'gesture_id' else (name, TRACE_DTYPE[name])
+                  for name in TRACE_DTYPE.names]
+        result = np.empty(len(records), dtype=fields)
+        for name in TRACE_DTYPE.names:
+            if name == 'gesture_id':
+                result['gesture'] = names[records['gesture_id']]
+            else:
+                result[name] = records[name]
+        return result
+
+    def clear(self):
+        """清除所有記錄"""
+        with self._lock:
+            self._next = 0
+            self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def dump(self, filepath=None):
+        """匯出追蹤記錄（.jsonl 為文字格式，其他副檔名使用 .npy）"""
+        if filepath is None:
+            os.makedirs(TRACE_DUMP_DIR, exist_ok=True)
+            filename = f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.npy"
+            filepath = os.path.join(TRACE_DUMP_DIR, filename)
+
+        records = self.snapshot()
+        if filepath.endswith('.jsonl'):
+            with open(filepath, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps({name: record[name].item() for name in records.dtype.names},
+                                       ensure_ascii=False))
+                    f.write('\n')
+        else:
+            np.save(filepath, records)
+        return filepath
+
+
+def install_crash_dump(trace):
+    """在未處理的例外發生時自動匯出追蹤記錄"""
+    previous_excepthook = sys.excepthook
+    previous_thread_excepthook = threading.excepthook
+
+    def dump_on_crash():
+        try:
+            path = trace.dump()
+            get_logger().error("程式發生未處理的例外，追蹤記錄已匯出: %s", path)
+        except Exception as e:
+            print(f"[ERROR] 匯出追蹤記錄失敗: {e}")
+
+    def excepthook(exc_type, exc_value, exc_traceback):
+        dump_on_crash()
+        previous_excepthook(exc_type, exc_value, exc_traceback)
+
+    def thread_excepthook(args):
+        dump_on_crash()
+        previous_thread_excepthook(args)
+
+    sys.excepthook = excepthook
+    threading.excepthook = thread_excepthook
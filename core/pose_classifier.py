@@ -0,0 +1,215 @@
+"""
+靜態手勢姿勢分類模組（kNN）
+"""
+import os
+
+import numpy as np
+
+from .config import (CAMERA_WIDTH, CAMERA_HEIGHT, POSE_KNN_K, POSE_REJECT_DISTANCE,
+                     POSE_MAX_SAMPLES_PER_CLASS, POSE_STATIC_MAX_SPREAD, POSE_STATIC_MAX_TRAVEL)
+from .gesture_storage import atomic_write
+from .logger import get_logger
+
+logger = get_logger('pose_classifier')
+
+WRIST = 0
+MIDDLE_MCP = 9
+POSE_FEATURE_DIM = 20 * 3  # 手腕以外 20 個地標的正規化座標
+MODEL_VERSION = 2  # 2: 特徵加入旋轉正規化
+
+POSE_KIND = 'pose'      # 錄製標頭的 kind：靜態姿勢（可用於訓練姿勢分類器）
+MOTION_KIND = 'motion'  # 動態手勢（只作為 DTW 範本）
+
+
+def pose_features(landmarks, frame_shape=(CAMERA_HEIGHT, CAMERA_WIDTH), mirror=False):
+    """將 (幀數, 21, 3) 或 (21, 3) 地標轉為每幀的姿勢特徵 (幀數, 60) float32
+
+    座標先換算為像素比例（x、z 乘以寬度、y 乘以高度），再以手腕為原點，
+    在畫面平面上旋轉到手腕指向中指根部的方向朝上，最後除以手掌大小（手腕到中指根部），
+    與手的位置、遠近、傾斜及畫面旋轉無關。mirror=True 時先左右鏡像
+    （用於翻轉設定與目前不同的錄製）。
+    """
+    height, width = frame_shape[:2]
+    points = np.array(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+    if mirror:
+        points[..., 0] = 1.0 - points[..., 0]
+    points *= np.array((width, height, width), dtype=np.float32)
+    points -= points[:, WRIST:WRIST + 1]
+    palm_size = np.linalg.norm(points[:, MIDDLE_MCP], axis=-1)
+
+    direction = points[:, MIDDLE_MCP, :2]
+    direction = direction / np.maximum(np.linalg.norm(direction, axis=-1), 1e-6)[:, None]
+    cos, sin = -direction[:, 1:2], -direction[:, 0:1]  # 將 direction 轉到 (0, -1)
+    x, y = points[..., 0].copy(), points[..., 1].copy()
+    points[..., 0] = cos * x - sin * y
+    points[..., 1] = sin * x + cos * y
+
+    points /= np.maximum(palm_size, 1e-6)[:, None, None]
+    return np.ascontiguousarray(points[:, 1:].reshape(len(points), POSE_FEATURE_DIM))
+
+
+def mirror_parity(orientation):
+    """畫面方向是否為鏡像（只翻轉一個方向；兩個方向都翻轉等於旋轉 180 度）"""
+    return bool(orientation.get('flip_h')) != bool(orientation.get('flip_v'))
+
+
+def is_static_recording(gesture_data, frame_shape=(CAMERA_HEIGHT, CAMERA_WIDTH)):
+    """判斷錄製是否為靜態姿勢（標頭沒有 kind 的舊錄製使用）
+
+    手形的變化（各幀特徵與平均特徵的平均每地標平方距離）與手腕移動
+    （以手掌大小為單位的標準差）都很小時才視為靜態姿勢，揮手等動態手勢不會被當成姿勢。
+    """
+    kind = gesture_data.metadata.get('kind')
+    if kind is not None:
+        return kind == POSE_KIND
+    landmarks = gesture_data.landmarks
+    if not len(landmarks):
+        return False
+    frame_shape = gesture_data.metadata.get('frame_shape') or frame_shape
+    features = pose_features(landmarks, frame_shape)
+    spread = float(((features - features.mean(axis=0)) ** 2).sum(axis=1).mean()) / (POSE_FEATURE_DIM // 3)
+
+    height, width = frame_shape[:2]
+    points = np.asarray(landmarks, dtype=np.float32)[:, :, :2] * np.array((width, height), np.float32)
+    palm_size = float(np.median(np.linalg.norm(points[:, MIDDLE_MCP] - points[:, WRIST], axis=-1)))
+    travel = float(np.linalg.norm(points[:, WRIST].std(axis=0))) / max(palm_size, 1e-6)
+    return spread <= POSE_STATIC_MAX_SPREAD and travel <= POSE_STATIC_MAX_TRAVEL
+
+
+class PoseClassifier:
+    """以錄製的手勢訓練的 kNN 靜態姿勢分類器
+
+    訓練樣本（每類最多 max_samples_per_class 幀）存成連續的 float32 矩陣並快取平方範數，
+    推論時以 |q|^2 + |t|^2 - 2 q·t 一次矩陣乘法求出所有距離，argpartition 取 k 個最近鄰後投票。
+    最近鄰距離（每個地標的平均平方距離）超過 reject_distance 或未過半數時視為未知姿勢。
+    """
+
+    def __init__(self, k=POSE_KNN_K, reject_distance=POSE_REJECT_DISTANCE):
+        self.k = k
+        self.reject_distance = reject_distance
+        self.classes = []
+        self._features = np.empty((0, POSE_FEATURE_DIM), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._labels = np.empty(0, dtype=np.intp)
+
+    def __len__(self):
+        return len(self._labels)
+
+    def fit(self, features, labels, max_samples_per_class=POSE_MAX_SAMPLES_PER_CLASS, seed=0):
+        """以 (樣本數, 60) 特徵與對應的姿勢名稱訓練，每類隨機保留最多 max_samples_per_class 個樣本"""
+        features = np.asarray(features, dtype=np.float32).reshape(-1, POSE_FEATURE_DIM)
+        labels = np.asarray(labels)
+        self.classes = sorted(set(labels.tolist()))
+        label_ids = np.searchsorted(np.array(self.classes), labels)
+
+        rng = np.random.default_rng(seed)
+        keep = []
+        for class_id in range(len(self.classes)):
+            members = np.flatnonzero(label_ids == class_id)
+            if max_samples_per_class and len(members) > max_samples_per_class:
+                members = np.sort(rng.choice(members, max_samples_per_class, replace=False))
+            keep.append(members)
+        keep = np.concatenate(keep) if keep else np.empty(0, dtype=np.intp)
+
+        self._set(features[keep], label_ids[keep])
+        return self
+
+    def _set(self, features, label_ids):
+        """設定訓練樣本並預先計算平方範數"""
+        self._features = np.ascontiguousarray(features, dtype=np.float32)
+        self._norms = (self._features * self._features).sum(axis=1)
+        self._labels = np.asarray(label_ids, dtype=np.intp)
+
+    def predict(self, features):
+        """分類 (幀數, 60) 特徵，回傳 [(姿勢名稱或 None, 最近鄰距離), ...]"""
+        features = np.atleast_2d(np.asarray(features, dtype=np.float32))
+        if not len(self._labels):
+            return [(None, float('inf'))] * len(features)
+
+        squared = ((features * features).sum(axis=1)[:, None] + self._norms[None, :]
+                   - 2.0 * features @ self._features.T)
+        distances = np.maximum(squared, 0.0) / (POSE_FEATURE_DIM // 3)
+
+        k = min(self.k, len(self._labels))
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        votes = self._labels[nearest]
+
+        results = []
+        for row in range(len(features)):
+            counts = np.bincount(votes[row], minlength=len(self.classes))
+            winner = int(counts.argmax())
+            distance = float(nearest_distances[row].min())
+            if distance > self.reject_distance or counts[winner] * 2 <= k:
+                results.append((None, distance))
+            else:
+                results.append((self.classes[winner], distance))
+        return results
+
+    def predict_landmarks(self, landmarks, frame_shape=(CAMERA_HEIGHT, CAMERA_WIDTH)):
+        """分類單幀 (21, 3) 地標，回傳 (姿勢名稱或 None, 最近鄰距離)"""
+        return self.predict(pose_features(landmarks, frame_shape))[0]
+
+    def save(self, filepath):
+        """儲存模型（.npz，原子寫入）"""
+        with atomic_write(filepath) as f:
+            np.savez(f, version=MODEL_VERSION, features=self._features, labels=self._labels,
+                     classes=np.array(self.classes, dtype=str), k=self.k,
+                     reject_distance=self.reject_distance)
+
+    @classmethod
+    def load(cls, filepath):
+        """載入模型"""
+        with np.load(filepath, allow_pickle=False) as data:
+            if int(data['version']) != MODEL_VERSION:
+                raise ValueError(f"不支援的模型版本: {int(data['version'])}")
+            classifier = cls(k=int(data['k']), reject_distance=float(data['reject_distance']))
+            classifier.classes = data['classes'].tolist()
+            classifier._set(data['features'], data['labels'])
+        return classifier
+
+
+def select_pose_recordings(gestures):
+    """只保留靜態姿勢錄製（排除作為 DTW 範本的動態手勢）"""
+    return [gesture_data for gesture_data in gestures if is_static_recording(gesture_data)]
+
+
+def build_training_set(gestures, frame_shape=(CAMERA_HEIGHT, CAMERA_WIDTH), trim_frames=3,
+                       orientation=None):
+    """將 GestureData 轉為 (特徵, 標籤)
+
+    每個錄製去掉開頭與結尾各 trim_frames 幀（按下開始/停止時手通常還在移動），
+    每幀都是一個以手勢名稱為標籤的樣本。錄製標頭有 frame_shape 時以錄製的畫面比例換算；
+    提供 orientation（目前的畫面方向）且錄製的鏡像設定與其不同時，先將錄製鏡像
+    （旋轉的差異由特徵的旋轉正規化處理）。
+    """
+    features = []
+    labels = []
+    for gesture_data in gestures:
+        landmarks = gesture_data.landmarks
+        if len(landmarks) > 2 * trim_frames:
+            landmarks = landmarks[trim_frames:len(landmarks) - trim_frames]
+        if not len(landmarks):
+            continue
+        recorded_orientation = gesture_data.metadata.get('orientation')
+        mirror = (orientation is not None and recorded_orientation is not None
+                  and mirror_parity(recorded_orientation) != mirror_parity(orientation))
+        features.append(pose_features(landmarks, gesture_data.metadata.get('frame_shape') or frame_shape,
+                                      mirror=mirror))
+        labels.extend([gesture_data.name] * len(landmarks))
+    if not features:
+        return np.empty((0, POSE_FEATURE_DIM), dtype=np.float32), np.empty(0, dtype=str)
+    return np.concatenate(features), np.array(labels)
+
+
+def load_pose_classifier(filepath):
+    """模型檔案存在時載入，否則回傳 None"""
+    if not os.path.exists(filepath):
+        return None
+    try:
+        classifier = PoseClassifier.load(filepath)
+        logger.info("已載入姿勢分類器: %d 個姿勢, %d 個樣本", len(classifier.classes), len(classifier))
+        return classifier
+    except Exception as e:
+        logger.warning("無法載入姿勢分類器 %s: %s", filepath, e)
+        return None
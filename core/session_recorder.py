@@ -0,0 +1,545 @@
+"""
+工作階段錄製與重播模組
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from .config import (SESSION_DIR, SESSION_FORMAT, SESSION_FOURCC, SESSION_QUEUE_SIZE,
+                     SESSION_FLUSH_INTERVAL, SESSION_ENCODER_NICE, SESSION_PNG_COMPRESSION,
+                     SCREEN_WIDTH, SCREEN_HEIGHT)
+from .gesture_storage import atomic_write
+from .logger import get_logger
+
+logger = get_logger('session_recorder')
+
+SESSION_VERSION = 1
+SESSION_FILE = 'session.json'
+EVENTS_FILE = 'events.jsonl'
+VIDEO_FILE = 'frames.avi'
+IMAGES_DIR = 'frames'
+SESSION_FORMATS = ('video', 'images')
+
+# 重播時依序套用的狀態切換（在該幀之前呼叫 AirMouse 的同名方法）
+REPLAY_MARKERS = ('pause', 'resume')
+# 比對欄位對應的統計名稱
+MISMATCH_COUNTERS = {
+    'processed': 'processed_mismatches',
+    'detected': 'detection_mismatches',
+    'gesture': 'gesture_mismatches',
+    'event': 'event_mismatches',
+    'pointer': 'pointer_mismatches',
+}
+
+Point = namedtuple('Point', 'x y')
+
+
+def _json_default(value):
+    """JSON 無法直接序列化的值（numpy 純量等）"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class PointerRecorder:
+    """滑鼠操作記錄器（取代 MouseController 使用的 pyautogui）
+
+    有 backend 時轉送給 backend 並記錄送出的移動與按鍵事件，以及讀到的游標位置
+    （游標也可能被使用者的真實滑鼠移動）；沒有 backend 時為虛擬指標（重播用）：
+    不會移動真正的滑鼠，讀取位置時依序回傳 feed_positions() 提供的錄製值，
+    沒有錄製值時回傳自行追蹤的位置。
+    """
+
+    def __init__(self, backend=None, position=None):
+        self.backend = backend
+        if position is None:
+            position = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        self._position = Point(int(position[0]), int(position[1]))
+        self._positions = []
+        self.events = []
+
+    def feed_positions(self, positions):
+        """設定接下來讀取游標位置時依序回傳的值（重播錄製的位置）"""
+        self._positions = [Point(int(x), int(y)) for x, y in positions]
+
+    def take(self):
+        """取出並清空目前累積的事件"""
+        events, self.events = self.events, []
+        return events
+
+    def position(self):
+        if self.backend is not None:
+            position = self.backend.position()
+        elif self._positions:
+            position = self._positions.pop(0)
+        else:
+            position = self._position
+        self.events.append(['position', int(position[0]), int(position[1])])
+        return position
+
+    def moveTo(self, x, y, **kwargs):
+        self.events.append(['move', int(x), int(y)])
+        self._position = Point(int(x), int(y))
+        if self.backend is not None:
+            self.backend.moveTo(x, y, **kwargs)
+
+    def click(self, x, y, button='left', **kwargs):
+        self.events.append(['click', int(x), int(y), button])
+        self._position = Point(int(x), int(y))
+        if self.backend is not None:
+            self.backend.click(x, y, button=button, **kwargs)
+
+    def mouseDown(self, button='left', **kwargs):
+        self.events.append(['down', button])
+        if self.backend is not None:
+            self.backend.mouseDown(button=button, **kwargs)
+
+    def mouseUp(self, button='left', **kwargs):
+        self.events.append(['up', button])
+        if self.backend is not None:
+            self.backend.mouseUp(button=button, **kwargs)
+
+
+class SessionRecorder:
+    """錄製原始攝影機影格與每幀的地標、手勢及送出的滑鼠事件
+
+    一個工作階段是一個目錄：
+    - session.json：格式、影格大小、開始時的執行參數與游標位置、統計
+    - frames.avi（video 格式）或 frames/000000.png（images 格式）：方向調整前的原始影格
+    - events.jsonl：每個擷取影格一行（時間戳記、對應的影片影格、是否處理、地標、手勢、
+      點擊事件、滑鼠事件，以及參數變更與暫停/恢復；沒有寫入影格的記錄標記 skip）
+
+    主迴圈只把影格複製到預先配置的緩衝區並放進佇列；編碼與寫檔在背景執行緒以較低的
+    排程優先權進行（CPU 不足時讓出給主迴圈）。沒有空的緩衝區時（編碼跟不上）該影格直接
+    丟棄並計數，主迴圈永遠不會等待。video 格式無法以指定編碼建立影片時改存影像序列。
+    """
+
+    def __init__(self, directory=SESSION_DIR, image_format=SESSION_FORMAT, fourcc=SESSION_FOURCC,
+                 queue_size=SESSION_QUEUE_SIZE):
+        if image_format not in SESSION_FORMATS:
+            raise ValueError(f"不支援的錄製格式: {image_format}")
+        self.path = os.path.join(directory, f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        self.image_format = image_format
+        self.fourcc = fourcc
+        self.queue_size = queue_size
+        self.pointer = None
+        self.metadata = {}
+        self._queue = queue.Queue()
+        self._free = []  # 可用的影格緩衝區（只在主迴圈取出、在背景執行緒歸還）
+        self._free_lock = threading.Lock()
+        self._buffer_key = None
+        self._thread = None
+        self._running = False
+        self._pending = None  # 目前影格的事件記錄（read 時建立，process 完成後送出）
+        self._markers = []
+        self._last_settings = None
+
+        # 統計資訊
+        self.frames = 0      # 擷取影格數（事件記錄行數）
+        self.recorded = 0    # 寫入影片的影格數
+        self.dropped = 0     # 編碼跟不上而丟棄的影格數
+        self.encode_ms = 0.0
+        self.error = None
+
+    def start(self, settings, frame_rate=30.0, pointer_backend=None, metadata=None):
+        """建立工作階段目錄並啟動編碼執行緒"""
+        os.makedirs(self.path)
+        if self.image_format == 'images':
+            os.makedirs(os.path.join(self.path, IMAGES_DIR))
+        self.pointer = PointerRecorder(pointer_backend)
+        position = self.pointer.position()
+        self.pointer.take()
+        self._last_settings = {key: value for key, value in settings.items() if key != 'paused'}
+        self.metadata = {
+            'version': SESSION_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'format': self.image_format,
+            'fourcc': self.fourcc if self.image_format == 'video' else None,
+            'frame_rate': float(frame_rate) if frame_rate and frame_rate > 0 else 30.0,
+            'frame_shape': None,
+            'screen': [SCREEN_WIDTH, SCREEN_HEIGHT],
+            'cursor': [int(position[0]), int(position[1])],
+            'settings': dict(settings),
+            'complete': False,
+            **(metadata or {}),
+        }
+        self._write_metadata()
+        self._events_file = open(os.path.join(self.path, EVENTS_FILE), 'w', encoding='utf-8')
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='session-recorder', daemon=True)
+        self._thread.start()
+        logger.info("工作階段錄製: %s", self.path)
+        return self
+
+    # ===== 主迴圈 =====
+
+    def add_frame(self, frame, timestamp):
+        """記錄一個擷取到的原始影格（read_frame 後呼叫，影格內容會被複製）"""
+        if not self._running:
+            return
+        self._flush_pending()
+        video_index = None
+        buffer = self._take_buffer(frame)
+        if buffer is not None:
+            np.copyto(buffer, frame)
+            video_index = self.recorded
+            self.recorded += 1
+            self._queue.put(('frame', video_index, buffer))
+        else:
+            self.dropped += 1
+        self._pending = {'i': self.frames, 't': timestamp, 'video': video_index}
+        if video_index is None:
+            # 現場仍會處理這一幀，但重播時沒有影像：標記為預期略過
+            self._pending['skip'] = True
+        self.frames += 1
+
+    def log_frame(self, processed, landmarks, gesture, event, template_match, settings):
+        """記錄目前影格的處理結果（process_frame 結束時呼叫）"""
+        pending = self._pending
+        if pending is None:
+            return
+        self._pending = None
+        pending['processed'] = processed
+        pending['landmarks'] = landmarks  # 每幀都是新的陣列，由背景執行緒轉成清單
+        pending['gesture'] = gesture
+        pending['event'] = event
+        pending['template'] = list(template_match) if template_match else None
+        pending['pointer'] = self.pointer.take()
+        if self._markers:
+            pending['markers'], self._markers = self._markers, []
+        settings = {key: value for key, value in settings.items() if key != 'paused'}
+        if settings != self._last_settings:
+            pending['settings'] = settings
+            self._last_settings = settings
+        self._queue.put(('event', pending))
+
+    def mark(self, name):
+        """記錄狀態切換（暫停/恢復），重播時在下一幀之前套用"""
+        if self._running:
+            self._markers.append(name)
+
+    def _flush_pending(self):
+        """送出沒有處理結果的影格記錄（例如 process_frame 拋出例外）"""
+        if self._pending is not None:
+            self._pending.update(processed=False, landmarks=None, pointer=self.pointer.take())
+            self._queue.put(('event', self._pending))
+            self._pending = None
+
+    def _take_buffer(self, frame):
+        """取得一個空的影格緩衝區，沒有空緩衝區（或影格大小改變）時回傳 None"""
+        key = (frame.shape, frame.dtype)
+        with self._free_lock:
+            if key != self._buffer_key:
+                if self._buffer_key is not None:
+                    logger.warning("工作階段錄製: 影格大小改變 %s -> %s，之後的影格不寫入影片",
+                                   self._buffer_key[0], frame.shape)
+                    self._buffer_key = key
+                    self._free = []
+                    return None
+                self._buffer_key = key
+                self._free = [np.empty_like(frame) for _ in range(self.queue_size)]
+                self.metadata['frame_shape'] = list(frame.shape)
+            if not self._free:
+                return None
+            return self._free.pop()
+
+    def _return_buffer(self, buffer):
+        with self._free_lock:
+            if (buffer.shape, buffer.dtype) == self._buffer_key:
+                self._free.append(buffer)
+
+    # ===== 背景執行緒 =====
+
+    def _run(self):
+        """編碼執行緒：依序寫入影格與事件記錄"""
+        self._lower_priority()
+        writer = None
+        lines = 0
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if item[0] == 'frame':
+                _, index, buffer = item
+                start = time.perf_counter()
+                try:
+                    if self.error is None:
+                        writer = self._write_frame(writer, index, buffer)
+                except Exception as e:
+                    self.error = str(e)
+                    logger.error("工作階段錄製: 寫入影格失敗: %s", e)
+                finally:
+                    self._return_buffer(buffer)
+                self.encode_ms += (time.perf_counter() - start) * 1000
+            else:
+                self._events_file.write(json.dumps(self._encode_event(item[1]), ensure_ascii=False,
+                                                   default=_json_default))
+                self._events_file.write('\n')
+                lines += 1
+                if lines % SESSION_FLUSH_INTERVAL == 0:
+                    self._events_file.flush()
+        if writer is not None:
+            writer.release()
+        self._events_file.close()
+
+    @staticmethod
+    def _lower_priority():
+        """降低目前執行緒的排程優先權（Linux 的 setpriority 以執行緒 ID 為單位，其他平台略過）"""
+        if not (SESSION_ENCODER_NICE and hasattr(os, 'setpriority')
+                and hasattr(threading, 'get_native_id')):
+            return
+        thread_id = threading.get_native_id()
+        try:
+            os.setpriority(os.PRIO_PROCESS, thread_id,
+                           os.getpriority(os.PRIO_PROCESS, thread_id) + SESSION_ENCODER_NICE)
+        except OSError as e:
+            logger.debug("無法降低編碼執行緒優先權: %s", e)
+
+    def _write_frame(self, writer, index, frame):
+        """寫入一個影格，回傳（第一次建立的）VideoWriter"""
+        if self.image_format == 'images':
+            path = os.path.join(self.path, IMAGES_DIR, f"{index:06d}.png")
+            if not cv2.imwrite(path, frame, [cv2.IMWRITE_PNG_COMPRESSION, SESSION_PNG_COMPRESSION]):
+                raise OSError(f"無法寫入 {path}")
+            return writer
+        if writer is None:
+            path = os.path.join(self.path, VIDEO_FILE)
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc),
+                                     self.metadata['frame_rate'], (frame.shape[1], frame.shape[0]))
+            if not writer.isOpened():
+                writer.release()
+                self._fall_back_to_images()
+                return self._write_frame(None, index, frame)
+        writer.write(frame)
+        return writer
+
+    def _fall_back_to_images(self):
+        """指定的影片編碼無法使用：改存 PNG 影像序列（影格編號不變）"""
+        logger.warning("工作階段錄製: 無法以 %s 建立影片，改存 PNG 影像序列", self.fourcc)
+        os.makedirs(os.path.join(self.path, IMAGES_DIR), exist_ok=True)
+        try:
+            os.remove(os.path.join(self.path, VIDEO_FILE))
+        except OSError:
+            pass
+        self.image_format = 'images'
+        self.metadata.update(format='images', fourcc=None)
+        self._write_metadata()
+
+    @staticmethod
+    def _encode_event(event):
+        landmarks = event.get('landmarks')
+        if landmarks is not None:
+            event['landmarks'] = landmarks.tolist()
+        return event
+
+    # ===== 結束 =====
+
+    def get_stats(self):
+        """取得錄製統計"""
+        return {
+            'path': self.path,
+            'frames': self.frames,
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'queued': self._queue.qsize(),
+            'encode_ms': self.encode_ms / self.recorded if self.recorded else 0.0,
+            'error': self.error,
+        }
+
+    def _write_metadata(self):
+        with atomic_write(os.path.join(self.path, SESSION_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+
+    def close(self):
+        """寫完佇列中的影格與事件並更新 session.json"""
+        if not self._running:
+            return
+        self._flush_pending()
+        self._running = False
+        self._queue.put(None)
+        self._thread.join()
+        self.metadata.update(complete=True, frames=self.frames, recorded=self.recorded,
+                             dropped=self.dropped, error=self.error)
+        self._write_metadata()
+
+
+class SessionReplay:
+    """工作階段重播來源（介面與 cv2.VideoCapture 相同，可直接作為 AirMouse 的影格來源）
+
+    依事件記錄的順序讀出錄製的原始影格，並以 timestamp 提供錄製時的時間戳記；
+    錄製時被丟棄的影格沒有影像，重播時略過（skipped_before 為目前影格之前略過的筆數）。
+    replay() 把整段錄製依序送進 AirMouse.process_frame（使用錄製的時間戳記與虛擬指標），
+    並與錄製結果比對。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, SESSION_FILE), encoding='utf-8') as f:
+            self.metadata = json.load(f)
+        self.events = []
+        with open(os.path.join(path, EVENTS_FILE), encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self.events.append(json.loads(line))
+                except ValueError:
+                    break  # 錄製中斷時最後一行可能不完整
+        self.skipped = sum(1 for event in self.events if event.get('video') is None)
+        self.skipped_before = 0
+        self._capture = None
+        if self.metadata['format'] == 'video':
+            self._capture = cv2.VideoCapture(os.path.join(path, VIDEO_FILE))
+        self._position = 0
+        self._video_position = 0
+        self._opened = True
+        self.timestamp = None
+        self.current = None  # 目前影格的錄製記錄
+
+    def isOpened(self):
+        return self._opened
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.metadata.get('frame_rate', 0.0)
+        return 0.0
+
+    def read(self, image=None):
+        """讀出下一個有影像的錄製影格"""
+        self.skipped_before = 0
+        while self._opened and self._position < len(self.events):
+            event = self.events[self._position]
+            self._position += 1
+            video_index = event.get('video')
+            if video_index is None:
+                if event.get('processed'):
+                    self.skipped_before += 1
+                continue
+            frame = self._read_image(video_index)
+            if frame is None:
+                break
+            self.current = event
+            self.timestamp = event['t']
+            return True, frame
+        self._opened = False
+        self.current = None
+        return False, None
+
+    def _read_image(self, index):
+        if self._capture is None:
+            return cv2.imread(os.path.join(self.path, IMAGES_DIR, f"{index:06d}.png"))
+        while self._video_position <= index:
+            success, frame = self._capture.read()
+            if not success:
+                return None
+            self._video_position += 1
+        return frame
+
+    def release(self):
+        self._opened = False
+        if self._capture is not None:
+            self._capture.release()
+
+    def replay(self, air_mouse, on_frame=None):
+        """把錄製的影格依序送進 air_mouse.process_frame，回傳與錄製結果的比對
+
+        air_mouse 應以此物件作為影格來源建立（AirMouse(capture=replay)）。重播使用錄製的
+        時間戳記作為處理時間、以虛擬指標取代真正的滑鼠，因此同一個工作階段每次重播的結果相同；
+        無損錄製（images 或 FFV1）與現場結果一致，MJPG 等有損編碼的地標可能略有差異。
+        錄製時丟棄但現場有處理的影格重播時無法處理，之後的差異計入 skip_divergences，
+        直到重播結果再次與錄製一致為止。
+        """
+        air_mouse.show_preview = False
+        air_mouse.apply_settings(**self._settings(self.metadata['settings']))
+        pointer = PointerRecorder(position=self.metadata.get('cursor'))
+        air_mouse.mouse_controller.pointer = pointer
+        air_mouse.mouse_controller.clock = lambda: air_mouse.frame_timestamp
+
+        report = {
+            'frames': 0,
+            'skipped': self.skipped,
+            'mismatched_frames': 0,
+            'processed_mismatches': 0,
+            'detection_mismatches': 0,
+            'gesture_mismatches': 0,
+            'event_mismatches': 0,
+            'pointer_mismatches': 0,
+            'landmark_max_diff': 0.0,
+            'first_mismatch': None,
+            'skip_divergences': 0,
+        }
+        diverging = False  # 略過影格之後、重播尚未與錄製重新一致
+        while True:
+            success, frame = air_mouse.read_frame()
+            if not success:
+                break
+            expected = self.current
+            for name in expected.get('markers', ()):
+                if name in REPLAY_MARKERS:
+                    getattr(air_mouse, name)()
+            if 'settings' in expected:
+                air_mouse.apply_settings(**self._settings(expected['settings']))
+            pointer.feed_positions(event[1:] for event in expected.get('pointer', ())
+                                   if event[0] == 'position')
+
+            frame, gesture = air_mouse.process_frame(frame, self.timestamp)
+            actual = {
+                'processed': air_mouse.last_processed,
+                'landmarks': air_mouse.last_landmarks if air_mouse.last_processed else None,
+                'gesture': gesture,
+                'event': air_mouse.last_event,
+                'pointer': pointer.take(),
+            }
+            diverging = self._compare(expected, actual, report,
+                                      diverging or self.skipped_before > 0)
+            if on_frame is not None:
+                on_frame(expected, actual)
+        return report
+
+    @staticmethod
+    def _settings(settings):
+        return {key: value for key, value in settings.items() if key != 'paused'}
+
+    @staticmethod
+    def _compare(expected, actual, report, after_skip=False):
+        """比對一幀的錄製結果與重播結果並累計到 report
+
+        after_skip 為 True（前面有略過的影格）時差異只計入 skip_divergences；
+        回傳是否仍處於略過造成的差異中。
+        """
+        report['frames'] += 1
+        mismatches = []
+        if bool(expected.get('processed')) != actual['processed']:
+            mismatches.append('processed')
+        expected_landmarks = expected.get('landmarks')
+        if (expected_landmarks is None) != (actual['landmarks'] is None):
+            mismatches.append('detected')
+        elif expected_landmarks is not None:
+            diff = float(np.max(np.abs(np.asarray(expected_landmarks, dtype=np.float32)
+                                       - actual['landmarks'])))
+            report['landmark_max_diff'] = max(report['landmark_max_diff'], diff)
+        if expected.get('gesture') != actual['gesture']:
+            mismatches.append('gesture')
+        if expected.get('event') != actual['event']:
+            mismatches.append('event')
+        if expected.get('pointer', []) != actual['pointer']:
+            mismatches.append('pointer')
+        if not mismatches:
+            return False
+        if after_skip:
+            report['skip_divergences'] += 1
+            return True
+        for field in mismatches:
+            report[MISMATCH_COUNTERS[field]] += 1
+        report['mismatched_frames'] += 1
+        if report['first_mismatch'] is None:
+            report['first_mismatch'] = {'frame': expected['i'], 'fields': mismatches}
+        return False
@@ -0,0 +1,8 @@
+"""
+測試共用設定
+"""
+import os
+import sys
+
+# 確保可以導入自定義模組
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,133 @@
+"""
+控制通訊端測試
+"""
+import socket
+import threading
+
+import pytest
+
+from core.control_server import ControlServer
+from tools.air_mouse_ctl import send_command
+
+
+class StubAirMouse:
+    """記錄在哪個執行緒被修改的 AirMouse 替身"""
+
+    def __init__(self):
+        self.settings = {'fps': 30, 'rotation': 0, 'paused': False}
+        self.threads = set()
+        self.stopped = False
+
+    def apply_settings(self, fps=None, rotation=None):
+        self.threads.add(threading.get_ident())
+        if fps is not None:
+            self.settings['fps'] = fps
+        if rotation is not None:
+            self.settings['rotation'] = rotation
+        return self.get_settings()
+
+    def get_settings(self):
+        return dict(self.settings)
+
+    def get_stats(self):
+        self.threads.add(threading.get_ident())
+        return {'frames': 42}
+
+    def pause(self):
+        self.threads.add(threading.get_ident())
+        self.settings['paused'] = True
+
+    def resume(self):
+        self.threads.add(threading.get_ident())
+        self.settings['paused'] = False
+
+    def dump_trace(self):
+        return '/tmp/trace.json'
+
+    def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / 'ctl.sock')
+
+
+@pytest.fixture
+def running(socket_path):
+    """啟動控制通訊端與模擬的主迴圈（兩幀之間呼叫 apply_pending）"""
+    air_mouse = StubAirMouse()
+    server = ControlServer(air_mouse, path=socket_path, timeout=5.0).start()
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            server.apply_pending()
+            stop.wait(0.005)
+
+    loop_thread = threading.Thread(target=loop)
+    loop_thread.start()
+    yield air_mouse, loop_thread
+    stop.set()
+    loop_thread.join(5)
+    server.close()
+
+
+def test_commands_run_on_the_main_loop(running, socket_path):
+    air_mouse, loop_thread = running
+    assert send_command(socket_path, {'cmd': 'stats'}) == {'ok': True, 'stats': {'frames': 42}}
+    reply = send_command(socket_path, {'cmd': 'set', 'fps': 60, 'rotation': 90})
+    assert reply['ok']
+    assert reply['settings']['fps'] == 60 and reply['settings']['rotation'] == 90
+    assert send_command(socket_path, {'cmd': 'pause'})['settings']['paused']
+    assert not send_command(socket_path, {'cmd': 'resume'})['settings']['paused']
+    assert air_mouse.threads == {loop_thread.ident}
+
+    assert send_command(socket_path, {'cmd': 'stop'}) == {'ok': True}
+    assert air_mouse.stopped
+
+
+def test_errors_are_reported_as_replies(running, socket_path):
+    air_mouse, _ = running
+    reply = send_command(socket_path, {'cmd': 'reboot'})
+    assert not reply['ok'] and 'reboot' in reply['error']
+
+    # apply_settings 不接受的參數（TypeError）回覆失敗，不影響主迴圈
+    reply = send_command(socket_path, {'cmd': 'set', 'volume': 11})
+    assert not reply['ok'] and 'volume' in reply['error']
+    assert air_mouse.settings['fps'] == 30
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(b'not json\n[1, 2]\n')
+        with sock.makefile('rb') as reply:
+            assert b'"ok": false' in reply.readline()
+            assert b'"ok": false' in reply.readline()
+    assert send_command(socket_path, {'cmd': 'stats'})['ok']
+
+
+def test_reply_times_out_when_loop_is_not_draining(socket_path):
+    server = ControlServer(StubAirMouse(), path=socket_path, timeout=0.2).start()
+    try:
+        reply = send_command(socket_path, {'cmd': 'stats'})
+        assert not reply['ok']
+        assert reply['error'] == "主迴圈沒有回應"
+        # 主迴圈之後才處理的指令不會影響下一個回覆
+        server.apply_pending()
+    finally:
+        server.close()
+
+
+def test_stale_socket_is_replaced(socket_path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()  # 留下沒有程式監聽的通訊端檔案
+
+    server = ControlServer(StubAirMouse(), path=socket_path).start()
+    try:
+        with pytest.raises(OSError):
+            ControlServer(StubAirMouse(), path=socket_path).start()
+    finally:
+        server.close()
+    with pytest.raises(FileNotFoundError):
+        send_command(socket_path, {'cmd': 'stats'})
@@ -0,0 +1,57 @@
+"""
+影片地標擷取工具測試
+"""
+import cv2
+import numpy as np
+
+from tools import extract_landmarks
+
+OPTIONS = {
+    'rotation': 0,
+    'flip_horizontal': False,
+    'flip_vertical': False,
+    'stride': 1,
+    'min_frames': 5,
+    'model_complexity': 0,
+    'min_detection_confidence': 0.7,
+    'min_tracking_confidence': 0.5,
+}
+
+
+def write_video(filepath, frames=90, fps=30):
+    writer = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*'MJPG'), fps, (64, 48))
+    for index in range(frames):
+        writer.write(np.full((48, 64, 3), index, np.uint8))
+    writer.release()
+
+
+def test_each_chunk_gets_fresh_hands(tmp_path, monkeypatch):
+    filepath = str(tmp_path / 'wave.avi')
+    write_video(filepath)
+    tasks = extract_landmarks.plan_chunks(filepath, chunk_seconds=1.0)
+    assert [(start, stop) for _, start, stop, _ in tasks] == [(0, 30), (30, 60), (60, 90)]
+
+    created = []
+    original = extract_landmarks._create_hands
+
+    def create_hands(options):
+        created.append(original(options))
+        return created[-1]
+
+    monkeypatch.setattr(extract_landmarks, '_create_hands', create_hands)
+    extract_landmarks._init_worker(OPTIONS)
+    # 同一個工作行程處理多段：每段的追蹤狀態都重新開始
+    for task in tasks:
+        _, _, stats = extract_landmarks.extract_chunk(task)
+        assert 'error' not in stats
+        assert stats['frames'] == 30
+    assert len(created) == len(tasks)
+    assert len({id(hands) for hands in created}) == len(tasks)
+
+
+def test_unseekable_video_is_not_chunked(tmp_path, monkeypatch):
+    filepath = str(tmp_path / 'wave.avi')
+    write_video(filepath)
+    monkeypatch.setattr(extract_landmarks, '_can_seek', lambda cap, frame: False)
+    tasks = extract_landmarks.plan_chunks(filepath, chunk_seconds=1.0)
+    assert [(start, stop) for _, start, stop, _ in tasks] == [(0, None)]
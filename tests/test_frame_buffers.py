@@ -0,0 +1,89 @@
+"""
+影格緩衝區池測試：擷取 → 方向調整 → 預覽的熱迴圈在暖機後不應持續配置記憶體
+"""
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from core.config import CAMERA_WIDTH, CAMERA_HEIGHT
+from ui.video_presenter import VideoPresenter
+from utils import FrameBufferPool, ImageProcessor
+
+WARMUP_FRAMES = 10
+MEASURED_FRAMES = 100
+PER_FRAME_BUDGET = 1024  # 每幀允許的記憶體成長（位元組），遠小於一個 640x480 影格（約 900KB）
+
+
+class FakeCapture:
+    """模擬 cv2.VideoCapture.read(image)：提供緩衝區時直接寫入，不配置新陣列"""
+
+    def __init__(self, width=CAMERA_WIDTH, height=CAMERA_HEIGHT):
+        rng = np.random.default_rng(0)
+        self._frames = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(2)]
+        self._index = 0
+
+    def read(self, image=None):
+        source = self._frames[self._index % len(self._frames)]
+        self._index += 1
+        if image is None or image.shape != source.shape:
+            return True, source.copy()
+        np.copyto(image, source)
+        return True, image
+
+
+def run_pipeline(capture, presenter, buffers, frames, rotation, flip_h, flip_v, frame=None):
+    """執行 frames 次擷取、方向調整、MediaPipe 轉色與預覽，回傳擷取緩衝區（下次重複使用）"""
+    for _ in range(frames):
+        success, frame = capture.read(frame)
+        assert success
+        oriented = ImageProcessor.adjust_frame_orientation(frame, rotation, flip_h, flip_v,
+                                                           buffers=buffers)
+        ImageProcessor.process_frame_with_gpu(oriented, buffers=buffers)
+        ImageProcessor.draw_interaction_area(oriented)
+        presenter.submit(oriented)
+    return frame
+
+
+@pytest.mark.parametrize('rotation, flip_h, flip_v', [
+    (0, False, False),
+    (90, True, False),
+    (180, True, True),
+    (270, False, True),
+])
+def test_hot_loop_allocations_stay_within_budget(rotation, flip_h, flip_v):
+    capture = FakeCapture()
+    presenter = VideoPresenter(root=None, label=None)
+    buffers = FrameBufferPool()
+    frame = run_pipeline(capture, presenter, buffers, WARMUP_FRAMES, rotation, flip_h, flip_v)
+    pool_size = len(buffers)
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        run_pipeline(capture, presenter, buffers, MEASURED_FRAMES, rotation, flip_h, flip_v, frame)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(buffers) == pool_size  # 暖機後不再新增緩衝區
+    assert after - before <= PER_FRAME_BUDGET * MEASURED_FRAMES
+    # 峰值也不應出現任何一個暫存影格
+    assert peak - before < CAMERA_WIDTH * CAMERA_HEIGHT * 3
+
+
+def test_unpooled_pipeline_is_detected():
+    """對照組：不使用緩衝區池時每幀都配置新影格，確認測量方式能偵測到配置"""
+    capture = FakeCapture()
+    presenter = VideoPresenter(root=None, label=None)
+    run_pipeline(capture, presenter, None, WARMUP_FRAMES, 90, True, False)
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        run_pipeline(capture, presenter, None, MEASURED_FRAMES, 90, True, False)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak - before > PER_FRAME_BUDGET * MEASURED_FRAMES
@@ -0,0 +1,116 @@
+"""
+共享記憶體影格匯流排測試
+"""
+import multiprocessing as mp_process
+
+import numpy as np
+import pytest
+
+from core.frame_bus import FrameBus
+
+SHAPE = (4, 6, 3)
+
+
+@pytest.fixture
+def bus():
+    bus = FrameBus(SHAPE, slots=3)
+    yield bus
+    bus.close()
+
+
+def publish(bus, value, timestamp=0.0):
+    slot = bus.acquire()
+    assert slot is not None
+    bus.buffer(slot)[:] = value
+    return bus.publish(slot, timestamp)
+
+
+def refs(bus):
+    return bus._refs.tolist()
+
+
+def test_refcounts_return_to_zero(bus):
+    with publish(bus, 1) as ref:
+        assert refs(bus)[ref.slot] == 2  # 寫入者 + 匯流排保留的最新影格
+        reader = bus.latest()
+        assert reader.seq == ref.seq
+        assert refs(bus)[ref.slot] == 3
+        reader.release()
+        reader.release()  # 重複釋放無作用
+    assert refs(bus)[ref.slot] == 1
+
+    publish(bus, 2).release()
+    assert refs(bus)[ref.slot] == 0
+    assert sum(refs(bus)) == 1
+    assert bus.latest(after_seq=ref.seq + 1) is None
+
+
+def test_slot_is_recycled_after_last_reader(bus):
+    first = publish(bus, 1)
+    reader = first.retain()
+    first.release()
+    publish(bus, 2).release()
+    publish(bus, 3).release()  # 第二個槽位被匯流排保留，第三個已釋放
+
+    # 第一個槽位仍被讀取端持有：內容不變，寫入端不會取得它
+    slots = [bus.acquire() for _ in range(2)]
+    assert reader.slot not in slots
+    assert None in slots
+    np.testing.assert_array_equal(reader.array, 1)
+
+    reader.release()
+    assert bus.acquire() == reader.slot
+
+
+def test_full_pool_counts_drops(bus):
+    readers = [publish(bus, value) for value in range(3)]
+    assert bus.acquire() is None
+    assert bus.acquire() is None
+    stats = bus.get_stats()
+    assert stats['dropped'] == 2
+    assert stats['published'] == 3
+    assert stats['peak'] == 3
+    assert stats['occupancy'] == 1.0
+    for reader in readers:
+        reader.release()
+    assert bus.get_stats()['occupied'] == 1
+
+
+def _adopt_in_child(bus, token, results):
+    ref = bus.adopt(token)
+    results.put(int(ref.array[0, 0, 0]))
+    ref.release()
+    bus.close()
+
+
+def test_adopt_detached_reference_in_spawned_process(bus):
+    context = mp_process.get_context('spawn')
+    results = context.Queue()
+    ref = publish(bus, 7)
+    reader = ref.retain()
+    ref.release()
+    token = reader.detach()
+    assert refs(bus)[reader.slot] == 2
+
+    process = context.Process(target=_adopt_in_child, args=(bus, token, results))
+    process.start()
+    assert results.get(timeout=30) == 7
+    process.join(30)
+    assert process.exitcode == 0
+    assert refs(bus)[reader.slot] == 1  # 子行程釋放接手的參考，只剩匯流排保留的最新影格
+
+
+def test_adopt_rejects_recycled_slot(bus):
+    token = publish(bus, 1).detach()
+    bus.release(token[0])
+    publish(bus, 2).release()
+    with pytest.raises(ValueError):
+        bus.adopt(token)
+
+
+def test_release_after_close_is_noop():
+    bus = FrameBus(SHAPE, slots=2)
+    ref = publish(bus, 1)
+    bus.close()
+    ref.release()
+    assert bus.get_stats()['published'] == 1
@@ -0,0 +1,103 @@
+"""
+手勢庫目錄測試
+"""
+import json
+import threading
+
+import numpy as np
+
+from core import gesture_catalog
+from core.gesture_catalog import GestureCatalog
+from core.gesture_recorder import GestureData
+from core.gesture_storage import write_gesture_file
+
+
+def write_gestures(directory, names):
+    rng = np.random.default_rng(0)
+    for name in names:
+        write_gesture_file(str(directory / f'{name}.gesture'), name,
+                           rng.random((10, 21, 3), dtype=np.float32), '2024-01-01 00:00:00')
+
+
+def test_list_is_not_blocked_while_sync_loads_files(tmp_path):
+    write_gestures(tmp_path, ['wave'])
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_loader(filepath):
+        loading.set()
+        assert release.wait(5)
+        return GestureData.load(filepath)
+
+    catalog = GestureCatalog(str(tmp_path), slow_loader, sync=False)
+    worker = threading.Thread(target=catalog.sync)
+    worker.start()
+    try:
+        assert loading.wait(5)
+        listed = []
+        reader = threading.Thread(target=lambda: listed.append(catalog.list()))
+        reader.start()
+        reader.join(1)
+        assert not reader.is_alive()
+        assert listed == [[]]
+    finally:
+        release.set()
+        worker.join(5)
+    assert catalog.list() == ['wave.gesture']
+
+
+def test_sync_picks_up_added_and_removed_files(tmp_path):
+    write_gestures(tmp_path, ['wave', 'circle'])
+    catalog = GestureCatalog(str(tmp_path), GestureData.load)
+    assert catalog.list() == ['circle.gesture', 'wave.gesture']
+
+    (tmp_path / 'circle.gesture').unlink()
+    write_gestures(tmp_path, ['swipe'])
+    assert catalog.sync()
+    assert catalog.list() == ['swipe.gesture', 'wave.gesture']
+    assert not catalog.sync()
+
+
+def test_list_is_not_blocked_while_catalog_is_written(tmp_path, monkeypatch):
+    write_gestures(tmp_path, ['wave', 'circle'])
+    catalog = GestureCatalog(str(tmp_path), GestureData.load)
+    writing = threading.Event()
+    release = threading.Event()
+    original_write = gesture_catalog.atomic_write
+
+    def slow_write(*args, **kwargs):
+        writing.set()
+        assert release.wait(5)
+        return original_write(*args, **kwargs)
+
+    monkeypatch.setattr(gesture_catalog, 'atomic_write', slow_write)
+    worker = threading.Thread(target=catalog.remove, args=('circle.gesture',))
+    worker.start()
+    try:
+        assert writing.wait(5)
+        listed = []
+        reader = threading.Thread(target=lambda: listed.append(catalog.list()))
+        reader.start()
+        reader.join(1)
+        assert not reader.is_alive()
+        assert listed == [['wave.gesture']]
+    finally:
+        release.set()
+        worker.join(5)
+
+
+def test_concurrent_updates_write_the_latest_catalog(tmp_path):
+    names = [f'gesture{index}' for index in range(20)]
+    write_gestures(tmp_path, names)
+    catalog = GestureCatalog(str(tmp_path), GestureData.load, sync=False)
+    loaded = {f'{name}.gesture': GestureData.load(str(tmp_path / f'{name}.gesture'))
+              for name in names}
+    workers = [threading.Thread(target=catalog.add, args=item) for item in loaded.items()]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(5)
+
+    with open(catalog.path, encoding='utf-8') as f:
+        saved = json.load(f)['entries']
+    assert sorted(saved) == sorted(loaded)
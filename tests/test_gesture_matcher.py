@@ -0,0 +1,130 @@
+"""
+即時 DTW 範本比對測試
+"""
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from core.gesture_matcher import DTWGestureMatcher, dtw_distances, keogh_envelope
+
+RNG = np.random.default_rng(0)
+
+
+def reference_dtw(query, candidate, band):
+    """逐格計算的帶狀 DTW（平方歐氏距離累加）"""
+    length = len(query)
+    accumulated = np.full((length + 1, length + 1), np.inf)
+    accumulated[0, 0] = 0.0
+    for i in range(1, length + 1):
+        for j in range(max(1, i - band), min(length, i + band) + 1):
+            cost = float(((query[i - 1] - candidate[j - 1]) ** 2).sum())
+            accumulated[i, j] = cost + min(accumulated[i - 1, j], accumulated[i, j - 1],
+                                           accumulated[i - 1, j - 1])
+    return accumulated[length, length]
+
+
+def wave(duration, fps, cycles, base):
+    """左右揮動的地標序列與時間戳記"""
+    times = np.arange(int(round(duration * fps))) / fps
+    frames = np.repeat(base[None], len(times), axis=0)
+    frames[:, :, 0] += 0.1 * np.sin(2 * np.pi * cycles * times / duration)[:, None]
+    return frames, times
+
+
+@pytest.mark.parametrize('band', [1, 3, 5])
+def test_batched_dtw_matches_reference(band):
+    queries = RNG.random((8, 12, 6), dtype=np.float32)
+    candidates = RNG.random((8, 12, 6), dtype=np.float32)
+    expected = [reference_dtw(q, c, band) for q, c in zip(queries, candidates)]
+    np.testing.assert_allclose(dtw_distances(queries, candidates, band), expected, rtol=1e-5)
+
+
+@pytest.mark.parametrize('duration', [0.6, 1.0, 2.5])
+def test_templates_match_at_their_recorded_duration(duration):
+    base = RNG.random((21, 3), dtype=np.float32) * 0.1 + 0.4
+    other = RNG.random((21, 3), dtype=np.float32) * 0.1 + 0.4
+    names, sequences, timestamps = [], [], []
+    for name, template_duration, hand in (('target', duration, base), ('short', 0.4, other),
+                                          ('long', 3.0, other)):
+        frames, times = wave(template_duration, 30, 2, hand)
+        names.append(name)
+        sequences.append(frames)
+        timestamps.append(times)
+    matcher = DTWGestureMatcher(match_interval=1)
+    matcher.set_templates(names, sequences, timestamps)
+
+    # 即時畫面以不同的頻率擷取，前面有一段靜止
+    live, _ = wave(duration, 50, 2, base)
+    idle = np.repeat(live[:1], 25, axis=0)
+    stream = np.concatenate((idle, live))
+    result = None
+    for index, frame in enumerate(stream):
+        result = matcher.push(frame, index / 50)
+    assert result is not None
+    assert result[0] == 'target'
+
+
+def test_long_template_waits_for_enough_history():
+    base = RNG.random((21, 3), dtype=np.float32) * 0.1 + 0.4
+    frames, times = wave(2.0, 30, 2, base)
+    matcher = DTWGestureMatcher(match_interval=1)
+    matcher.set_templates(['wave'], [frames], [times])
+    for index, frame in enumerate(frames[:30]):
+        assert matcher.push(frame, index / 30) is None
+
+
+def test_early_abandoning_keeps_every_better_candidate():
+    queries = RNG.random((32, 12, 6), dtype=np.float32)
+    candidates = queries + RNG.normal(0, 0.3, (32, 12, 6)).astype(np.float32)
+    full = dtw_distances(queries, candidates, 2)
+    upper, lower = keogh_envelope(candidates, 2)
+    remaining = np.zeros((32, 13), dtype=np.float32)
+    for index in range(32):
+        bounds = DTWGestureMatcher.lower_bounds(queries[index], upper[index:index + 1],
+                                                lower[index:index + 1])[0]
+        remaining[index, :12] = np.cumsum(bounds[::-1])[::-1]
+
+    best = float(np.percentile(full, 25))
+    partial = dtw_distances(queries, candidates, 2, None, best, remaining, check_interval=1)
+    kept = np.isfinite(partial)
+    np.testing.assert_allclose(partial[kept], full[kept], rtol=1e-5)
+    assert (full[~kept] >= best * (1 - 1e-5)).all()
+    assert (~kept).any()
+
+
+def test_templates_can_be_replaced_while_pushing():
+    # 背景執行緒同步手勢庫時，視訊執行緒的 push 不可因緩衝區容量改變而失敗
+    base = RNG.random((21, 3), dtype=np.float32) * 0.1 + 0.4
+    features = RNG.random((1, 30, 63), dtype=np.float32)
+    matcher = DTWGestureMatcher(match_interval=1000)
+    matcher.set_features(['wave'], features, [1.0])
+
+    stop = threading.Event()
+    swaps = [0]
+    errors = []
+
+    def swap():
+        while not stop.is_set():
+            swaps[0] += 1
+            matcher.set_features(['wave'], features, [1.0 + swaps[0] % 2])
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # 頻繁切換執行緒以重現競爭
+    swapper = threading.Thread(target=swap)
+    swapper.start()
+    try:
+        deadline = time.perf_counter() + 20
+        index = 0
+        while swaps[0] < 5000 and time.perf_counter() < deadline:
+            matcher.push(base, index / 30)
+            index += 1
+    except Exception as e:
+        errors.append(e)
+    finally:
+        stop.set()
+        swapper.join()
+        sys.setswitchinterval(switch_interval)
+    assert errors == []
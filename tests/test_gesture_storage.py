@@ -0,0 +1,75 @@
+"""
+手勢儲存格式測試
+"""
+import os
+
+import numpy as np
+
+from core.gesture_recorder import GestureData, GestureRecorder
+from core.gesture_storage import (HEADER_SIZE, PART_SUFFIX, RECORD_DTYPE, GestureStreamWriter,
+                                  read_gesture_file, recover_partial, write_gesture_file)
+
+
+def test_streamed_recording_loads_contiguous(tmp_path):
+    filepath = str(tmp_path / 'wave.gesture')
+    writer = GestureStreamWriter(filepath, 'wave', '2024-01-01 00:00:00', chunk_frames=4)
+    landmarks = np.random.default_rng(0).random((10, 21, 3), dtype=np.float32)
+    for index, frame in enumerate(landmarks):
+        writer.append(index * 0.033, frame)
+    writer.finalize()
+
+    for mmap in (True, False):
+        gesture_data = GestureData.load(filepath, mmap=mmap)
+        assert gesture_data.landmarks.flags['C_CONTIGUOUS']
+        assert gesture_data.landmarks.dtype == np.float32
+        np.testing.assert_array_equal(gesture_data.landmarks, landmarks)
+
+
+def test_contiguous_file_is_not_copied(tmp_path):
+    filepath = str(tmp_path / 'circle.gesture')
+    landmarks = np.random.default_rng(1).random((10, 21, 3), dtype=np.float32)
+    write_gesture_file(filepath, 'circle', landmarks, '2024-01-01 00:00:00')
+
+    gesture_data = GestureData.load(filepath, mmap=True)
+    assert gesture_data.landmarks.flags['C_CONTIGUOUS']
+    assert not gesture_data.landmarks.flags['OWNDATA']
+
+
+def abandon_recording(filepath, frames, chunk_frames=4):
+    """模擬錄製中崩潰：寫入 frames 幀後不呼叫 finalize，並在結尾留下半筆記錄"""
+    writer = GestureStreamWriter(filepath, 'wave', '2024-01-01 00:00:00', chunk_frames=chunk_frames)
+    landmarks = np.random.default_rng(2).random((frames, 21, 3), dtype=np.float32)
+    for index, frame in enumerate(landmarks):
+        writer.append(index * 0.033, frame)
+    writer._file.close()  # 最後一個未滿的區塊沒有寫出
+    with open(writer.part_path, 'ab') as f:
+        f.write(b'\x00' * (RECORD_DTYPE.itemsize // 2))
+    return writer.part_path, landmarks
+
+
+def test_crash_loses_at_most_the_last_chunk(tmp_path):
+    filepath = str(tmp_path / 'wave.gesture')
+    part_path, landmarks = abandon_recording(filepath, 10)
+
+    assert recover_partial(part_path) == filepath
+    assert not os.path.exists(part_path)
+    assert os.path.getsize(filepath) == HEADER_SIZE + 8 * RECORD_DTYPE.itemsize
+    header, recovered, timestamps = read_gesture_file(filepath, mmap=False)
+    assert header['frame_count'] == 8
+    assert header['complete'] and header['recovered']
+    np.testing.assert_array_equal(recovered, landmarks[:8])
+    np.testing.assert_allclose(timestamps, np.arange(8) * 0.033)
+
+
+def test_partial_without_complete_frames_is_removed(tmp_path):
+    part_path, _ = abandon_recording(str(tmp_path / 'wave.gesture'), 3)
+    assert recover_partial(part_path) is None
+    assert not os.listdir(tmp_path)
+
+
+def test_recorder_recovers_partial_recordings_on_start(tmp_path):
+    abandon_recording(str(tmp_path / 'wave.gesture'), 10)
+    recorder = GestureRecorder(save_dir=str(tmp_path))
+    assert not any(name.endswith(PART_SUFFIX) for name in os.listdir(tmp_path))
+    assert recorder.catalog.list() == ['wave.gesture']
+    assert recorder.catalog.get_entry('wave.gesture')['frame_count'] == 8
@@ -0,0 +1,59 @@
+"""
+推論工作行程測試
+"""
+import time
+
+import numpy as np
+
+from core.frame_bus import FrameBus
+from core.gestures import DETECTOR_HANDS_OPTIONS
+from core.inference_worker import InferenceWorker, NOT_READY
+
+
+def publish(bus):
+    slot = bus.acquire()
+    bus.buffer(slot)[:] = 0
+    return bus.publish(slot)
+
+
+def wait_ready(worker, bus, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        with publish(bus) as ref:
+            if worker.process(ref) is not NOT_READY:
+                return True
+        time.sleep(0.05)
+    return False
+
+
+def test_shape_change_reattaches_without_restart():
+    worker = InferenceWorker(DETECTOR_HANDS_OPTIONS)
+    landscape = FrameBus((120, 160, 3), slots=4)
+    portrait = FrameBus((160, 120, 3), slots=4)
+    try:
+        assert wait_ready(worker, landscape)
+        pid = worker._process.pid
+
+        # 旋轉後改用另一個匯流排：立即有結果（沒有手），行程與模型沿用
+        with publish(portrait) as ref:
+            assert worker.process(ref) is None
+        assert worker._process.pid == pid
+        assert worker.restarts == 0
+        landscape.close()
+        with publish(portrait) as ref:
+            assert worker.process(ref) is None
+    finally:
+        worker.close()
+        landscape.close()
+        portrait.close()
+
+
+def test_process_reports_not_ready_while_starting():
+    worker = InferenceWorker(DETECTOR_HANDS_OPTIONS)
+    bus = FrameBus((120, 160, 3), slots=4)
+    try:
+        with publish(bus) as ref:
+            assert worker.process(ref) is NOT_READY
+    finally:
+        worker.close()
+        bus.close()
@@ -0,0 +1,130 @@
+"""
+手部地標本機串流測試
+"""
+import socket
+import time
+
+import keyboard
+import numpy as np
+import pytest
+
+from core.air_mouse import AirMouse
+from core.gestures import Gestures
+from core.inference_worker import NOT_READY
+from core.landmark_publisher import (RECORD_DTYPE, RECORD_STRUCT, RECORD_VERSION, LandmarkPublisher,
+                                     LandmarkSubscriber, gesture_id, gesture_name)
+
+LANDMARKS = np.random.default_rng(0).random((21, 3), dtype=np.float32)
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def publisher(tmp_path):
+    publisher = LandmarkPublisher(path=str(tmp_path / 'landmarks.sock'), queue_size=64).start()
+    yield publisher
+    publisher.close()
+
+
+def test_struct_and_dtype_round_trip():
+    data = RECORD_STRUCT.pack(7, 1234.5, LANDMARKS.tobytes(), gesture_id('peace sign'), True,
+                              RECORD_VERSION)
+    record = np.frombuffer(data, dtype=RECORD_DTYPE)[0]
+    assert record['seq'] == 7
+    assert record['timestamp'] == 1234.5
+    np.testing.assert_array_equal(record['landmarks'], LANDMARKS)
+    assert gesture_name(record['gesture'], ['thumbs up', 'peace sign']) == 'peace sign'
+    assert record['detected'] == 1
+    assert record['version'] == RECORD_VERSION
+    assert gesture_name(gesture_id(Gestures.DRAG)) == Gestures.DRAG
+
+
+def test_subscriber_receives_published_frames(publisher):
+    with LandmarkSubscriber(publisher.path) as subscriber:
+        assert wait_for(lambda: publisher.subscriber_count == 1)
+        publisher.publish(1, 10.0, LANDMARKS, Gestures.MOVE)
+        publisher.publish(2, 10.1, None, None)
+
+        record = subscriber.receive(timeout=2)
+        assert record['seq'] == 1 and record['detected'] == 1
+        np.testing.assert_array_equal(record['landmarks'], LANDMARKS)
+        assert gesture_name(record['gesture']) == Gestures.MOVE
+        record = subscriber.receive(timeout=2)
+        assert record['seq'] == 2 and record['detected'] == 0
+        assert not record['landmarks'].any()
+
+    assert wait_for(lambda: publisher.subscriber_count == 0)
+
+
+def test_slow_subscriber_is_dropped_not_buffered(publisher):
+    with LandmarkSubscriber(publisher.path) as subscriber:
+        assert wait_for(lambda: publisher.subscriber_count == 1)
+        # 訂閱端不讀取：接收緩衝區滿後發布端丟棄記錄，不會阻塞或累積
+        for seq in range(5000):
+            publisher.publish(seq, 0.0, LANDMARKS, None)
+        assert wait_for(lambda: not publisher._queue)
+        stats = publisher.get_stats()
+        assert stats['dropped'] + stats['queue_dropped'] > 0
+        assert stats['sent'] < stats['published']
+
+        received = []
+        while (record := subscriber.receive(timeout=0.2)) is not None:
+            received.append(int(record['seq']))
+        assert len(received) == stats['sent']
+        assert received == sorted(received)
+
+        # 讀取恢復後立即收到新的記錄，不會先收到被丟棄的舊記錄
+        publisher.publish(9999, 0.0, LANDMARKS, None)
+        assert subscriber.receive(timeout=2)['seq'] == 9999
+
+
+def test_dead_subscriber_is_removed(publisher, tmp_path):
+    address = str(tmp_path / 'sub.sock')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(address)
+    sock.sendto(b'SUB', publisher.path)
+    assert wait_for(lambda: publisher.subscriber_count == 1)
+
+    sock.close()  # 訂閱端異常結束，沒有取消訂閱
+    publisher.publish(1, 0.0, LANDMARKS, None)
+    assert wait_for(lambda: publisher.subscriber_count == 0)
+
+
+class StillCapture:
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+class RecordingPublisher:
+    def __init__(self):
+        self.frames = []
+
+    def publish(self, seq, timestamp, landmarks, gesture):
+        self.frames.append((seq, landmarks is not None))
+
+
+def test_frames_without_inference_result_are_not_published(monkeypatch):
+    monkeypatch.setattr(keyboard, 'on_press_key', lambda *args, **kwargs: None)
+    monkeypatch.setattr(keyboard, 'unhook_all', lambda: None)
+    air_mouse = AirMouse(capture=StillCapture())
+    air_mouse.use_frame_bus = False
+    publisher = air_mouse.landmark_publisher = RecordingPublisher()
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    try:
+        for index, result in enumerate((LANDMARKS, NOT_READY, None)):
+            air_mouse._detect_landmarks = lambda frame, result=result: result
+            air_mouse.process_frame(frame, 1000.0 + index * 0.05)
+    finally:
+        air_mouse.landmark_publisher = None
+        air_mouse.cleanup()
+    assert publisher.frames == [(1, True), (3, False)]
@@ -0,0 +1,80 @@
+"""
+日誌頻率限制與追蹤記錄環形緩衝區測試
+"""
+import json
+import logging
+
+import numpy as np
+
+from core.logger import RateLimitFilter, TraceRingBuffer
+
+LONG_NAME = 'left hand rock and roll salute'
+
+
+def make_record(created, lineno=10, level=logging.DEBUG):
+    record = logging.LogRecord('air_mouse', level, 'core/air_mouse.py', lineno, 'msg', None, None)
+    record.created = created
+    return record
+
+
+def test_rate_limit_per_call_site():
+    rate_limit = RateLimitFilter(min_interval=1.0)
+    assert rate_limit.filter(make_record(100.0))
+    assert not rate_limit.filter(make_record(100.5))
+    assert rate_limit.filter(make_record(100.5, lineno=11))  # 不同呼叫位置各自計算
+    assert not rate_limit.filter(make_record(100.99))
+    assert rate_limit.filter(make_record(101.0))
+    assert rate_limit.suppressed == 2
+
+
+def test_rate_limit_passes_warnings():
+    rate_limit = RateLimitFilter(min_interval=1.0)
+    for _ in range(3):
+        assert rate_limit.filter(make_record(100.0, level=logging.WARNING))
+    assert rate_limit.suppressed == 0
+
+
+def fill(trace, frames):
+    for frame_index in frames:
+        trace.append(frame_index, True, frame_index % 32,
+                     LONG_NAME if frame_index % 2 else None,
+                     1.0, 2.0, 3.0, timestamp=1000.0 + frame_index)
+
+
+def test_ring_buffer_wraps_in_time_order():
+    trace = TraceRingBuffer(capacity=4)
+    fill(trace, range(1, 3))
+    assert len(trace) == 2
+    assert trace.snapshot()['frame_index'].tolist() == [1, 2]
+
+    fill(trace, range(3, 11))
+    assert len(trace) == 4
+    records = trace.snapshot()
+    assert records['frame_index'].tolist() == [7, 8, 9, 10]
+    assert records['gesture'].tolist() == [LONG_NAME, '', LONG_NAME, '']
+
+    trace.clear()
+    assert len(trace) == 0 and len(trace.snapshot()) == 0
+
+
+def test_dump_formats(tmp_path):
+    trace = TraceRingBuffer(capacity=4)
+    fill(trace, range(1, 7))
+    trace.append(7, False, 0, None, 1.0, 2.0, 3.0, timestamp=1007.0,
+                 event='click', event_latency_ms=12.5)
+
+    path = trace.dump(str(tmp_path / 'trace.jsonl'))
+    with open(path, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    assert [row['frame_index'] for row in rows] == [4, 5, 6, 7]
+    assert list(rows[0]) == ['timestamp', 'frame_index', 'hand_detected', 'finger_mask', 'gesture',
+                             'inference_ms', 'control_ms', 'total_ms', 'event', 'event_latency_ms']
+    assert rows[1] == {'timestamp': 1005.0, 'frame_index': 5, 'hand_detected': True,
+                       'finger_mask': 5, 'gesture': LONG_NAME, 'inference_ms': 1.0,
+                       'control_ms': 2.0, 'total_ms': 3.0, 'event': '', 'event_latency_ms': 0.0}
+    assert rows[3]['event'] == 'click' and rows[3]['event_latency_ms'] == 12.5
+
+    path = trace.dump(str(tmp_path / 'trace.npy'))
+    records = np.load(path)
+    assert records['frame_index'].tolist() == [4, 5, 6, 7]
+    assert records['gesture'].tolist() == ['', LONG_NAME, '', '']
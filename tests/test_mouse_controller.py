@@ -0,0 +1,56 @@
+"""
+滑鼠控制器手勢處理測試
+"""
+import pytest
+
+from core.air_mouse import MouseController
+from core.config import GESTURE_TABLE
+from core.gestures import Gestures
+
+
+class RecordingPointer:
+    """記錄按鍵事件的滑鼠後端"""
+
+    def __init__(self):
+        self.events = []
+
+    def mouseDown(self, **kwargs):
+        self.events.append('down')
+
+    def mouseUp(self, **kwargs):
+        self.events.append('up')
+
+
+@pytest.fixture
+def controller():
+    clock = [0.0]
+    controller = MouseController()
+    controller.pointer = RecordingPointer()
+    controller.clock = lambda: clock[0]
+    controller.drag_hold_time = 0.3
+
+    def step(timestamp, gesture):
+        clock[0] = timestamp
+        controller.update_gesture(gesture)
+        return list(controller.pointer.events)
+
+    return step
+
+
+def test_brief_drag_pose_does_not_press(controller):
+    assert controller(0.0, Gestures.DRAG) == []
+    assert controller(0.2, Gestures.DRAG) == []
+    assert controller(0.25, Gestures.MOVE) == []
+    assert controller(0.4, Gestures.DRAG) == []
+    assert controller(0.5, None) == []
+
+
+def test_held_drag_pose_presses_and_releases(controller):
+    controller(0.0, Gestures.DRAG)
+    assert controller(0.3, Gestures.DRAG) == ['down']
+    assert controller(0.5, Gestures.DRAG) == ['down']
+    assert controller(0.6, Gestures.MOVE) == ['down', 'up']
+
+
+def test_resting_thumb_and_index_is_not_drag():
+    assert GESTURE_TABLE.get((1, 1, 0, 0, 0)) != Gestures.DRAG
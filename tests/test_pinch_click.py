@@ -0,0 +1,104 @@
+"""
+捏合點擊測試（以合成的地標序列驅動）
+"""
+import keyboard
+import numpy as np
+import pytest
+
+from core.air_mouse import AirMouse
+from core.gestures import PinchDetector
+from core.session_recorder import PointerRecorder
+
+FRAME_SHAPE = (120, 160, 3)
+PALM = 0.2  # 手腕到中指根部的正規化距離（垂直）
+FRAME_INTERVAL = 0.05
+
+
+def hand(distance, index_x=0.5):
+    """拇指與食指指尖距離為 distance（以手掌大小為單位）的地標"""
+    landmarks = np.zeros((21, 3), dtype=np.float32)
+    landmarks[:] = (0.5, 0.8, 0.0)
+    landmarks[9] = (0.5, 0.8 - PALM, 0.0)  # 中指根部
+    palm_pixels = PALM * FRAME_SHAPE[0]
+    landmarks[PinchDetector.INDEX_TIP] = (index_x, 0.5, 0.0)
+    landmarks[PinchDetector.THUMB_TIP] = (index_x + distance * palm_pixels / FRAME_SHAPE[1], 0.5, 0.0)
+    return landmarks
+
+
+def run_detector(distances):
+    detector = PinchDetector(arm_threshold=0.5, close_threshold=0.25, release_threshold=0.6,
+                             closing_velocity=2.5)
+    return [detector.update(hand(distance), FRAME_SHAPE, index * FRAME_INTERVAL)
+            for index, distance in enumerate(distances)]
+
+
+def test_fast_close_clicks_before_close_threshold():
+    # 0.46 -> 0.3：閉合速度 3.2/秒，尚未低於 close 閾值就點擊
+    events = run_detector([0.7, 0.62, 0.54, 0.46, 0.3, 0.2, 0.1, 0.1])
+    assert events == [None, None, None, PinchDetector.ARMED, PinchDetector.CLICK, None, None, None]
+
+
+def test_closing_fast_from_open_clicks_immediately():
+    events = run_detector([1.0, 0.45, 0.2])
+    assert events == [None, PinchDetector.CLICK, None]
+
+
+def test_slow_close_clicks_at_close_threshold():
+    # 每幀閉合 0.04（0.8/秒）：低於 arm 閾值時鎖定，低於 close 閾值時點擊
+    events = run_detector([0.71, 0.67, 0.63, 0.59, 0.55, 0.51, 0.47, 0.43, 0.39, 0.35, 0.31,
+                           0.27, 0.23, 0.19])
+    assert events.index(PinchDetector.ARMED) == 6
+    assert events.index(PinchDetector.CLICK) == 12
+    assert events.count(PinchDetector.CLICK) == 1
+
+
+def test_release_needs_hysteresis():
+    # 0.55 介於 arm 與 release 閾值之間：不解除也不重新點擊
+    events = run_detector([0.7, 0.62, 0.54, 0.46, 0.3, 0.1, 0.55, 0.1, 0.55, 0.7,
+                           0.62, 0.54, 0.46, 0.3])
+    assert events == [None, None, None, PinchDetector.ARMED, PinchDetector.CLICK,
+                      None, None, None, None, PinchDetector.RELEASED,
+                      None, None, PinchDetector.ARMED, PinchDetector.CLICK]
+
+
+class StillCapture:
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+@pytest.fixture
+def air_mouse(monkeypatch):
+    monkeypatch.setattr(keyboard, 'on_press_key', lambda *args, **kwargs: None)
+    monkeypatch.setattr(keyboard, 'unhook_all', lambda: None)
+    air_mouse = AirMouse(capture=StillCapture())
+    air_mouse.use_frame_bus = False
+    air_mouse.pinch_click_enabled = True
+    pointer = PointerRecorder(position=(400, 300))
+    air_mouse.mouse_controller.pointer = pointer
+    air_mouse.mouse_controller.clock = lambda: air_mouse.frame_timestamp
+    yield air_mouse
+    air_mouse.cleanup()
+
+
+def test_click_fires_on_closing_frame_at_latched_position(air_mouse):
+    # 捏合時食指往右移動：點擊仍在開始捏合時鎖定的游標位置
+    sequence = [hand(0.7), hand(0.62), hand(0.54), hand(0.46), hand(0.3, index_x=0.6),
+                hand(0.1, index_x=0.7), hand(0.1, index_x=0.7), hand(0.8, index_x=0.7)]
+    frame = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+    pointer = air_mouse.mouse_controller.pointer
+    events, clicks = [], []
+    for index, landmarks in enumerate(sequence):
+        air_mouse._detect_landmarks = lambda frame, landmarks=landmarks: landmarks
+        if index == 3:
+            pointer.moveTo(250, 180)  # 開始捏合時的游標位置
+        air_mouse.process_frame(frame, 1000.0 + index * FRAME_INTERVAL)
+        events.append(air_mouse.last_event)
+        clicks.extend(event for event in pointer.take() if event[0] == 'click')
+
+    assert events == [None, None, None, None, 'pinch', None, None, None]
+    assert clicks == [['click', 250, 180, 'left']]
+    assert air_mouse.mouse_controller.latched_position is None
+    assert air_mouse.get_click_latency_stats()['count'] == 1
@@ -0,0 +1,59 @@
+"""
+工作階段錄製與重播測試
+"""
+import numpy as np
+import pytest
+
+from core.session_recorder import SessionRecorder, SessionReplay
+
+
+def record(directory, frames, **kwargs):
+    recorder = SessionRecorder(str(directory), **kwargs)
+    recorder.start({'rotation': 0}, frame_rate=30.0)
+    for index, frame in enumerate(frames):
+        recorder.add_frame(frame, index / 30)
+        recorder.log_frame(True, None, None, None, None, {'rotation': 0})
+    recorder.close()
+    return recorder
+
+
+@pytest.mark.parametrize('fourcc', [None, 'XXXX'])
+def test_default_recording_is_lossless(tmp_path, fourcc):
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (48, 64, 3), dtype=np.uint8) for _ in range(5)]
+    # 無法使用的編碼改存影像序列，同樣無損
+    recorder = record(tmp_path, frames, **({'fourcc': fourcc} if fourcc else {}))
+    assert recorder.error is None
+
+    replay = SessionReplay(recorder.path)
+    for frame in frames:
+        success, image = replay.read()
+        assert success
+        np.testing.assert_array_equal(image, frame)
+    replay.release()
+
+
+def result(gesture, pointer=()):
+    return {'processed': True, 'landmarks': None, 'gesture': gesture, 'event': None,
+            'pointer': list(pointer)}
+
+
+def test_divergence_after_skipped_frame_is_expected():
+    report = {'frames': 0, 'mismatched_frames': 0, 'processed_mismatches': 0,
+              'detection_mismatches': 0, 'gesture_mismatches': 0, 'event_mismatches': 0,
+              'pointer_mismatches': 0, 'landmark_max_diff': 0.0, 'first_mismatch': None,
+              'skip_divergences': 0}
+    expected = [dict(result('drag'), i=i) for i in range(4)]
+    actual = [result('move'), result('move'), result('drag'), result('move')]
+
+    # 第 0 幀之前有錄製時丟棄的影格：差異持續到重播重新一致為止
+    diverging = SessionReplay._compare(expected[0], actual[0], report, True)
+    diverging = SessionReplay._compare(expected[1], actual[1], report, diverging)
+    assert diverging
+    diverging = SessionReplay._compare(expected[2], actual[2], report, diverging)
+    assert not diverging
+    SessionReplay._compare(expected[3], actual[3], report, diverging)
+    assert report['skip_divergences'] == 2
+    assert report['mismatched_frames'] == 1
+    assert report['gesture_mismatches'] == 1
+    assert report['first_mismatch'] == {'frame': 3, 'fields': ['gesture']}
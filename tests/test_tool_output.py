@@ -0,0 +1,42 @@
+"""
+命令列工具輸出測試：stdout 只能有 JSON lines（匯入時的提示訊息必須寫到 stderr）
+"""
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from core.gesture_storage import write_gesture_file
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def run_tool(*args):
+    """以子行程執行工具，回傳 (stdout 行, 結束碼)"""
+    result = subprocess.run([sys.executable, '-m', *args], cwd=ROOT, capture_output=True,
+                            text=True, timeout=120)
+    return result.stdout.splitlines(), result.returncode
+
+
+def test_gesture_library_stdout_is_json_lines(tmp_path):
+    rng = np.random.default_rng(0)
+    for name in ('wave', 'circle'):
+        write_gesture_file(str(tmp_path / f'{name}.gesture'), name,
+                           rng.random((20, 21, 3), dtype=np.float32), '2024-01-01 00:00:00')
+
+    for command in ('analyze', 'validate'):
+        lines, returncode = run_tool('tools.gesture_library', command, str(tmp_path))
+        assert returncode == 0
+        assert len(lines) == 2
+        for line in lines:
+            json.loads(line)
+
+
+def test_air_mouse_ctl_stdout_is_empty_without_daemon(tmp_path):
+    # 沒有背景服務時錯誤只寫到 stderr
+    lines, returncode = run_tool('tools.air_mouse_ctl', '--socket', str(tmp_path / 'none.sock'),
+                                 'stats')
+    assert returncode != 0
+    assert lines == []
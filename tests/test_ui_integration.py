@@ -0,0 +1,51 @@
+"""
+圖形介面整合測試（需要顯示器，沒有時略過）
+"""
+import sys
+import tkinter as tk
+
+import keyboard
+import pytest
+
+import app
+from ui.main_window import AirMouseUI
+
+
+@pytest.fixture
+def start_gui(monkeypatch):
+    """以命令列參數執行 GUI 模式（mainloop 立即返回），回傳建立的介面"""
+    try:
+        tk.Tk().destroy()
+    except tk.TclError:
+        pytest.skip("沒有可用的顯示器")
+
+    monkeypatch.setattr(keyboard, 'on_press_key', lambda *args, **kwargs: None)
+    monkeypatch.setattr(keyboard, 'unhook_all', lambda: None)
+    monkeypatch.setattr(tk.Tk, 'mainloop', lambda self, n=0: None)
+    created = []
+    original_init = AirMouseUI.__init__
+
+    def init(ui):
+        original_init(ui)
+        created.append(ui)
+
+    monkeypatch.setattr(AirMouseUI, '__init__', init)
+
+    def start(*argv):
+        monkeypatch.setattr(sys, 'argv', ['app.py', *argv])
+        app.main()
+        return created[-1]
+
+    yield start
+    for ui in created:
+        ui.on_closing()
+
+
+def test_gui_keeps_command_line_settings(start_gui):
+    # run() 不可再以預設值覆寫命令列參數
+    ui = start_gui('--preview-fps', '12', '--fps', '40', '--rotation', '90')
+    settings = ui.air_mouse.get_settings()
+    assert settings['preview_fps'] == 12
+    assert settings['rotation'] == 90
+    assert ui.preview_fps_var.get() == 12
+    assert ui.fps_var.get() == 40
@@ -0,0 +1,3 @@
+"""
+離線工具模組
+"""
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+背景模式控制工具
+透過控制通訊端調整執行中的 Air Mouse（python app.py --daemon）並查詢統計
+
+使用方式:
+    python -m tools.air_mouse_ctl stats
+    python -m tools.air_mouse_ctl settings
+    python -m tools.air_mouse_ctl set [--fps 60] [--preview-fps 30] [--rotation 0|90|180|270]
+                                      [--flip-h on|off] [--flip-v on|off]
+                                      [--jitter-filter on|off] [--jitter-threshold 15]
+                                      [--pinch-click on|off]
+    python -m tools.air_mouse_ctl pause | resume | dump_trace | stop
+
+回覆以 JSON 輸出到標準輸出；指令失敗時結束碼為 1。
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+
+# 確保可以導入自定義模組
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.config import CONTROL_SOCKET_PATH
+
+
+def send_command(path, request, timeout=5.0):
+    """送出一個指令並回傳回覆（dict）"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        with sock.makefile('rb') as reply:
+            line = reply.readline()
+    if not line:
+        raise ConnectionError("控制通訊端已關閉連線")
+    return json.loads(line)
+
+
+def on_off(value):
+    """解析 on/off 參數"""
+    value = value.lower()
+    if value in ('on', 'true', '1', 'yes'):
+        return True
+    if value in ('off', 'false', '0', 'no'):
+        return False
+    raise argparse.ArgumentTypeError(f"請使用 on 或 off: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="控制背景模式的 Air Mouse")
+    parser.add_argument('--socket', default=CONTROL_SOCKET_PATH,
+                        help=f'控制通訊端路徑（預設: {CONTROL_SOCKET_PATH}）')
+    subparsers = parser.add_subparsers(dest='cmd', required=True)
+    for command, help_text in (('stats', '查詢執行統計'), ('settings', '查詢目前參數'),
+                               ('pause', '暫停處理'), ('resume', '恢復處理'),
+                               ('dump_trace', '匯出每幀追蹤記錄'), ('stop', '結束程式')):
+        subparsers.add_parser(command, help=help_text)
+
+    set_parser = subparsers.add_parser('set', help='調整參數（只修改有指定的項目）')
+    set_parser.add_argument('--fps', type=int, help='處理頻率 (10-100)')
+    set_parser.add_argument('--preview-fps', type=int, help='預覽頻率')
+    set_parser.add_argument('--rotation', type=int, choices=[0, 90, 180, 270], help='旋轉角度')
+    set_parser.add_argument('--flip-h', type=on_off, help='水平翻轉 on/off')
+    set_parser.add_argument('--flip-v', type=on_off, help='垂直翻轉 on/off')
+    set_parser.add_argument('--jitter-filter', type=on_off, help='抖動過濾 on/off')
+    set_parser.add_argument('--jitter-threshold', type=float, help='抖動過濾閾值（像素）')
+    set_parser.add_argument('--pinch-click', type=on_off, help='捏合點擊 on/off')
+    args = parser.parse_args()
+
+    request = {'cmd': args.cmd}
+    if args.cmd == 'set':
+        for key in ('fps', 'preview_fps', 'rotation', 'flip_h', 'flip_v',
+                    'jitter_filter', 'jitter_threshold', 'pinch_click'):
+            value = getattr(args, key)
+            if value is not None:
+                request[key] = value
+        if len(request) == 1:
+            set_parser.error("請至少指定一個參數")
+
+    try:
+        response = send_command(args.socket, request)
+    except (OSError, ValueError) as e:
+        print(f"[控制] 無法連線到 {args.socket}: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(response, ensure_ascii=False, indent=2))
+    return 0 if response.get('ok') else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
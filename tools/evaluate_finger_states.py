@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+手指狀態離線評估工具
+以已錄製的手勢檔案比較舊版（原始座標比較）與新版（正規化分數 + 遲滯）手指判斷
+
+使用方式:
+    python -m tools.evaluate_finger_states [gestures 目錄或檔案 ...]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+# 確保可以導入自定義模組
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.config import CAMERA_WIDTH, CAMERA_HEIGHT
+from core.gestures import FingerStateEstimator, GestureClassifier, finger_mask
+from core.gesture_storage import read_any, is_gesture_file
+from utils.image_processing import ImageProcessor
+
+ROTATIONS = (90, 180, 270)
+
+
+def legacy_finger_states(landmarks):
+    """舊版判斷：直接比較指尖與關節的原始 x/y 座標（批次版本）"""
+    states = np.zeros(landmarks.shape[:-2] + (5,), dtype=bool)
+    states[..., 0] = landmarks[..., 4, 0] < landmarks[..., 3, 0]
+    states[..., 1:] = landmarks[..., [8, 12, 16, 20], 1] < landmarks[..., [6, 10, 14, 18], 1]
+    return states
+
+
+def estimator_states(landmarks, frame_shape):
+    """新版判斷：逐幀套用遲滯"""
+    estimator = FingerStateEstimator()
+    return np.array([estimator.update(frame, frame_shape).copy() for frame in landmarks])
+
+
+def rotate(landmarks, rotation, frame_shape):
+    """旋轉地標並回傳旋轉後的地標與影格形狀"""
+    rotated = ImageProcessor.adjust_landmark_array_for_rotation(landmarks, rotation)
+    frame_h, frame_w = frame_shape
+    if rotation in (90, 270):
+        # z 與 x 同尺度（以影格寬度正規化），寬度改變時一併換算
+        rotated[..., 2] *= frame_w / frame_h
+        return rotated, (frame_w, frame_h)
+    return rotated, frame_shape
+
+
+def count_toggles(states):
+    """計算手指狀態切換次數"""
+    return int(np.count_nonzero(states[1:] != states[:-1]))
+
+
+def count_gesture_changes(states):
+    """以手勢分類器計算手勢切換次數"""
+    classifier = GestureClassifier()
+    gestures = [classifier.update(finger_mask(row.astype(int))) for row in states]
+    return sum(1 for a, b in zip(gestures, gestures[1:]) if a != b)
+
+
+def evaluate(landmarks, frame_shape=(CAMERA_HEIGHT, CAMERA_WIDTH)):
+    """評估一段地標序列"""
+    legacy = legacy_finger_states(landmarks)
+    current = estimator_states(landmarks, frame_shape)
+
+    legacy_consistency = []
+    current_consistency = []
+    for rotation in ROTATIONS:
+        rotated, rotated_shape = rotate(landmarks, rotation, frame_shape)
+        legacy_consistency.append(np.mean(np.all(legacy_finger_states(rotated) == legacy, axis=1)))
+        current_consistency.append(np.mean(np.all(estimator_states(rotated, rotated_shape) == current, axis=1)))
+
+    frame_count = len(landmarks)
+    per_100 = 100.0 / max(1, frame_count - 1)
+    return {
+        'frames': frame_count,
+        'legacy_toggles_per_100': count_toggles(legacy) * per_100,
+        'toggles_per_100': count_toggles(current) * per_100,
+        'legacy_gesture_changes': count_gesture_changes(legacy),
+        'gesture_changes': count_gesture_changes(current),
+        'legacy_rotation_consistency': float(np.mean(legacy_consistency)),
+        'rotation_consistency': float(np.mean(current_consistency)),
+        'agreement_with_legacy': float(np.mean(np.all(legacy == current, axis=1))),
+    }
+
+
+def iter_gesture_files(paths):
+    """列出指定路徑中的手勢檔案"""
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if is_gesture_file(filename):
+                    yield os.path.join(path, filename)
+        else:
+            yield path
+
+
+def load_landmarks(filepath):
+    """載入手勢檔案並轉為 (幀數, 21, 3) 陣列"""
+    _, landmarks, _ = read_any(filepath)
+    return np.asarray(landmarks, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以已錄製的手勢評估手指狀態判斷")
+    parser.add_argument('paths', nargs='*', default=['gestures'],
+                        help='手勢檔案或目錄（預設: gestures）')
+    parser.add_argument('--json', action='store_true', help='以 JSON lines 輸出每個檔案的結果')
+    args = parser.parse_args()
+
+    results = []
+    for filepath in iter_gesture_files(args.paths):
+        try:
+            landmarks = load_landmarks(filepath)
+        except Exception as e:
+            print(f"[評估] 無法載入 {filepath}: {e}", file=sys.stderr)
+            continue
+        if len(landmarks) < 2:
+            continue
+        result = evaluate(landmarks)
+        result['file'] = os.path.basename(filepath)
+        results.append(result)
+
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False))
+        else:
+            print(f"{result['file']}: {result['frames']} 幀 | "
+                  f"切換/100幀 {result['legacy_toggles_per_100']:.1f} -> {result['toggles_per_100']:.1f} | "
+                  f"手勢切換 {result['legacy_gesture_changes']} -> {result['gesture_changes']} | "
+                  f"旋轉一致性 {result['legacy_rotation_consistency']:.0%} -> {result['rotation_consistency']:.0%}")
+
+    if not results:
+        print("[評估] 找不到可評估的手勢檔案", file=sys.stderr)
+        return 1
+
+    if not args.json:
+        total_frames = sum(r['frames'] for r in results)
+
+        def weighted(key):
+            return sum(r[key] * r['frames'] for r in results) / total_frames
+
+        print()
+        print(f"總計 {len(results)} 個檔案, {total_frames} 幀")
+        print(f"手指狀態切換 (每 100 幀): 舊版 {weighted('legacy_toggles_per_100'):.1f}, "
+              f"新版 {weighted('toggles_per_100'):.1f}")
+        print(f"旋轉一致性: 舊版 {weighted('legacy_rotation_consistency'):.1%}, "
+              f"新版 {weighted('rotation_consistency'):.1%}")
+        print(f"與舊版一致: {weighted('agreement_with_legacy'):.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
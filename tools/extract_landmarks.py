@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+影片手部地標批次擷取工具
+從預先錄製的影片擷取手部地標序列，儲存為與手勢錄入相同的 .gesture 格式
+
+使用方式:
+    python -m tools.extract_landmarks [影片檔案或目錄 ...] [--output-dir gestures] [--name 名稱]
+                                      [--rotation 0|90|180|270] [--flip-h] [--flip-v]
+                                      [--jobs N] [--chunk-seconds 60] [--stride 1]
+
+多個影片平行處理，長影片依 --chunk-seconds 切成多段分給不同的工作行程，完成後依順序
+合併為一個手勢檔案。每一段都建立新的 MediaPipe Hands（追蹤模式會沿用上一幀的手部位置，
+重複使用會讓結果受工作分配影響）；無法精確定位的影片不切段。
+畫面方向與即時模式相同，以 ImageProcessor.adjust_frame_orientation 調整後才偵測。
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+# 確保可以導入自定義模組
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.gestures import mp_hands, landmarks_to_array
+from core.gesture_storage import GESTURE_FILE_EXTENSION, write_gesture_file
+from utils.image_processing import ImageProcessor
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+DEFAULT_FPS = 30.0  # 影片沒有提供 FPS 時使用
+
+# 工作行程中的設定（由 _init_worker 設定，每個行程一份）
+_options = None
+
+
+def iter_video_files(paths):
+    """列出指定路徑中的影片檔案（目錄依檔名排序）"""
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if filename.lower().endswith(VIDEO_EXTENSIONS):
+                    yield os.path.join(path, filename)
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            yield path
+
+
+def _can_seek(cap, frame):
+    """容器是否能精確定位到指定幀"""
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+    return int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame
+
+
+def probe_video(filepath):
+    """讀取影片的 FPS、幀數（未知時為 0）與是否能精確定位"""
+    cap = cv2.VideoCapture(filepath)
+    try:
+        if not cap.isOpened():
+            raise IOError(f"無法開啟影片: {filepath}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        frame_count = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        seekable = frame_count > 1 and _can_seek(cap, frame_count // 2)
+        return fps, frame_count, seekable
+    finally:
+        cap.release()
+
+
+def plan_chunks(filepath, chunk_seconds):
+    """將影片切成 (檔案, 起始幀, 結束幀或 None, FPS) 工作
+
+    幀數未知、不切段或無法精確定位時為單一工作（否則每段都要從頭逐幀略過）。
+    """
+    fps, frame_count, seekable = probe_video(filepath)
+    if chunk_seconds <= 0 or frame_count == 0:
+        return [(filepath, 0, None, fps)]
+    chunk_frames = max(1, int(round(chunk_seconds * fps)))
+    if not seekable and frame_count > chunk_frames:
+        print(f"[擷取] 警告: {os.path.basename(filepath)} 無法精確定位，不切段處理",
+              file=sys.stderr)
+        return [(filepath, 0, None, fps)]
+    return [(filepath, start, min(start + chunk_frames, frame_count), fps)
+            for start in range(0, frame_count, chunk_frames)]
+
+
+def _init_worker(options):
+    """工作行程初始化：保存擷取設定"""
+    global _options
+    _options = options
+
+
+def _create_hands(options):
+    """建立 MediaPipe Hands（每段影片一個，追蹤狀態不會跨段或跨影片沿用）"""
+    return mp_hands.Hands(
+        static_image_mode=False,
+        max_num_hands=1,
+        min_detection_confidence=options['min_detection_confidence'],
+        min_tracking_confidence=options['min_tracking_confidence'],
+        model_complexity=options['model_complexity']
+    )
+
+
+def _seek(cap, start, filepath):
+    """移動到起始幀；容器不支援精確定位時警告並從頭逐幀略過"""
+    if start == 0:
+        return
+    if not _can_seek(cap, start):
+        print(f"[擷取] 警告: {os.path.basename(filepath)} 無法定位到第 {start} 幀，"
+              f"從頭逐幀略過", file=sys.stderr)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        for _ in range(start):
+            if not cap.grab():
+                break
+
+
+def extract_chunk(task):
+    """在工作行程中擷取一段影片的地標，回傳 (地標, 時間戳記, 統計資訊)
+
+    失敗時不拋出例外（避免中斷其餘結果），改在統計資訊的 'error' 欄位回報。
+    """
+    try:
+        return _extract_chunk(*task)
+    except Exception as e:
+        stats = {'pid': os.getpid(), 'frames': 0, 'detected': 0, 'elapsed': 0.0, 'error': str(e)}
+        return np.empty((0, 21, 3), np.float32), np.empty(0, np.float64), stats
+
+
+def _extract_chunk(filepath, start, stop, fps):
+    """擷取 [start, stop) 幀的地標（stop 為 None 時讀到影片結尾）"""
+    options = _options
+    cap = cv2.VideoCapture(filepath)
+    if not cap.isOpened():
+        raise IOError(f"無法開啟影片: {filepath}")
+
+    landmarks = []
+    timestamps = []
+    frames_read = 0
+    begin = time.perf_counter()
+    capture = None  # 擷取緩衝區（與旋轉後的影格分開，旋轉 90/270 度時形狀不同）
+    rgb_frame = None
+    hands = _create_hands(options)
+    try:
+        _seek(cap, start, filepath)
+        index = start
+        while stop is None or index < stop:
+            if (index - start) % options['stride']:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+
+            success, capture = cap.read(capture)
+            if not success:
+                break
+            frames_read += 1
+
+            frame = ImageProcessor.adjust_frame_orientation(
+                capture, options['rotation'], options['flip_horizontal'], options['flip_vertical'])
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_frame)
+            results = hands.process(rgb_frame)
+            if results.multi_hand_landmarks:
+                landmarks.append(landmarks_to_array(results.multi_hand_landmarks[0]))
+                timestamps.append(index / fps)
+            index += 1
+    finally:
+        hands.close()
+        cap.release()
+
+    stats = {
+        'pid': os.getpid(),
+        'frames': frames_read,
+        'detected': len(landmarks),
+        'elapsed': time.perf_counter() - begin,
+    }
+    if landmarks:
+        return np.stack(landmarks), np.array(timestamps, dtype=np.float64), stats
+    return np.empty((0, 21, 3), np.float32), np.empty(0, np.float64), stats
+
+
+def output_path(filepath, output_dir, name=None):
+    """影片對應的手勢檔案路徑"""
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    filename = f"{name}_{stem}" if name else stem
+    return os.path.join(output_dir, filename + GESTURE_FILE_EXTENSION)
+
+
+def save_sequence(filepath, target, name, chunks, options):
+    """依順序合併各段結果並寫入手勢檔案（時間戳記以第一個偵測到的幀為 0）"""
+    landmarks = np.concatenate([chunk[0] for chunk in chunks])
+    timestamps = np.concatenate([chunk[1] for chunk in chunks])
+    if len(landmarks) < options['min_frames']:
+        return False
+    recorded = datetime.fromtimestamp(os.path.getmtime(filepath)).strftime("%Y-%m-%d %H:%M:%S")
+    write_gesture_file(target, name, landmarks, recorded, timestamps=timestamps - timestamps[0],
+                       source=os.path.basename(filepath), rotation=options['rotation'],
+                       flip_horizontal=options['flip_horizontal'],
+                       flip_vertical=options['flip_vertical'])
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="從影片批次擷取手部地標序列")
+    parser.add_argument('paths', nargs='+', help='影片檔案或目錄')
+    parser.add_argument('--output-dir', default='gestures', help='輸出目錄（預設: gestures）')
+    parser.add_argument('--name', help='手勢名稱（預設: 影片檔名）')
+    parser.add_argument('--rotation', type=int, default=0, choices=[0, 90, 180, 270],
+                        help='旋轉角度（與 app.py 相同）')
+    parser.add_argument('--flip-h', action='store_true', help='水平翻轉畫面')
+    parser.add_argument('--flip-v', action='store_true', help='垂直翻轉畫面')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='工作行程數（預設: CPU 核心數）')
+    parser.add_argument('--chunk-seconds', type=float, default=60.0,
+                        help='長影片每段的秒數，0 表示不切段（預設: 60）')
+    parser.add_argument('--stride', type=int, default=1, help='每隔幾幀偵測一次（預設: 1）')
+    parser.add_argument('--min-frames', type=int, default=5, help='最少偵測到的幀數（預設: 5）')
+    parser.add_argument('--model-complexity', type=int, default=1, choices=[0, 1])
+    parser.add_argument('--min-detection-confidence', type=float, default=0.7)
+    parser.add_argument('--min-tracking-confidence', type=float, default=0.5)
+    parser.add_argument('--overwrite', action='store_true', help='覆寫已存在的手勢檔案')
+    args = parser.parse_args()
+
+    options = {
+        'rotation': args.rotation,
+        'flip_horizontal': args.flip_h,
+        'flip_vertical': args.flip_v,
+        'stride': max(1, args.stride),
+        'min_frames': args.min_frames,
+        'model_complexity': args.model_complexity,
+        'min_detection_confidence': args.min_detection_confidence,
+        'min_tracking_confidence': args.min_tracking_confidence,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # 規劃工作：已存在的輸出檔案略過，長影片切段
+    videos = []
+    tasks = []
+    for filepath in iter_video_files(args.paths):
+        target = output_path(filepath, args.output_dir, args.name)
+        if os.path.exists(target) and not args.overwrite:
+            print(f"[擷取] 略過（已存在）: {target}")
+            continue
+        try:
+            chunks = plan_chunks(filepath, args.chunk_seconds)
+        except IOError as e:
+            print(f"[擷取] {e}", file=sys.stderr)
+            continue
+        videos.append((filepath, target, len(chunks)))
+        tasks.extend(chunks)
+
+    if not tasks:
+        print("[擷取] 找不到可處理的影片", file=sys.stderr)
+        return 1
+
+    workers = min(args.jobs or os.cpu_count() or 1, len(tasks))
+    print(f"[擷取] {len(videos)} 個影片，{len(tasks)} 段，{workers} 個工作行程")
+
+    start = time.perf_counter()
+    worker_stats = {}
+    saved = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(options,)) as pool:
+        results = pool.map(extract_chunk, tasks)
+        for filepath, target, chunk_count in videos:
+            name = args.name or os.path.splitext(os.path.basename(filepath))[0]
+            chunks = [next(results) for _ in range(chunk_count)]
+            errors = [stats['error'] for _, _, stats in chunks if 'error' in stats]
+            for _, _, stats in chunks:
+                total = worker_stats.setdefault(stats['pid'], {'frames': 0, 'elapsed': 0.0})
+                total['frames'] += stats['frames']
+                total['elapsed'] += stats['elapsed']
+
+            frames = sum(stats['frames'] for _, _, stats in chunks)
+            detected = sum(stats['detected'] for _, _, stats in chunks)
+            if errors:
+                print(f"[擷取] 失敗 {filepath}: {errors[0]}", file=sys.stderr)
+            elif save_sequence(filepath, target, name, chunks, options):
+                saved += 1
+                print(f"[擷取] {os.path.basename(filepath)} -> {target}: "
+                      f"{detected}/{frames} 幀偵測到手部")
+            else:
+                print(f"[擷取] {os.path.basename(filepath)}: 偵測到的幀數不足 ({detected}/{frames})")
+
+    elapsed = time.perf_counter() - start
+    print()
+    for pid, total in sorted(worker_stats.items()):
+        fps = total['frames'] / total['elapsed'] if total['elapsed'] > 0 else 0.0
+        print(f"工作行程 {pid}: {total['frames']} 幀, {fps:.1f} FPS")
+    all_frames = sum(total['frames'] for total in worker_stats.values())
+    print(f"總計 {saved}/{len(videos)} 個影片，{all_frames} 幀，耗時 {elapsed:.1f} 秒 "
+          f"({all_frames / max(elapsed, 1e-6):.1f} FPS)")
+    return 0 if saved == len(videos) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
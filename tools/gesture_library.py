@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+手勢庫離線批次工具
+以多個行程平行分析、驗證、轉換、去重與比較整個手勢庫，結果以 JSON lines 輸出
+
+使用方式:
+    python -m tools.gesture_library analyze  [gestures 目錄或檔案 ...] [--jobs N] [--full]
+    python -m tools.gesture_library validate [gestures ...] [--min-frames 5]
+    python -m tools.gesture_library convert  [gestures ...] [--format binary|json] [--quantize]
+                                             [--output-dir DIR] [--overwrite]
+    python -m tools.gesture_library dedupe   [gestures ...] [--threshold 0.001]
+    python -m tools.gesture_library compare  [gestures ...] [--against DIR ...] [--k 3]
+                                             [--threshold 0.5]
+
+每個檔案的讀取與特徵計算分散到 ProcessPoolExecutor 的工作行程，
+結果依輸入順序逐行寫到標準輸出（或 --output 檔案），摘要寫到標準錯誤。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 確保可以導入自定義模組
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.config import (GESTURE_FEATURE_LENGTH, GESTURE_MATCH_THRESHOLD,
+                         GESTURE_SIMILARITY_BLOCK_ELEMENTS)
+from core.gesture_catalog import landmarks_checksum
+from core.gesture_features import GestureFeatureIndex, sequence_features
+from core.gesture_recorder import GestureData, GestureAnalyzer
+from core.gesture_storage import (GESTURE_FILE_EXTENSION, LEGACY_FILE_EXTENSION, is_gesture_file,
+                                  read_header, write_gesture_file, read_gesture_file,
+                                  atomic_write)
+
+
+def iter_gesture_files(paths):
+    """列出指定路徑中的手勢檔案（目錄依檔名排序）"""
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if is_gesture_file(filename):
+                    yield os.path.join(path, filename)
+        elif is_gesture_file(os.path.basename(path)):
+            yield path
+
+
+# ===== 工作行程執行的函式（模組層級，可被 pickle） =====
+
+def analyze_file(filepath, full=False):
+    """分析單一手勢檔案（讀取失敗時拋出例外，由 _call 轉為錯誤結果）"""
+    gesture_data = GestureData.load(filepath)
+    analysis = GestureAnalyzer.analyze_gesture(gesture_data)
+    if not full:
+        analysis.pop('landmark_mean', None)
+        analysis.pop('landmark_std', None)
+    return {
+        'file': filepath,
+        'name': gesture_data.name,
+        'timestamp': gesture_data.timestamp,
+        'has_timestamps': gesture_data.timestamps is not None,
+        'checksum': landmarks_checksum(gesture_data.landmarks),
+        **analysis,
+    }
+
+
+def validate_file(filepath, min_frames=5):
+    """驗證單一手勢檔案，回傳 {'file', 'ok', 'errors'}"""
+    errors = []
+    try:
+        if filepath.endswith(GESTURE_FILE_EXTENSION):
+            header = read_header(filepath)
+            if header.get('layout') == 'records' and not header.get('complete', True):
+                errors.append("串流錄製未完成")
+        gesture_data = GestureData.load(filepath)
+    except Exception as e:
+        return {'file': filepath, 'ok': False, 'errors': [f"無法讀取: {e}"]}
+
+    landmarks = gesture_data.landmarks
+    if gesture_data.frame_count < min_frames:
+        errors.append(f"幀數不足: {gesture_data.frame_count} < {min_frames}")
+    if not np.all(np.isfinite(landmarks)):
+        errors.append("地標包含 NaN 或無限值")
+    elif len(landmarks) and (landmarks[..., :2].min() < -0.5 or landmarks[..., :2].max() > 1.5):
+        errors.append("地標 x/y 超出合理範圍")
+
+    timestamps = gesture_data.timestamps
+    if timestamps is not None:
+        if len(timestamps) != gesture_data.frame_count:
+            errors.append(f"時間戳記數量 {len(timestamps)} 與幀數 {gesture_data.frame_count} 不符")
+        elif len(timestamps) > 1 and np.any(np.diff(timestamps) < 0):
+            errors.append("時間戳記不是遞增的")
+
+    return {'file': filepath, 'ok': not errors, 'name': gesture_data.name,
+            'frame_count': gesture_data.frame_count, 'errors': errors}
+
+
+def convert_file(filepath, storage_format='binary', quantize=False, output_dir=None,
+                 overwrite=False):
+    """轉換單一手勢檔案的儲存格式（也可將串流錄製整理為一般的二進位格式）"""
+    gesture_data = GestureData.load(filepath)
+    extension = GESTURE_FILE_EXTENSION if storage_format == 'binary' else LEGACY_FILE_EXTENSION
+    base = os.path.splitext(os.path.basename(filepath))[0]
+    target = os.path.join(output_dir or os.path.dirname(filepath), base + extension)
+    if os.path.exists(target) and not overwrite:
+        return {'file': filepath, 'target': target, 'ok': False, 'error': "目標檔案已存在"}
+
+    if storage_format == 'binary':
+        header = write_gesture_file(target, gesture_data.name, gesture_data.landmarks,
+                                    gesture_data.timestamp, timestamps=gesture_data.timestamps,
+                                    quantized=quantize)
+        _, loaded, _ = read_gesture_file(target, mmap=False)
+        max_error = float(np.abs(loaded - gesture_data.landmarks).max()) if len(loaded) else 0.0
+        if max_error > header.get('max_error', 0.0) + 1e-6:
+            return {'file': filepath, 'target': target, 'ok': False,
+                    'error': f"轉換驗證失敗: 最大誤差 {max_error}"}
+    else:
+        with atomic_write(target, 'w', encoding='utf-8') as f:
+            json.dump(gesture_data.to_dict(), f, ensure_ascii=False, indent=2)
+        max_error = 0.0
+
+    return {'file': filepath, 'target': target, 'ok': True, 'frame_count': gesture_data.frame_count,
+            'source_bytes': os.path.getsize(filepath), 'target_bytes': os.path.getsize(target),
+            'max_error': max_error}
+
+
+def feature_file(filepath, length=GESTURE_FEATURE_LENGTH):
+    """載入並計算單一手勢的正規化特徵向量，回傳 (檔案, 名稱, 特徵或 None, 錯誤)"""
+    try:
+        gesture_data = GestureData.load(filepath)
+        if gesture_data.frame_count == 0:
+            return filepath, gesture_data.name, None, "沒有任何幀"
+        features = sequence_features(gesture_data.landmarks, length,
+                                     timestamps=gesture_data.timestamps)
+        return filepath, gesture_data.name, features.ravel(), None
+    except Exception as e:
+        return filepath, None, None, str(e)
+
+
+# ===== 主行程 =====
+
+def _run(args, func, files, **kwargs):
+    """以行程池依輸入順序產生每個檔案的結果"""
+    tasks = [(func, filepath, kwargs) for filepath in files]
+    if args.jobs == 1:
+        yield from map(_call, tasks)
+        return
+    workers = args.jobs or os.cpu_count() or 1
+    chunksize = min(64, max(1, len(tasks) // (4 * workers)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_call, tasks, chunksize=chunksize)
+
+
+def _call(task):
+    """在工作行程中呼叫 func(filepath, **kwargs)，例外轉為錯誤結果"""
+    func, filepath, kwargs = task
+    try:
+        return func(filepath, **kwargs)
+    except Exception as e:
+        return {'file': filepath, 'ok': False, 'error': str(e)}
+
+
+def build_index(args, files):
+    """平行計算特徵並建立特徵索引，回傳 (索引, 失敗數)"""
+    index = GestureFeatureIndex(length=args.length)
+    failed = 0
+    for filepath, name, features, error in _run(args, feature_file, files, length=args.length):
+        if features is None:
+            _emit(args, {'file': filepath, 'ok': False, 'error': error})
+            failed += 1
+            continue
+        index.add(filepath, name, features=features)
+    return index, failed
+
+
+def _emit(args, record):
+    """輸出一行 JSON"""
+    args.output.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def command_analyze(args, files):
+    failed = 0
+    for result in _run(args, analyze_file, files, full=args.full):
+        failed += 'error' in result
+        _emit(args, result)
+    return failed
+
+
+def command_validate(args, files):
+    failed = 0
+    for result in _run(args, validate_file, files, min_frames=args.min_frames):
+        failed += not result['ok']
+        _emit(args, result)
+    return failed
+
+
+def command_convert(args, files):
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    failed = 0
+    for result in _run(args, convert_file, files, storage_format=args.format,
+                       quantize=args.quantize, output_dir=args.output_dir,
+                       overwrite=args.overwrite):
+        failed += not result['ok']
+        _emit(args, result)
+    return failed
+
+
+def command_dedupe(args, files):
+    index, failed = build_index(args, files)
+    names = dict(zip(index.keys, index.names))
+    for key1, key2, distance in index.close_pairs(args.threshold):
+        _emit(args, {'type': 'duplicate', 'files': [key1, key2],
+                     'names': [names[key1], names[key2]], 'distance': distance})
+    return failed
+
+
+def command_compare(args, files):
+    """每個手勢在參考手勢庫（預設為自身）中最接近的 k 個手勢，並標示容易混淆者"""
+    index, failed = build_index(args, files)
+    if args.against:
+        reference, reference_failed = build_index(args, list(iter_gesture_files(args.against)))
+        failed += reference_failed
+    else:
+        reference = index
+    if not len(reference):
+        return failed
+
+    k = min(args.k, len(reference))
+    for start, block in _query_blocks(index, reference):
+        for offset, distances in enumerate(block):
+            row = start + offset
+            key, name = index.keys[row], index.names[row]
+            if reference is index:
+                distances[row] = np.inf  # 排除自己
+            nearest = np.argpartition(distances, k - 1)[:k]
+            nearest = nearest[np.argsort(distances[nearest])]
+            matches = [{'file': reference.keys[i], 'name': reference.names[i],
+                        'distance': float(distances[i])}
+                       for i in nearest if np.isfinite(distances[i])]
+            confusable = [match for match in matches
+                          if match['name'] != name and match['distance'] < args.threshold]
+            _emit(args, {'file': key, 'name': name, 'nearest': matches,
+                         'confusable': bool(confusable)})
+    return failed
+
+
+def _query_blocks(index, reference):
+    """以固定元素數的區塊計算 index 中所有手勢對 reference 的距離"""
+    if reference is index:
+        yield from index.distance_blocks()
+        return
+    rows = max(1, GESTURE_SIMILARITY_BLOCK_ELEMENTS // max(len(reference), 1))
+    for start in range(0, len(index), rows):
+        yield start, reference.distances(index.matrix[start:start + rows])
+
+
+COMMANDS = {
+    'analyze': command_analyze,
+    'validate': command_validate,
+    'convert': command_convert,
+    'dedupe': command_dedupe,
+    'compare': command_compare,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="手勢庫離線批次工具（JSON lines 輸出）")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('paths', nargs='*', default=['gestures'],
+                        help='手勢檔案或目錄（預設: gestures）')
+    common.add_argument('--jobs', '-j', type=int, default=None,
+                        help='工作行程數（預設: CPU 核心數，1 表示不使用行程池）')
+    common.add_argument('--output', '-o', type=argparse.FileType('w', encoding='utf-8'),
+                        default=sys.stdout, help='輸出檔案（預設: 標準輸出）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    analyze = subparsers.add_parser('analyze', parents=[common], help='分析每個手勢')
+    analyze.add_argument('--full', action='store_true', help='包含每個地標的平均值與標準差')
+
+    validate = subparsers.add_parser('validate', parents=[common], help='驗證手勢檔案')
+    validate.add_argument('--min-frames', type=int, default=5, help='最少幀數（預設: 5）')
+
+    convert = subparsers.add_parser('convert', parents=[common], help='轉換儲存格式')
+    convert.add_argument('--format', choices=('binary', 'json'), default='binary')
+    convert.add_argument('--quantize', action='store_true', help='以 int16 量化儲存')
+    convert.add_argument('--output-dir', help='輸出目錄（預設: 與原檔相同）')
+    convert.add_argument('--overwrite', action='store_true', help='覆寫已存在的目標檔案')
+
+    for name, help_text, threshold in (('dedupe', '找出近似重複的錄製', 1e-3),
+                                       ('compare', '列出最相似與容易混淆的手勢',
+                                        GESTURE_MATCH_THRESHOLD)):
+        subparser = subparsers.add_parser(name, parents=[common], help=help_text)
+        subparser.add_argument('--threshold', type=float, default=threshold,
+                               help=f'平均每幀平方距離閾值（預設: {threshold}）')
+        subparser.add_argument('--length', type=int, default=GESTURE_FEATURE_LENGTH,
+                               help='特徵重新取樣幀數')
+        if name == 'compare':
+            subparser.add_argument('--against', nargs='+', help='參考手勢庫（預設: 與自身比較）')
+            subparser.add_argument('--k', type=int, default=3, help='列出最接近的手勢數量')
+    args = parser.parse_args()
+
+    files = list(iter_gesture_files(args.paths))
+    if not files:
+        print("[手勢庫] 找不到手勢檔案", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    failed = COMMANDS[args.command](args, files)
+    elapsed = time.perf_counter() - start
+    args.output.flush()
+    print(f"[手勢庫] {args.command}: {len(files)} 個檔案（失敗 {failed}），"
+          f"耗時 {elapsed:.2f} 秒", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
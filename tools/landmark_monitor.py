@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+手部地標串流監看工具
+訂閱 Air Mouse 的地標串流（python app.py --publish-landmarks），每秒輸出接收頻率、
+丟棄幀數（依 seq 間隔計算）與目前的手勢，也可作為其他程式讀取串流的範例
+
+使用方式:
+    python -m tools.landmark_monitor [--socket 路徑] [--names 自訂姿勢 ...] [--raw]
+
+--raw 每幀輸出一行 JSON（序號、時間戳記、延遲、手勢、食指指尖座標）。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# 確保可以導入自定義模組
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.config import LANDMARK_SOCKET_PATH
+from core.landmark_publisher import LandmarkSubscriber, gesture_name
+
+INDEX_FINGER_TIP = 8
+
+
+def main():
+    parser = argparse.ArgumentParser(description="監看手部地標串流")
+    parser.add_argument('--socket', default=LANDMARK_SOCKET_PATH,
+                        help=f'地標串流通訊端路徑（預設: {LANDMARK_SOCKET_PATH}）')
+    parser.add_argument('--names', nargs='*', default=[], help='自訂姿勢名稱（用於顯示手勢編號）')
+    parser.add_argument('--raw', action='store_true', help='每幀輸出一行 JSON')
+    args = parser.parse_args()
+
+    received = dropped = 0
+    last_seq = None
+    gesture = None
+    window_start = time.monotonic()
+    with LandmarkSubscriber(args.socket) as subscriber:
+        print(f"[串流] 已訂閱 {args.socket}（Ctrl+C 結束）", file=sys.stderr)
+        try:
+            while True:
+                record = subscriber.receive(timeout=1.0)
+                now = time.monotonic()
+                if record is not None:
+                    seq = int(record['seq'])
+                    if last_seq is not None and seq > last_seq + 1:
+                        dropped += seq - last_seq - 1
+                    last_seq = seq
+                    received += 1
+                    gesture = gesture_name(int(record['gesture']), args.names)
+                    if args.raw:
+                        tip = record['landmarks'][INDEX_FINGER_TIP]
+                        print(json.dumps({
+                            'seq': seq,
+                            'timestamp': float(record['timestamp']),
+                            'latency_ms': (time.time() - float(record['timestamp'])) * 1000,
+                            'detected': bool(record['detected']),
+                            'gesture': gesture,
+                            'index_tip': [float(tip[0]), float(tip[1])],
+                        }, ensure_ascii=False), flush=True)
+
+                if now - window_start >= 1.0:
+                    if not args.raw:
+                        state = "無訊號" if not received else (gesture or "無手勢")
+                        print(f"[串流] {received / (now - window_start):5.1f} 幀/秒, "
+                              f"丟棄 {dropped} 幀, 目前: {state}", file=sys.stderr)
+                    received = dropped = 0
+                    window_start = now
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+手勢檔案批次轉換工具
+將舊版 JSON 手勢檔案轉換為 .gesture 二進位格式
+
+使用方式:
+    python -m tools.migrate_gestures [gestures 目錄或檔案 ...] [--quantize] [--remove-json]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# 確保可以導入自定義模組
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.gesture_storage import (LEGACY_FILE_EXTENSION, read_legacy_json, read_gesture_file,
+                                  write_gesture_file, migrated_path)
+
+
+def iter_legacy_files(paths):
+    """列出指定路徑中的舊版 JSON 手勢檔案"""
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if filename.endswith(LEGACY_FILE_EXTENSION):
+                    yield os.path.join(path, filename)
+        elif path.endswith(LEGACY_FILE_EXTENSION):
+            yield path
+
+
+def migrate_file(filepath, quantize=False, overwrite=False):
+    """轉換單一檔案並驗證內容，回傳統計資訊"""
+    target = migrated_path(filepath)
+    if os.path.exists(target) and not overwrite:
+        raise FileExistsError(f"目標檔案已存在: {target}")
+
+    start = time.perf_counter()
+    header, landmarks, timestamps = read_legacy_json(filepath)
+    json_load_ms = (time.perf_counter() - start) * 1000
+
+    write_gesture_file(target, header['name'], landmarks, header['timestamp'],
+                       timestamps=timestamps, quantized=quantize)
+
+    start = time.perf_counter()
+    new_header, loaded, _ = read_gesture_file(target, mmap=False)
+    binary_load_ms = (time.perf_counter() - start) * 1000
+
+    max_error = float(np.abs(loaded - landmarks).max()) if len(landmarks) else 0.0
+    if max_error > new_header.get('max_error', 0.0) + 1e-6:
+        os.remove(target)
+        raise ValueError(f"轉換驗證失敗: 最大誤差 {max_error}")
+
+    return {
+        'file': os.path.basename(filepath),
+        'target': os.path.basename(target),
+        'frames': header['frame_count'],
+        'json_bytes': os.path.getsize(filepath),
+        'binary_bytes': os.path.getsize(target),
+        'json_load_ms': json_load_ms,
+        'binary_load_ms': binary_load_ms,
+        'max_error': max_error,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="將舊版 JSON 手勢檔案轉換為二進位格式")
+    parser.add_argument('paths', nargs='*', default=['gestures'],
+                        help='手勢檔案或目錄（預設: gestures）')
+    parser.add_argument('--quantize', action='store_true', help='以 int16 量化儲存')
+    parser.add_argument('--overwrite', action='store_true', help='覆寫已存在的 .gesture 檔案')
+    parser.add_argument('--remove-json', action='store_true', help='轉換並驗證成功後刪除 JSON 檔案')
+    args = parser.parse_args()
+
+    results = []
+    failed = 0
+    for filepath in iter_legacy_files(args.paths):
+        try:
+            result = migrate_file(filepath, args.quantize, args.overwrite)
+        except Exception as e:
+            print(f"[轉換] 失敗 {filepath}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        if args.remove_json:
+            os.remove(filepath)
+        results.append(result)
+        print(f"[轉換] {result['file']} -> {result['target']}: {result['frames']} 幀, "
+              f"{result['json_bytes'] / 1024:.1f} KB -> {result['binary_bytes'] / 1024:.1f} KB, "
+              f"載入 {result['json_load_ms']:.2f} ms -> {result['binary_load_ms']:.2f} ms")
+
+    if not results:
+        print("[轉換] 找不到可轉換的 JSON 手勢檔案", file=sys.stderr)
+        return 1 if failed else 0
+
+    json_bytes = sum(r['json_bytes'] for r in results)
+    binary_bytes = sum(r['binary_bytes'] for r in results)
+    json_ms = sum(r['json_load_ms'] for r in results)
+    binary_ms = sum(r['binary_load_ms'] for r in results)
+    print()
+    print(f"總計 {len(results)} 個檔案（失敗 {failed}）")
+    print(f"檔案大小: {json_bytes / 1024:.1f} KB -> {binary_bytes / 1024:.1f} KB "
+          f"({json_bytes / max(binary_bytes, 1):.1f}x)")
+    print(f"載入時間: {json_ms:.1f} ms -> {binary_ms:.1f} ms ({json_ms / max(binary_ms, 1e-6):.1f}x)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+靜態姿勢分類器訓練工具
+以已錄製的手勢檔案訓練 kNN 姿勢分類器，手勢名稱即為姿勢名稱
+
+使用方式:
+    python -m tools.train_pose_classifier [gestures 目錄或檔案 ...] [--output 模型路徑]
+                                          [--names 名稱 ...] [--holdout 0.2]
+                                          [--flip-h] [--flip-v] [--include-motion]
+
+訓練完成後 GestureDetector 啟動時會自動載入模型（POSE_MODEL_PATH）。
+--holdout 以整段錄製為單位保留一部分做驗證，回報每個姿勢的準確率與單幀推論時間。
+只使用靜態姿勢錄製（標頭 kind 為 pose，或沒有 kind 但手形與位置幾乎不變的舊錄製），
+--include-motion 時動態手勢錄製也參與訓練。--flip-h/--flip-v 為使用時的畫面翻轉設定，
+鏡像設定不同的錄製會先鏡像。
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# 確保可以導入自定義模組
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.config import (POSE_MODEL_PATH, POSE_KNN_K, POSE_REJECT_DISTANCE,
+                         POSE_MAX_SAMPLES_PER_CLASS)
+from core.gesture_recorder import GestureData
+from core.gesture_storage import is_gesture_file
+from core.pose_classifier import PoseClassifier, build_training_set, select_pose_recordings
+
+
+def iter_gesture_files(paths):
+    """列出指定路徑中的手勢檔案"""
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if is_gesture_file(filename):
+                    yield os.path.join(path, filename)
+        elif is_gesture_file(os.path.basename(path)):
+            yield path
+
+
+def evaluate(classifier, gestures, trim_frames, orientation=None):
+    """逐幀評估，回傳 {姿勢: (正確幀數, 總幀數)} 與單幀平均推論時間（毫秒）"""
+    features, labels = build_training_set(gestures, trim_frames=trim_frames, orientation=orientation)
+    results = {}
+    for name in sorted(set(labels.tolist())):
+        mask = labels == name
+        predictions = [pose for pose, _ in classifier.predict(features[mask])]
+        results[name] = (sum(pose == name for pose in predictions), int(mask.sum()))
+
+    # 單幀推論時間（與 GestureDetector 中的呼叫方式相同）
+    sample = features[:min(len(features), 200)]
+    start = time.perf_counter()
+    for row in sample:
+        classifier.predict(row)
+    per_frame_ms = (time.perf_counter() - start) * 1000 / max(len(sample), 1)
+    return results, per_frame_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以錄製的手勢訓練靜態姿勢分類器")
+    parser.add_argument('paths', nargs='*', default=['gestures'],
+                        help='手勢檔案或目錄（預設: gestures）')
+    parser.add_argument('--output', '-o', default=POSE_MODEL_PATH,
+                        help=f'模型輸出路徑（預設: {POSE_MODEL_PATH}）')
+    parser.add_argument('--names', nargs='+', help='只使用這些手勢名稱')
+    parser.add_argument('--k', type=int, default=POSE_KNN_K, help='最近鄰數量')
+    parser.add_argument('--reject-distance', type=float, default=POSE_REJECT_DISTANCE,
+                        help='最近鄰距離超過此值視為未知姿勢')
+    parser.add_argument('--max-samples', type=int, default=POSE_MAX_SAMPLES_PER_CLASS,
+                        help='每個姿勢保留的樣本數上限')
+    parser.add_argument('--trim', type=int, default=3, help='每段錄製去掉頭尾的幀數')
+    parser.add_argument('--holdout', type=float, default=0.2,
+                        help='保留做驗證的錄製比例（0 表示不驗證）')
+    parser.add_argument('--flip-h', action='store_true', help='使用時畫面水平翻轉')
+    parser.add_argument('--flip-v', action='store_true', help='使用時畫面垂直翻轉')
+    parser.add_argument('--include-motion', action='store_true',
+                        help='動態手勢錄製也參與訓練')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    orientation = {'flip_h': args.flip_h, 'flip_v': args.flip_v}
+
+    gestures = []
+    for filepath in iter_gesture_files(args.paths):
+        try:
+            gesture_data = GestureData.load(filepath)
+        except Exception as e:
+            print(f"[姿勢] 無法載入 {filepath}: {e}", file=sys.stderr)
+            continue
+        if args.names and gesture_data.name not in args.names:
+            continue
+        gestures.append(gesture_data)
+    if not args.include_motion:
+        static = select_pose_recordings(gestures)
+        if len(static) < len(gestures):
+            print(f"[姿勢] 略過 {len(gestures) - len(static)} 段動態手勢錄製", file=sys.stderr)
+        gestures = static
+
+    names = sorted({gesture_data.name for gesture_data in gestures})
+    if not names:
+        print("[姿勢] 找不到可用的手勢錄製", file=sys.stderr)
+        return 1
+    print(f"[姿勢] {len(gestures)} 段錄製，{len(names)} 個姿勢: {', '.join(names)}")
+
+    # 以整段錄製為單位切分驗證集（同一段錄製的相鄰幀幾乎相同，逐幀切分會高估準確率）
+    train, validation = gestures, []
+    if args.holdout > 0:
+        rng = np.random.default_rng(args.seed)
+        train, validation = [], []
+        for name in names:
+            recordings = [g for g in gestures if g.name == name]
+            order = rng.permutation(len(recordings))
+            held = int(len(recordings) * args.holdout) if len(recordings) > 1 else 0
+            validation.extend(recordings[i] for i in order[:held])
+            train.extend(recordings[i] for i in order[held:])
+
+    features, labels = build_training_set(train, trim_frames=args.trim, orientation=orientation)
+    classifier = PoseClassifier(k=args.k, reject_distance=args.reject_distance)
+    classifier.fit(features, labels, max_samples_per_class=args.max_samples, seed=args.seed)
+    print(f"[姿勢] 訓練樣本 {len(features)} 幀，保留 {len(classifier)} 幀")
+
+    if validation:
+        results, per_frame_ms = evaluate(classifier, validation, args.trim, orientation)
+        print()
+        for name, (correct, total) in results.items():
+            print(f"  {name:<16} {correct}/{total} ({correct / max(total, 1):.1%})")
+        correct = sum(c for c, _ in results.values())
+        total = sum(t for _, t in results.values())
+        print(f"驗證準確率: {correct / max(total, 1):.1%}，單幀推論 {per_frame_ms:.3f} ms")
+
+        # 以全部錄製重新訓練後輸出
+        features, labels = build_training_set(gestures, trim_frames=args.trim,
+                                              orientation=orientation)
+        classifier.fit(features, labels, max_samples_per_class=args.max_samples, seed=args.seed)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    classifier.save(args.output)
+    print(f"[姿勢] 模型已儲存: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
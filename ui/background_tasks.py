@@ -0,0 +1,72 @@
+"""
+背景工作執行模組
+"""
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundTaskRunner:
+    """在背景執行緒執行檔案 I/O 與分析，並在 Tk 主執行緒回呼
+
+    工作依提交順序在單一工作執行緒中執行（手勢庫的寫入不會互相交錯），
+    完成結果放入佇列，由 Tk 的 after 計時器取出後呼叫 on_done / on_error，
+    因此回呼中可以直接操作 Tk 元件。
+    """
+
+    def __init__(self, root, poll_interval=50, max_workers=1):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='background-task')
+        self._results = queue.SimpleQueue()
+        self._pending = 0
+        self._after_id = None
+        self._closed = False
+
+    @property
+    def pending(self):
+        """尚未回呼的工作數量"""
+        return self._pending
+
+    def submit(self, func, *args, on_done=None, on_error=None, **kwargs):
+        """提交背景工作（在 Tk 執行緒呼叫）"""
+        if self._closed:
+            raise RuntimeError("背景工作執行器已關閉")
+        future = self._executor.submit(func, *args, **kwargs)
+        self._pending += 1
+        future.add_done_callback(lambda f: self._results.put((f, on_done, on_error)))
+        if self._after_id is None:
+            self._after_id = self.root.after(self.poll_interval, self._poll)
+        return future
+
+    def _poll(self):
+        """在 Tk 執行緒取出完成的工作並呼叫回呼"""
+        self._after_id = None
+        while True:
+            try:
+                future, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            try:
+                error = future.exception()
+                if error is None:
+                    if on_done is not None:
+                        on_done(future.result())
+                elif on_error is not None:
+                    on_error(error)
+                else:
+                    print(f"[UI] 背景工作失敗: {error}")
+            except Exception as e:
+                print(f"[UI] 背景工作回呼錯誤: {e}")
+
+        if self._pending > 0 and not self._closed:
+            self._after_id = self.root.after(self.poll_interval, self._poll)
+
+    def shutdown(self, wait=True):
+        """停止接受新工作並等待進行中的工作（例如儲存）完成"""
+        self._closed = True
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._executor.shutdown(wait=wait)
@@ -7,20 +7,26 @@ import threading
 import time
 import cv2
 import numpy as np
-from PIL import Image, ImageTk
 import mediapipe as mp
 
 from core.air_mouse import AirMouse
 from core.gesture_recorder import GestureRecorder, GestureData, GestureAnalyzer
+from core.pose_classifier import (PoseClassifier, build_training_set, select_pose_recordings,
+                                  POSE_KIND, MOTION_KIND)
 from core.config import (
     UI_WINDOW_SIZE, UI_BG_COLOR, VIDEO_DISPLAY_SIZE,
-    CAMERA_AREA_RATIO, CAMERA_VERTICAL_OFFSET
+    CAMERA_AREA_RATIO, CAMERA_VERTICAL_OFFSET,
+    DEFAULT_PREVIEW_FPS, MIN_PREVIEW_FPS, MAX_PREVIEW_FPS, POSE_MODEL_PATH,
+    INFERENCE_WORKER_ENABLED, VIDEO_THREAD_JOIN_TIMEOUT
 )
+from utils.image_processing import ImageProcessor
+from utils.frame_buffers import FrameBufferPool
+from utils.overlay import HandsOnlyRenderer
+from .video_presenter import VideoPresenter
+from .background_tasks import BackgroundTaskRunner
 
-# MediaPipe 繪圖工具
+# MediaPipe 手部地標定義
 mp_hands = mp.solutions.hands
-mp_drawing = mp.solutions.drawing_utils
-mp_drawing_styles = mp.solutions.drawing_styles
 
 
 class AirMouseUI:
@@ -39,24 +45,44 @@ class AirMouseUI:
         self.style.configure('TButton', padding=6)
         self.style.configure('TFrame', background=UI_BG_COLOR)
           # 初始化Air Mouse實例
-        self.air_mouse = AirMouse()
+        self.air_mouse = AirMouse(use_inference_worker=INFERENCE_WORKER_ENABLED)
         self.air_mouse.show_preview = True  # 強制啟用預覽以在UI中顯示
         
-        # 初始化手勢錄入器
-        self.gesture_recorder = GestureRecorder()
+        # 初始化手勢錄入器（手勢庫目錄在背景執行緒同步）
+        self.gesture_recorder = GestureRecorder(sync_catalog=False)
+        
+        # 手勢檔案 I/O 與分析在背景執行緒執行，完成後回到 Tk 執行緒更新介面
+        self.background_tasks = BackgroundTaskRunner(self.root)
         
         # 控制變數
         self.is_running = False
         self.video_thread = None
         
+        # UI 執行緒專用的影格緩衝區池（與 AirMouse 的池分開，避免互相覆寫）
+        self.frame_buffers = FrameBufferPool()
+        
+        # 由工作執行緒寫入、在呈現器計時器中套用到 Tk 的狀態文字
+        self._pending_gesture_text = "手勢: 無"
+        self._pending_recording_text = None
+        self._recording_timed_out = False
+        self._recorded_bus = None  # 最近一次錄入的匯流排與影格序號（避免同一影格錄兩次）
+        self._recorded_seq = None
+        
         # 建立UI
         self.create_widgets()
         
         # 更新鍵盤狀態顯示
         self.update_keyboard_status()
         
+        # 套用預設參數（與 air_mouse.py 中一致）；啟動前可再以 set_initial_settings 覆寫（例如命令列參數）
+        self.set_initial_settings()
+        
         # 綁定關閉事件
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        
+        # 視窗最小化或隱藏時停止繪製預覽
+        self.root.bind("<Unmap>", self.on_window_visibility_changed)
+        self.root.bind("<Map>", self.on_window_visibility_changed)
     
     def create_widgets(self):
         """建立 UI 元件"""
@@ -102,6 +128,10 @@ class AirMouseUI:
             command=self.toggle_display_mode
         )
         self.display_mode_button.pack(fill=tk.X, pady=5)
+        
+        # 匯出每幀追蹤記錄
+        self.dump_trace_button = ttk.Button(parent, text="匯出追蹤記錄", command=self.dump_trace)
+        self.dump_trace_button.pack(fill=tk.X, pady=5)
     
     def _create_gesture_recording(self, parent):
         """建立手勢錄入介面"""
@@ -114,6 +144,11 @@ class AirMouseUI:
         self.gesture_name_entry = ttk.Entry(recording_frame, textvariable=self.gesture_name_var)
         self.gesture_name_entry.pack(fill=tk.X, pady=2)
         
+        # 靜態姿勢錄製才會用於訓練姿勢分類器，動態手勢只作為比對範本
+        self.record_pose_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(recording_frame, text="靜態姿勢（用於姿勢訓練）",
+                        variable=self.record_pose_var).pack(anchor=tk.W)
+        
         # 錄入控制按鈕
         button_frame = ttk.Frame(recording_frame)
         button_frame.pack(fill=tk.X, pady=5)
@@ -134,6 +169,14 @@ class AirMouseUI:
         # 已儲存手勢列表
         ttk.Label(recording_frame, text="已儲存手勢:").pack(pady=(10, 0))
         
+        # 手勢名稱篩選（由手勢庫目錄提供，不需開啟檔案）
+        filter_frame = ttk.Frame(recording_frame)
+        filter_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(filter_frame, text="篩選:").pack(side=tk.LEFT, padx=(0, 5))
+        self.gesture_filter_var = tk.StringVar(value="")
+        self.gesture_filter_var.trace_add('write', lambda *_: self.update_gesture_list())
+        ttk.Entry(filter_frame, textvariable=self.gesture_filter_var).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
         # 手勢列表框架
         list_frame = ttk.Frame(recording_frame)
         list_frame.pack(fill=tk.X, pady=2)
@@ -154,7 +197,10 @@ class AirMouseUI:
         self.delete_gesture_button.pack(side=tk.LEFT, padx=(0, 5))
         
         self.analyze_gesture_button = ttk.Button(manage_frame, text="分析", command=self.analyze_selected_gesture)
-        self.analyze_gesture_button.pack(side=tk.LEFT)
+        self.analyze_gesture_button.pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.train_pose_button = ttk.Button(manage_frame, text="訓練姿勢", command=self.train_pose_classifier)
+        self.train_pose_button.pack(side=tk.LEFT)
         
         # 初始化手勢列表
         self.refresh_gesture_list()
@@ -173,6 +219,16 @@ class AirMouseUI:
         self.fps_label = ttk.Label(perf_frame, text="50 FPS")
         self.fps_label.pack()
         
+        # 預覽頻率滑桿（獨立於處理頻率）
+        ttk.Label(perf_frame, text="預覽頻率 (FPS):").pack()
+        self.preview_fps_var = tk.IntVar(value=DEFAULT_PREVIEW_FPS)
+        self.preview_fps_scale = ttk.Scale(perf_frame, from_=MIN_PREVIEW_FPS, to=MAX_PREVIEW_FPS,
+                                           variable=self.preview_fps_var, orient=tk.HORIZONTAL,
+                                           command=self.update_preview_fps)
+        self.preview_fps_scale.pack(fill=tk.X, pady=5)
+        self.preview_fps_label = ttk.Label(perf_frame, text=f"{DEFAULT_PREVIEW_FPS} FPS")
+        self.preview_fps_label.pack()
+        
         # 抖動過濾設定
         self.jitter_filter_enabled = tk.BooleanVar(value=True)
         self.jitter_filter_button = ttk.Checkbutton(
@@ -221,6 +277,15 @@ class AirMouseUI:
         
         self.gesture_label = ttk.Label(status_frame, text="手勢: 無")
         self.gesture_label.pack()
+        
+        self.latency_label = ttk.Label(status_frame, text="點擊延遲: --")
+        self.latency_label.pack()
+        
+        self.inference_label = ttk.Label(status_frame, text="")
+        self.inference_label.pack()
+        
+        self.frame_bus_label = ttk.Label(status_frame, text="")
+        self.frame_bus_label.pack()
     
     def _create_gesture_help(self, parent):
         """建立手勢說明介面"""
@@ -230,6 +295,10 @@ class AirMouseUI:
         gestures_text = """
 • 食指移動：控制滑鼠移動
 • 空白鍵：左鍵點擊
+• 拇指+食指捏合：左鍵點擊（在開始捏合的位置）
+• 食指+中指：左鍵點擊
+• 食指+中指+無名指：右鍵點擊
+• 食指+小指（維持片刻）：拖曳
 
 注意：
 - 保持食指在綠色框內
@@ -245,6 +314,18 @@ class AirMouseUI:
         
         self.video_label = ttk.Label(video_frame, text="攝像頭未啟動", anchor=tk.CENTER)
         self.video_label.pack(fill=tk.BOTH, expand=True)
+        
+        # 只顯示手部位置模式的渲染器（直接以顯示尺寸繪製）
+        self.hands_only_renderer = HandsOnlyRenderer(
+            mp_hands.HAND_CONNECTIONS, VIDEO_DISPLAY_SIZE,
+            CAMERA_AREA_RATIO, CAMERA_VERTICAL_OFFSET
+        )
+        
+        # 影像呈現器：單一 after 計時器輪詢最新影格並更新狀態標籤
+        self.video_presenter = VideoPresenter(
+            self.root, self.video_label, VIDEO_DISPLAY_SIZE,
+            on_tick=self._refresh_status_labels
+        )
     
     def update_fps(self, value):
         """更新 FPS 設定"""
@@ -253,6 +334,21 @@ class AirMouseUI:
         if hasattr(self.air_mouse, 'frame_process_interval'):
             self.air_mouse.frame_process_interval = int(1000 / fps)
     
+    def update_preview_fps(self, value):
+        """更新預覽頻率設定"""
+        fps = int(float(value))
+        self.preview_fps_label.config(text=f"{fps} FPS")
+        self.air_mouse.set_preview_fps(fps)
+    
+    def on_window_visibility_changed(self, event):
+        """視窗顯示狀態改變時切換預覽繪製"""
+        if event.widget is not self.root:
+            return
+        visible = event.type == tk.EventType.Map and self.root.state() != 'iconic'
+        if self.air_mouse.preview_visible != visible:
+            self.air_mouse.preview_visible = visible
+            print(f"[UI] 預覽繪製: {'恢復' if visible else '暫停（視窗已隱藏）'}")
+    
     def test_click(self):
         """測試點擊功能"""
         try:
@@ -264,8 +360,16 @@ class AirMouseUI:
         except Exception as e:
             print(f"[UI TEST] 測試點擊失敗: {e}")
     
+    def dump_trace(self):
+        """匯出每幀追蹤記錄"""
+        path = self.air_mouse.dump_trace()
+        if path:
+            print(f"[UI] 追蹤記錄已匯出: {path}")
+    
     def toggle_display_mode(self):
         """切換顯示模式：完整畫面 或 只顯示手部位置"""
+        # 只顯示手部時不需要在攝像頭畫面上繪製疊加圖層
+        self.air_mouse.draw_camera_overlays = not self.show_hands_only.get()
         if self.show_hands_only.get():
             print("[UI] 切換到只顯示手部位置模式")
         else:
@@ -280,10 +384,16 @@ class AirMouseUI:
     
     def start_tracking(self):
         """開始追蹤"""
+        # 上一次停止後仍在處理最後一幀的執行緒必須先結束，避免兩個迴圈同時讀取攝影機
+        if not self._join_video_thread():
+            print("[UI] 視頻執行緒尚未結束，請稍後再啟動")
+            return
         self.is_running = True
         self.start_button.config(text="停止")
         self.status_label.config(text="運行中...")
-          # 啟動視頻處理執行緒
+        self.video_presenter.start()
+        
+        # 啟動視頻處理執行緒
         self.video_thread = threading.Thread(target=self.video_loop, daemon=True)
         self.video_thread.start()
     
@@ -292,82 +402,164 @@ class AirMouseUI:
         self.is_running = False
         self.start_button.config(text="啟動")
         self.status_label.config(text="已停止")
-        self.video_label.config(image='', text="攝像頭未啟動")
+        self.video_presenter.stop("攝像頭未啟動")
+        self._pending_gesture_text = "手勢: 無"
         self.gesture_label.config(text="手勢: 無")
     
+    def _join_video_thread(self, timeout=VIDEO_THREAD_JOIN_TIMEOUT):
+        """要求視頻執行緒停止並等待結束，回傳是否已結束"""
+        self.is_running = False
+        thread = self.video_thread
+        if thread is None or thread is threading.current_thread():
+            return True
+        thread.join(timeout)
+        if thread.is_alive():
+            return False
+        self.video_thread = None
+        return True
+    
     def video_loop(self):
         """視頻處理主循環"""
         try:
             while self.is_running and self.air_mouse.cap.isOpened():
-                success, frame = self.air_mouse.cap.read()
+                success, frame = self.air_mouse.read_frame()
                 if not success:
                     break
                 
                 # 處理一幀影像
-                processed_frame, gesture = self.air_mouse.process_frame(frame)
+                processed_frame, gesture = self.air_mouse.process_frame(
+                    frame, self.air_mouse.capture_timestamp)
                 
                 # 手勢錄入處理
                 if self.gesture_recorder.recording:
-                    # 轉換為RGB格式供MediaPipe使用
-                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    hand_detected, landmarks = self.gesture_recorder.process_frame(rgb_frame)
+                    self._record_frame(frame)
                     
                     # 更新錄入狀態
                     status = self.gesture_recorder.get_recording_status()
-                    status_text = f"錄製中: {status['gesture_name']} ({status['frame_count']} 幀, {status['remaining_time']:.1f}s)"
-                    self.root.after(0, lambda text=status_text: self.recording_status_label.config(text=text))
+                    self._pending_recording_text = f"錄製中: {status['gesture_name']} ({status['frame_count']} 幀, {status['elapsed_time']:.1f}s)"
                     
-                    # 檢查是否錄製超時
-                    if status['remaining_time'] <= 0:
-                        self.root.after(0, self.stop_gesture_recording)
+                    # 檢查是否錄製超時（由呈現器計時器在 Tk 執行緒停止錄製；未設定上限時不會超時）
+                    if status['remaining_time'] is not None and status['remaining_time'] <= 0:
+                        self._recording_timed_out = True
+                
+                # 更新手勢顯示（由呈現器計時器套用）
+                self._pending_gesture_text = f"手勢: {gesture if gesture else '無'}"
+                template_match = self.air_mouse.template_match
+                if template_match:
+                    self._pending_gesture_text += f" | 範本: {template_match[0]} ({template_match[1]:.2f})"
+                
+                # 非預覽影格（或視窗已隱藏）不做任何繪製與顯示轉換
+                if not self.air_mouse.preview_rendered:
+                    continue
                 
-                # 根據顯示模式處理影像
-                if self.show_hands_only.get():
-                    # 只顯示手部位置模式：創建黑色背景並只繪製手部
-                    display_frame = self.create_hands_only_frame(frame)
-                else:
-                    # 完整畫面模式
-                    display_frame = processed_frame
+                # 根據顯示模式處理影像（讀取 AirMouse 的鏡像旗標，工作執行緒不呼叫任何 Tk 方法）
+                if not self.air_mouse.draw_camera_overlays:
+                    # 只顯示手部位置模式：直接在顯示尺寸的畫布上繪製，不經過縮放與轉色
+                    self.video_presenter.submit_rendered(self.render_hands_only_frame)
+                    continue
+                
+                # 完整畫面模式
+                display_frame = processed_frame
                 
                 # 在錄製時在畫面上顯示錄製狀態
                 if self.gesture_recorder.recording:
-                    cv2.putText(display_frame, "RECORDING", (10, 30), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                    cv2.circle(display_frame, (30, 60), 10, (0, 0, 255), -1)  # 紅色錄製指示燈
-                
-                # 更新手勢顯示
-                gesture_text = f"手勢: {gesture if gesture else '無'}"
-                self.root.after(0, lambda text=gesture_text: self.gesture_label.config(text=text))
+                    ImageProcessor.draw_recording_indicator(display_frame)
                 
                 # 更新UI中的影像
                 self.update_video_display(display_frame)
                 
         except Exception as e:
             print(f"視頻處理錯誤: {e}")
+            self.air_mouse.dump_trace()
         finally:
-            self.is_running = False
-            self.root.after(0, lambda: self.start_button.config(text="啟動"))
-            self.root.after(0, lambda: self.status_label.config(text="已停止"))
+            # 只有迴圈自行結束（攝影機中斷或錯誤）時才通知 Tk 執行緒；
+            # 由 Tk 執行緒要求停止時它可能正在 join 此執行緒，不能再排入 Tk 呼叫
+            if self.is_running:
+                self.is_running = False
+                self.root.after(0, self._on_video_loop_ended)
+    
+    def _on_video_loop_ended(self):
+        """視頻迴圈自行結束後更新介面（Tk 執行緒）"""
+        self.start_button.config(text="啟動")
+        self.status_label.config(text="已停止")
+    
+    def _record_frame(self, frame):
+        """將影格交給手勢錄入器
+
+        優先讀取影格匯流排中推論使用的同一個 RGB 影格（方向已調整、不複製，
+        每個影格只錄一次）；匯流排停用時才自行轉換原始影格。
+        """
+        if self.air_mouse.use_frame_bus:
+            # 畫面旋轉後匯流排會重建，序號從頭開始
+            bus = self.air_mouse.frame_bus
+            after_seq = self._recorded_seq if bus is not None and bus is self._recorded_bus else None
+            frame_ref = self.air_mouse.latest_frame(after_seq=after_seq)
+            if frame_ref is not None:
+                with frame_ref:
+                    self._recorded_bus, self._recorded_seq = frame_ref.bus, frame_ref.seq
+                    self.gesture_recorder.process_frame(frame_ref.array)
+        else:
+            # 與即時偵測相同方向（使用介面自己的緩衝區，不覆寫偵測中的影格），再轉換為RGB格式
+            settings = self.air_mouse.get_settings()
+            oriented = self.air_mouse.image_processor.adjust_frame_orientation(
+                frame, settings['rotation'], settings['flip_h'], settings['flip_v'],
+                buffers=self.frame_buffers
+            )
+            rgb_frame = cv2.cvtColor(oriented, cv2.COLOR_BGR2RGB,
+                                     dst=self.frame_buffers.get_like('recorder_rgb', oriented))
+            self.gesture_recorder.process_frame(rgb_frame)
     
     def update_video_display(self, frame):
-        """更新視頻顯示"""
+        """更新視頻顯示（只寫入最新影格槽，實際顯示由呈現器計時器處理）"""
         try:
-            # 將OpenCV影像轉換為tkinter可顯示的格式
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame_pil = Image.fromarray(frame_rgb)
-            
-            # 調整影像大小以適應顯示區域
-            frame_pil = frame_pil.resize(VIDEO_DISPLAY_SIZE, Image.Resampling.LANCZOS)
-            
-            # 轉換為PhotoImage
-            photo = ImageTk.PhotoImage(frame_pil)
-            
-            # 更新顯示（使用after方法確保線程安全）
-            self.root.after(0, lambda: self.video_label.config(image=photo, text=""))
-            self.root.after(0, lambda: setattr(self.video_label, 'image', photo))  # 保持引用
+            self.video_presenter.submit(frame)
         except Exception as e:
             print(f"視頻顯示錯誤: {e}")
     
+    def _refresh_status_labels(self):
+        """在 Tk 執行緒套用工作執行緒產生的狀態文字（只在內容改變時更新）"""
+        gesture_text = self._pending_gesture_text
+        if self.gesture_label.cget('text') != gesture_text:
+            self.gesture_label.config(text=gesture_text)
+        
+        latency_stats = self.air_mouse.get_click_latency_stats()
+        if latency_stats:
+            latency_text = f"點擊延遲: {latency_stats['mean']:.0f} ms (p95 {latency_stats['p95']:.0f} ms)"
+            if self.latency_label.cget('text') != latency_text:
+                self.latency_label.config(text=latency_text)
+        
+        worker = self.air_mouse.inference_worker
+        if worker is not None:
+            if worker.failed:
+                inference_text = "推論: 行程內（工作行程失敗）"
+            elif not worker.ready:
+                inference_text = "推論: 工作行程啟動中"
+            else:
+                stats = worker.get_stats()
+                inference_text = (f"推論: {stats['inference_ms']:.1f} ms "
+                                  f"(往返 {stats['roundtrip_ms']:.1f} ms)")
+            if self.inference_label.cget('text') != inference_text:
+                self.inference_label.config(text=inference_text)
+        
+        frame_bus = self.air_mouse.frame_bus
+        if frame_bus is not None:
+            stats = frame_bus.get_stats()
+            bus_text = (f"影格匯流排: 佔用 {stats['occupied']}/{stats['slots']} "
+                        f"(最高 {stats['peak']})，丟棄 {stats['dropped']} 幀")
+            if self.frame_bus_label.cget('text') != bus_text:
+                self.frame_bus_label.config(text=bus_text)
+        
+        recording_text = self._pending_recording_text
+        if recording_text is not None:
+            self._pending_recording_text = None
+            if self.gesture_recorder.recording:
+                self.recording_status_label.config(text=recording_text)
+        
+        if self._recording_timed_out:
+            self._recording_timed_out = False
+            if self.gesture_recorder.recording:
+                self.stop_gesture_recording()
+    
     def rotate_frame(self):
         """旋轉畫面"""
         self.air_mouse.frame_rotation = (self.air_mouse.frame_rotation + 90) % 360
@@ -403,7 +595,8 @@ class AirMouseUI:
         gpu_status = self.air_mouse.gpu_detector.get_status_text()
         self.gpu_label.config(text=gpu_status)
     
-    def set_initial_settings(self, rotation=0, flip_h=True, flip_v=True, fps=50, use_gpu=True):
+    def set_initial_settings(self, rotation=0, flip_h=True, flip_v=True, fps=50, use_gpu=True,
+                             preview_fps=DEFAULT_PREVIEW_FPS):
         """設定初始參數"""
         self.air_mouse.frame_rotation = rotation
         self.air_mouse.flip_horizontal = flip_h
@@ -414,6 +607,11 @@ class AirMouseUI:
         self.air_mouse.frame_process_interval = int(1000 / fps)
         self.fps_var.set(fps)
         
+        # 設定預覽頻率
+        self.air_mouse.set_preview_fps(preview_fps)
+        self.preview_fps_var.set(preview_fps)
+        self.preview_fps_label.config(text=f"{preview_fps} FPS")
+        
         # 初始化抖動過濾設定
         self.jitter_filter_enabled.set(True)
         self.jitter_threshold_var.set(15)
@@ -429,67 +627,32 @@ class AirMouseUI:
         if self.is_running:
             self.stop_tracking()
         
-        # 釋放資源
-        self.air_mouse.cleanup()
+        # 視頻執行緒可能仍在讀取攝影機或推論，必須先結束才能釋放資源
+        video_stopped = self._join_video_thread()
+        
+        # 等待進行中的儲存/刪除完成後再釋放資源
+        self.background_tasks.shutdown(wait=True)
+        if video_stopped:
+            self.air_mouse.cleanup()
+        else:
+            # 釋放仍在使用中的攝影機與模型可能導致崩潰，交由行程結束時回收
+            print("[UI] 視頻執行緒未在時限內結束，略過資源釋放")
         self.gesture_recorder.close()
         self.root.destroy()
     
     def run(self):
-        """啟動主循環"""
-        # 設定預設值（與 air_mouse.py 中一致）
-        self.set_initial_settings()
+        """啟動主循環（保留建立後已套用的參數）"""
         self.root.mainloop()
     
-    def create_hands_only_frame(self, original_frame):
-        """創建只顯示手部位置的黑色背景圖像"""
-        # 調整畫面方向
-        frame = self.air_mouse.adjust_frame_orientation(original_frame)
-        frame_h, frame_w = frame.shape[:2]
-        
-        # 創建黑色背景
-        black_frame = np.zeros((frame_h, frame_w, 3), dtype=np.uint8)
-        
-        # 處理影像並檢測手部
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.air_mouse.gesture_detector.process_frame(rgb_frame)
+    def render_hands_only_frame(self, canvas):
+        """在顯示尺寸的 RGB 畫布上繪製只顯示手部位置的畫面（使用 AirMouse 已偵測的地標）"""
+        self.hands_only_renderer.render(canvas, self.air_mouse.last_landmarks,
+                                        mp_hands.HandLandmark.INDEX_FINGER_TIP)
         
-        if results.multi_hand_landmarks:
-            # 繪製交互區域（綠色框）
-            from core.config import CAMERA_VERTICAL_OFFSET
-            margin_x = int(frame_w * (1 - CAMERA_AREA_RATIO) / 2)
-            margin_y = int(frame_h * (1 - CAMERA_AREA_RATIO) / 2)
-            
-            # 添加垂直偏移
-            offset_pixels = int(frame_h * CAMERA_VERTICAL_OFFSET)
-            top_y = margin_y + offset_pixels
-            bottom_y = frame_h - margin_y + offset_pixels
-            
-            # 確保邊界
-            top_y = max(0, top_y)
-            bottom_y = min(frame_h, bottom_y)
-            
-            cv2.rectangle(black_frame, (margin_x, top_y), 
-                         (frame_w - margin_x, bottom_y), (0, 255, 0), 2)
-            
-            # 繪製手部標記點（亮色）
-            for hand_landmarks in results.multi_hand_landmarks:
-                mp_drawing.draw_landmarks(
-                    black_frame, hand_landmarks, mp_hands.HAND_CONNECTIONS,
-                    mp_drawing_styles.get_default_hand_landmarks_style(),
-                    mp_drawing_styles.get_default_hand_connections_style())
-                
-                # 高亮食指尖端
-                index_tip = hand_landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP]
-                tip_x = int(index_tip.x * frame_w)
-                tip_y = int(index_tip.y * frame_h)
-                cv2.circle(black_frame, (tip_x, tip_y), 8, (255, 255, 0), -1)  # 黃色圓點
-        else:
-            # 沒有檢測到手部時，顯示提示文字
-            cv2.putText(black_frame, "No Hand Detected", 
-                       (frame_w//2 - 100, frame_h//2), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        
-        return black_frame
+        # 在錄製時在畫面上顯示錄製狀態（RGB 紅色）
+        if self.gesture_recorder.recording:
+            ImageProcessor.draw_recording_indicator(canvas, (255, 0, 0),
+                                                    self.hands_only_renderer.scale)
     
     def toggle_jitter_filter(self):
         """切換抖動過濾功能"""
@@ -515,7 +678,10 @@ class AirMouseUI:
             print("[UI] 請輸入手勢名稱")
             return
         
-        if self.gesture_recorder.start_recording(gesture_name):
+        settings = self.air_mouse.get_settings()
+        orientation = {key: settings[key] for key in ('rotation', 'flip_h', 'flip_v')}
+        kind = POSE_KIND if self.record_pose_var.get() else MOTION_KIND
+        if self.gesture_recorder.start_recording(gesture_name, kind=kind, orientation=orientation):
             self.record_button.config(state=tk.DISABLED)
             self.stop_record_button.config(state=tk.NORMAL)
             self.cancel_record_button.config(state=tk.NORMAL)
@@ -525,23 +691,22 @@ class AirMouseUI:
             print("[UI] 錄製失敗，可能正在錄製中")
     
     def stop_gesture_recording(self):
-        """停止錄製手勢"""
-        gesture_data = self.gesture_recorder.stop_recording()
-        
-        self.record_button.config(state=tk.NORMAL)
+        """停止錄製手勢（錄製中已串流寫入檔案，在背景執行緒完成檔案並更新手勢庫）"""
+        self.record_button.config(state=tk.DISABLED)
         self.stop_record_button.config(state=tk.DISABLED)
         self.cancel_record_button.config(state=tk.DISABLED)
-        
-        if gesture_data:
-            # 儲存手勢
-            if self.gesture_recorder.save_gesture(gesture_data):
-                self.recording_status_label.config(text=f"已儲存: {gesture_data.name}")
-                self.refresh_gesture_list()
-                self.gesture_name_var.set("")  # 清空輸入欄
-                print(f"[UI] 手勢錄製並儲存成功: {gesture_data.name}")
-            else:
-                self.recording_status_label.config(text="儲存失敗")
-                print("[UI] 手勢儲存失敗")
+        self.recording_status_label.config(text=f"儲存中: {self.gesture_recorder.current_gesture_name}")
+        self.background_tasks.submit(self.gesture_recorder.stop_recording,
+                                     on_done=self._on_gesture_saved)
+    
+    def _on_gesture_saved(self, entry):
+        """手勢儲存完成（Tk 執行緒，entry 為手勢庫目錄記錄）"""
+        self.record_button.config(state=tk.NORMAL)
+        if entry:
+            self.recording_status_label.config(text=f"已儲存: {entry['name']}")
+            self.refresh_gesture_list()
+            self.gesture_name_var.set("")  # 清空輸入欄
+            print(f"[UI] 手勢錄製並儲存成功: {entry['name']}")
         else:
             self.recording_status_label.config(text="錄製失敗")
             print("[UI] 手勢錄製失敗")
@@ -557,15 +722,29 @@ class AirMouseUI:
         print("[UI] 手勢錄製已取消")
     
     def refresh_gesture_list(self):
-        """重新整理已儲存的手勢列表"""
-        saved_gestures = self.gesture_recorder.list_saved_gestures()
-        self.gesture_list_combo['values'] = saved_gestures
-        if saved_gestures:
-            self.gesture_list_combo.set(saved_gestures[0])
-        else:
-            self.gesture_list_combo.set("")
+        """重新整理已儲存的手勢列表（同步目錄與載入比對範本在背景執行緒執行）"""
+        self.background_tasks.submit(self._sync_gesture_library,
+                                     on_done=lambda _: self._on_gesture_library_synced())
+    
+    def _sync_gesture_library(self):
+        """與儲存目錄同步並重新載入即時比對範本（背景執行緒）"""
+        # 只重新讀取新增或外部修改的檔案；特徵索引隨儲存/刪除增量更新
+        self.gesture_recorder.catalog.sync()
+        self.air_mouse.load_gesture_templates(self.gesture_recorder.get_feature_index())
+    
+    def _on_gesture_library_synced(self):
+        """手勢庫同步完成（Tk 執行緒）"""
+        saved_gestures = self.update_gesture_list()
         print(f"[UI] 手勢列表已更新: {len(saved_gestures)} 個手勢")
     
+    def update_gesture_list(self):
+        """依篩選文字更新下拉選單（只讀取手勢庫目錄）"""
+        saved_gestures = self.gesture_recorder.list_saved_gestures(self.gesture_filter_var.get())
+        self.gesture_list_combo['values'] = saved_gestures
+        if self.gesture_list_var.get() not in saved_gestures:
+            self.gesture_list_combo.set(saved_gestures[0] if saved_gestures else "")
+        return saved_gestures
+    
     def delete_selected_gesture(self):
         """刪除選中的手勢"""
         selected_gesture = self.gesture_list_var.get()
@@ -578,11 +757,18 @@ class AirMouseUI:
         result = messagebox.askyesno("確認刪除", f"確定要刪除手勢 '{selected_gesture}' 嗎？")
         
         if result:
-            if self.gesture_recorder.delete_gesture(selected_gesture):
-                self.refresh_gesture_list()
-                print(f"[UI] 已刪除手勢: {selected_gesture}")
-            else:
-                print(f"[UI] 刪除手勢失敗: {selected_gesture}")
+            self.background_tasks.submit(
+                self.gesture_recorder.delete_gesture, selected_gesture,
+                on_done=lambda success: self._on_gesture_deleted(selected_gesture, success)
+            )
+    
+    def _on_gesture_deleted(self, filename, success):
+        """手勢刪除完成（Tk 執行緒）"""
+        if success:
+            self.refresh_gesture_list()
+            print(f"[UI] 已刪除手勢: {filename}")
+        else:
+            print(f"[UI] 刪除手勢失敗: {filename}")
     
     def analyze_selected_gesture(self):
         """分析選中的手勢"""
@@ -591,14 +777,34 @@ class AirMouseUI:
             print("[UI] 請選擇要分析的手勢")
             return
         
-        # 載入手勢資料
-        import os
-        filepath = os.path.join(self.gesture_recorder.save_dir, selected_gesture)
-        gesture_data = self.gesture_recorder.load_gesture(filepath)
+        self.analyze_gesture_button.config(state=tk.DISABLED)
+        self.background_tasks.submit(
+            self._analyze_gesture, selected_gesture,
+            on_done=lambda result: self._on_gesture_analyzed(selected_gesture, result),
+            on_error=lambda error: self._on_gesture_analyzed(selected_gesture, None, error)
+        )
+    
+    def _analyze_gesture(self, filename):
+        """載入並分析手勢（背景執行緒）"""
+        # 載入手勢資料（經由快取，重複分析不需重新讀檔）
+        gesture_data = self.gesture_recorder.get_gesture(filename)
+        if gesture_data is None:
+            return None
+        analysis = GestureAnalyzer.analyze_gesture(gesture_data)
+        similar = self.gesture_recorder.find_similar(gesture_data, k=3, exclude=filename)
+        return gesture_data, analysis, similar
+    
+    def _on_gesture_analyzed(self, selected_gesture, result, error=None):
+        """顯示手勢分析結果（Tk 執行緒）"""
+        self.analyze_gesture_button.config(state=tk.NORMAL)
+        if error is not None:
+            print(f"[UI] 手勢分析失敗: {error}")
+            return
         
-        if gesture_data:
-            # 分析手勢
-            analysis = GestureAnalyzer.analyze_gesture(gesture_data)
+        if result:
+            gesture_data, analysis, similar = result
+            similar_text = "\n".join(f"  {name} ({key}): {distance:.3f}"
+                                     for key, name, distance in similar) or "  無"
             
             # 顯示分析結果
             from tkinter import messagebox
@@ -606,11 +812,13 @@ class AirMouseUI:
             
 錄製時間: {gesture_data.timestamp}
 幀數: {analysis.get('frame_count', 0)}
-持續時間: {analysis.get('duration', 0):.2f} 秒
+持續時間: {analysis.get('duration', 0):.2f} 秒（{analysis.get('fps', 0):.1f} FPS）
 移動範圍:
   X軸: {analysis.get('movement_range', {}).get('x_range', 0):.3f}
   Y軸: {analysis.get('movement_range', {}).get('y_range', 0):.3f}
   Z軸: {analysis.get('movement_range', {}).get('z_range', 0):.3f}
+最相似的手勢:
+{similar_text}
             """
             
             messagebox.showinfo("手勢分析", analysis_text)
@@ -618,6 +826,46 @@ class AirMouseUI:
         else:
             print(f"[UI] 無法載入手勢: {selected_gesture}")
     
+    def train_pose_classifier(self):
+        """以所有已錄製的手勢訓練姿勢分類器（背景執行緒），完成後立即套用"""
+        self.train_pose_button.config(state=tk.DISABLED)
+        self.background_tasks.submit(
+            self._train_pose_classifier,
+            on_done=self._on_pose_classifier_trained,
+            on_error=lambda error: self._on_pose_classifier_trained(None, error)
+        )
+    
+    def _train_pose_classifier(self):
+        """載入手勢庫中的靜態姿勢錄製並訓練、儲存姿勢分類器（背景執行緒）
+
+        動態手勢範本不參與訓練；錄製的鏡像設定與目前畫面方向不同時先鏡像。
+        """
+        gestures = []
+        for filename in self.gesture_recorder.list_saved_gestures():
+            gesture_data = self.gesture_recorder.get_gesture(filename)
+            if gesture_data is not None:
+                gestures.append(gesture_data)
+        settings = self.air_mouse.get_settings()
+        orientation = {key: settings[key] for key in ('rotation', 'flip_h', 'flip_v')}
+        features, labels = build_training_set(select_pose_recordings(gestures),
+                                              orientation=orientation)
+        if not len(features):
+            return None
+        classifier = PoseClassifier().fit(features, labels)
+        classifier.save(POSE_MODEL_PATH)
+        return classifier
+    
+    def _on_pose_classifier_trained(self, classifier, error=None):
+        """套用訓練完成的姿勢分類器（Tk 執行緒）"""
+        self.train_pose_button.config(state=tk.NORMAL)
+        if error is not None:
+            print(f"[UI] 姿勢訓練失敗: {error}")
+        elif classifier is None:
+            print("[UI] 沒有可用於訓練的靜態姿勢錄製")
+        else:
+            self.air_mouse.gesture_detector.set_pose_classifier(classifier)
+            print(f"[UI] 姿勢分類器已更新: {', '.join(classifier.classes)}")
+    
 def main():
     """主程式入口點"""
     app = AirMouseUI()
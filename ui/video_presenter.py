@@ -0,0 +1,117 @@
+"""
+Tk 影像呈現模組
+"""
+import threading
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+from core.config import VIDEO_DISPLAY_SIZE, VIDEO_DISPLAY_MAX_FPS
+
+
+class VideoPresenter:
+    """低開銷的 Tk 影像呈現器
+
+    工作執行緒呼叫 submit() 以 INTER_AREA 縮放並轉色到三重緩衝區中，
+    Tk 主執行緒則由單一 after 計時器以上限頻率輪詢最新影格，
+    貼到同一個持久的 PhotoImage 上。尚未顯示就被新影格取代的影格會直接丟棄，
+    因此 Tk 事件佇列不會因渲染落後而堆積。
+    """
+
+    def __init__(self, root, label, display_size=VIDEO_DISPLAY_SIZE,
+                 max_fps=VIDEO_DISPLAY_MAX_FPS, on_tick=None):
+        self.root = root
+        self.label = label
+        self.display_size = tuple(display_size)
+        self.poll_interval = max(1, int(1000 / max_fps))
+        self.on_tick = on_tick  # 每次輪詢時在 Tk 執行緒呼叫（用於更新狀態標籤）
+
+        display_w, display_h = self.display_size
+        shape = (display_h, display_w, 3)
+        self._resized = np.empty(shape, dtype=np.uint8)  # 工作執行緒縮放暫存
+        self._back = np.empty(shape, dtype=np.uint8)     # 工作執行緒寫入
+        self._ready = np.empty(shape, dtype=np.uint8)    # 最新完成的影格
+        self._display = np.empty(shape, dtype=np.uint8)  # Tk 執行緒正在顯示
+        self._has_new_frame = False
+        self._lock = threading.Lock()
+
+        self._photo = None
+        self._after_id = None
+        self._running = False
+
+        # 統計資訊
+        self.frames_submitted = 0
+        self.frames_presented = 0
+        self.frames_dropped = 0
+
+    def submit(self, frame):
+        """提交一個 BGR 影格（在工作執行緒呼叫，不涉及任何 Tk 操作）"""
+        if frame.shape[1::-1] == self.display_size:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._back)
+        else:
+            cv2.resize(frame, self.display_size, dst=self._resized,
+                       interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=self._back)
+        self._publish()
+
+    def submit_rendered(self, render):
+        """直接在顯示尺寸的 RGB 緩衝區上繪製並提交（在工作執行緒呼叫）
+
+        render 會收到 (高, 寬, 3) 的 uint8 緩衝區，必須完整覆寫其內容。
+        """
+        render(self._back)
+        self._publish()
+
+    def _publish(self):
+        """將寫好的緩衝區交換為最新影格"""
+        with self._lock:
+            self._back, self._ready = self._ready, self._back
+            if self._has_new_frame:
+                self.frames_dropped += 1
+            self._has_new_frame = True
+            self.frames_submitted += 1
+
+    def start(self):
+        """開始輪詢（在 Tk 執行緒呼叫）"""
+        self._running = True
+        if self._after_id is None:
+            self._after_id = self.root.after(self.poll_interval, self._poll)
+
+    def stop(self, text="攝像頭未啟動"):
+        """停止輪詢並清除畫面（在 Tk 執行緒呼叫）"""
+        self._running = False
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        with self._lock:
+            self._has_new_frame = False
+        self._photo = None
+        self.label.config(image='', text=text)
+
+    def _poll(self):
+        """取出最新影格並貼到持久的 PhotoImage 上"""
+        self._after_id = None
+        try:
+            with self._lock:
+                has_new_frame = self._has_new_frame
+                if has_new_frame:
+                    self._ready, self._display = self._display, self._ready
+                    self._has_new_frame = False
+
+            if has_new_frame:
+                image = Image.frombuffer('RGB', self.display_size, self._display,
+                                         'raw', 'RGB', 0, 1)
+                if self._photo is None:
+                    self._photo = ImageTk.PhotoImage(image)
+                    self.label.config(image=self._photo, text="")
+                else:
+                    self._photo.paste(image)
+                self.frames_presented += 1
+
+            if self.on_tick is not None:
+                self.on_tick()
+        except Exception as e:
+            print(f"視頻顯示錯誤: {e}")
+        finally:
+            if self._running:
+                self._after_id = self.root.after(self.poll_interval, self._poll)
@@ -2,5 +2,8 @@
 Utils 模組初始化
 """
 from .image_processing import ImageProcessor
+from .frame_buffers import FrameBufferPool
+from .overlay import OverlayCompositor, LandmarkRenderer, HandsOnlyRenderer
 
-__all__ = ['ImageProcessor']
+__all__ = ['ImageProcessor', 'FrameBufferPool', 'OverlayCompositor', 'LandmarkRenderer',
+           'HandsOnlyRenderer']
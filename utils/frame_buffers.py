@@ -0,0 +1,47 @@
+"""
+影格緩衝區池模組
+"""
+import numpy as np
+
+
+class FrameBufferPool:
+    """預先配置的影格緩衝區池
+
+    以 (用途標籤, 形狀, 資料型別) 為鍵重複使用 numpy 陣列，
+    讓熱迴圈中的 OpenCV 呼叫可以透過 dst= 直接寫入，避免每幀重新配置記憶體。
+    同一標籤在下一次取得時會被覆寫，呼叫端若需保留內容必須自行複製。
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, tag, shape, dtype=np.uint8):
+        """取得指定標籤、形狀與型別的緩衝區（不存在時才配置）"""
+        key = (tag, tuple(shape), np.dtype(dtype))
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[key] = buffer
+        return buffer
+
+    def get_like(self, tag, frame):
+        """取得與指定影格相同形狀與型別的緩衝區"""
+        return self.get(tag, frame.shape, frame.dtype)
+
+    def zeros(self, tag, shape, dtype=np.uint8):
+        """取得已清為零的緩衝區（原地清除，不重新配置）"""
+        buffer = self.get(tag, shape, dtype)
+        buffer.fill(0)
+        return buffer
+
+    def clear(self):
+        """釋放所有緩衝區"""
+        self._buffers.clear()
+
+    @property
+    def total_bytes(self):
+        """目前池中所有緩衝區佔用的位元組數"""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def __len__(self):
+        return len(self._buffers)
@@ -9,21 +9,40 @@ class ImageProcessor:
     """圖像處理工具類"""
     
     @staticmethod
-    def adjust_frame_orientation(frame, rotation=0, flip_horizontal=False, flip_vertical=False):
-        """調整攝像頭畫面方向"""
-        # 先進行水平或垂直翻轉
-        if flip_horizontal:
-            frame = cv2.flip(frame, 1)
-        if flip_vertical:
-            frame = cv2.flip(frame, 0)
+    def adjust_frame_orientation(frame, rotation=0, flip_horizontal=False, flip_vertical=False,
+                                 buffers=None):
+        """調整攝像頭畫面方向
+
+        Args:
+            buffers: 可選的 FrameBufferPool，提供時翻轉與旋轉結果寫入池中的緩衝區
+        """
+        # 先進行水平或垂直翻轉（同時翻轉時合併為一次 flip）
+        flip_code = None
+        if flip_horizontal and flip_vertical:
+            flip_code = -1
+        elif flip_horizontal:
+            flip_code = 1
+        elif flip_vertical:
+            flip_code = 0
+        
+        if flip_code is not None:
+            dst = buffers.get_like('orientation_flip', frame) if buffers is not None else None
+            frame = cv2.flip(frame, flip_code, dst=dst)
         
         # 根據設定的角度旋轉畫面
-        if rotation == 90:
-            frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
-        elif rotation == 180:
-            frame = cv2.rotate(frame, cv2.ROTATE_180)
-        elif rotation == 270:
-            frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        rotate_code = {
+            90: cv2.ROTATE_90_CLOCKWISE,
+            180: cv2.ROTATE_180,
+            270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+        }.get(rotation)
+        
+        if rotate_code is not None:
+            dst = None
+            if buffers is not None:
+                frame_h, frame_w = frame.shape[:2]
+                rotated_shape = (frame_h, frame_w) if rotation == 180 else (frame_w, frame_h)
+                dst = buffers.get('orientation_rotate', rotated_shape + frame.shape[2:], frame.dtype)
+            frame = cv2.rotate(frame, rotate_code, dst=dst)
         
         return frame
     
@@ -68,21 +87,57 @@ class ImageProcessor:
         return adjusted_landmarks
     
     @staticmethod
-    def convert_frame_for_tkinter(frame, display_size=(480, 360)):
+    def adjust_landmark_array_for_rotation(landmarks, rotation=0, flip_horizontal=False,
+                                           flip_vertical=False):
+        """以陣列運算調整正規化地標座標（與 adjust_hand_landmarks_for_rotation 相同的對應）
+
+        Args:
+            landmarks: (..., 21, 3) 或 (..., 2/3) 的正規化座標陣列
+        """
+        adjusted = np.array(landmarks, dtype=np.float32, copy=True)
+        x = adjusted[..., 0].copy()
+        y = adjusted[..., 1].copy()
+        
+        if flip_horizontal:
+            x = 1.0 - x
+        if flip_vertical:
+            y = 1.0 - y
+        
+        if rotation == 90:
+            x, y = y, 1.0 - x
+        elif rotation == 180:
+            x, y = 1.0 - x, 1.0 - y
+        elif rotation == 270:
+            x, y = 1.0 - y, x
+        
+        adjusted[..., 0] = x
+        adjusted[..., 1] = y
+        return adjusted
+    
+    @staticmethod
+    def convert_frame_for_tkinter(frame, display_size=(480, 360), buffers=None):
         """將OpenCV影像轉換為tkinter可顯示的格式"""
-        # 將BGR轉換為RGB
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame_pil = Image.fromarray(frame_rgb)
+        display_w, display_h = display_size
+        resized_dst = rgb_dst = None
+        if buffers is not None:
+            resized_dst = buffers.get('tk_resized', (display_h, display_w, 3))
+            rgb_dst = buffers.get('tk_rgb', (display_h, display_w, 3))
         
-        # 調整影像大小以適應顯示區域
-        frame_pil = frame_pil.resize(display_size, Image.Resampling.LANCZOS)
+        # 先縮小再轉色，轉色只需處理顯示尺寸的像素
+        frame_small = cv2.resize(frame, display_size, dst=resized_dst,
+                                 interpolation=cv2.INTER_LANCZOS4)
+        frame_rgb = cv2.cvtColor(frame_small, cv2.COLOR_BGR2RGB, dst=rgb_dst)
+        
+        # frombuffer 直接共用緩衝區記憶體，PhotoImage 建立時會複製像素
+        frame_pil = Image.frombuffer('RGB', display_size, frame_rgb, 'raw', 'RGB', 0, 1)
         
         # 轉換為PhotoImage
         return ImageTk.PhotoImage(frame_pil)
     
     @staticmethod
-    def process_frame_with_gpu(frame, gpu_available=False):
+    def process_frame_with_gpu(frame, gpu_available=False, buffers=None):
         """使用GPU處理影格（如果可用）"""
+        rgb_dst = buffers.get_like('mediapipe_rgb', frame) if buffers is not None else None
         if gpu_available:
             try:
                 # 將影像上傳到 GPU
@@ -93,15 +148,15 @@ class ImageProcessor:
                 frame_processed = gpu_frame.download()
                 
                 # 將BGR轉換為RGB用於MediaPipe處理
-                rgb_frame = cv2.cvtColor(frame_processed, cv2.COLOR_BGR2RGB)
+                rgb_frame = cv2.cvtColor(frame_processed, cv2.COLOR_BGR2RGB, dst=rgb_dst)
                 return rgb_frame, True
                 
             except Exception as e:
                 print(f"GPU 處理錯誤：{e}，切換到 CPU 模式")
-                return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), False
+                return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_dst), False
         else:
             # 常規 CPU 處理
-            return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), False
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_dst), False
     
     @staticmethod
     def draw_interaction_area(frame, camera_area_ratio=0.6, vertical_offset=-0.1):
@@ -130,6 +185,13 @@ class ImageProcessor:
                      (0, 255, 0), 2)
         return margin_x, top_y, bottom_y
     
+    @staticmethod
+    def draw_recording_indicator(frame, color=(0, 0, 255), scale=1.0):
+        """在影像上繪製錄製中指示（預設為 BGR 紅色）"""
+        cv2.putText(frame, "RECORDING", (round(10 * scale), round(30 * scale)),
+                    cv2.FONT_HERSHEY_SIMPLEX, scale, color, max(1, round(2 * scale)))
+        cv2.circle(frame, (round(30 * scale), round(60 * scale)), round(10 * scale), color, -1)
+    
     @staticmethod
     def draw_info_text(frame, fps, rotation, flip_h, flip_v, gesture=None):
         """在影像上繪製信息文字"""
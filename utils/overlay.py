@@ -0,0 +1,131 @@
+"""
+疊加圖層合成模組
+"""
+import cv2
+import numpy as np
+
+from .image_processing import ImageProcessor
+
+
+class OverlayCompositor:
+    """疊加圖層合成器
+
+    交互區域框線、FPS 與方向文字在內容不變時完全相同，
+    因此預先繪製到靜態圖層，每幀只需一次遮罩複製。
+    只有影格尺寸、方向、區域比例或 FPS 文字改變時才重新繪製。
+    """
+
+    def __init__(self):
+        self._layer = None
+        self._mask = None
+        self._key = None
+        self.rebuild_count = 0
+
+    def draw_static(self, frame, camera_area_ratio, vertical_offset,
+                    fps, rotation, flip_h, flip_v):
+        """將靜態圖層合成到影像上"""
+        key = (frame.shape, camera_area_ratio, vertical_offset, fps, rotation, flip_h, flip_v)
+        if key != self._key:
+            self._rebuild(frame.shape, key)
+        cv2.copyTo(self._layer, self._mask, frame)
+
+    def invalidate(self):
+        """強制下次合成時重新繪製靜態圖層"""
+        self._key = None
+
+    def _rebuild(self, shape, key):
+        """重新繪製靜態圖層與遮罩"""
+        _, camera_area_ratio, vertical_offset, fps, rotation, flip_h, flip_v = key
+        if self._layer is None or self._layer.shape != shape:
+            self._layer = np.empty(shape, dtype=np.uint8)
+            self._mask = np.empty(shape[:2], dtype=np.uint8)
+        self._layer.fill(0)
+        ImageProcessor.draw_interaction_area(self._layer, camera_area_ratio, vertical_offset)
+        ImageProcessor.draw_info_text(self._layer, fps, rotation, flip_h, flip_v)
+        np.any(self._layer, axis=2, out=self._mask.view(bool))
+        self._key = key
+        self.rebuild_count += 1
+
+    @staticmethod
+    def draw_gesture(frame, gesture):
+        """繪製目前手勢文字（動態內容，不快取）"""
+        if gesture:
+            cv2.putText(frame, f"Gesture: {gesture}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+
+
+class LandmarkRenderer:
+    """批次手部地標繪製器
+
+    連線索引在建構時轉為陣列，繪製時以一次 cv2.polylines 畫出所有連線，
+    關節點則以長度為零的線段（圓形端點）在另一次呼叫中一併畫出。
+    """
+
+    def __init__(self, connections, connection_color=(224, 224, 224), joint_color=(48, 48, 255),
+                 connection_thickness=2, joint_radius=4):
+        self.connections = np.array(sorted(tuple(c) for c in connections), dtype=np.intp)
+        joint_count = int(self.connections.max()) + 1
+        self.joint_index = np.repeat(np.arange(joint_count, dtype=np.intp), 2).reshape(-1, 2)
+        self.connection_color = connection_color
+        self.joint_color = joint_color
+        self.connection_thickness = connection_thickness
+        self.joint_thickness = joint_radius * 2
+
+    @staticmethod
+    def to_pixels(landmarks, frame_shape):
+        """將正規化地標座標 (N, 2 或 3) 轉為像素座標 (N, 2) int32"""
+        frame_h, frame_w = frame_shape[:2]
+        return (landmarks[:, :2] * (frame_w, frame_h)).astype(np.int32)
+
+    def draw(self, frame, landmarks):
+        """在影像上繪製一隻手的連線與關節點（landmarks 為正規化座標陣列）"""
+        points = self.to_pixels(landmarks, frame.shape)
+        cv2.polylines(frame, points[self.connections], False, self.connection_color,
+                      self.connection_thickness, cv2.LINE_AA)
+        cv2.polylines(frame, points[self.joint_index], False, self.joint_color,
+                      self.joint_thickness, cv2.LINE_AA)
+        return points
+
+
+class HandsOnlyRenderer:
+    """只顯示手部位置的渲染器
+
+    直接以正規化地標座標在顯示尺寸的 RGB 畫布上繪製向量圖形，
+    不需要攝像頭解析度的緩衝區、縮放或色彩轉換。
+    顏色以 RGB 順序指定，輸出可直接交給 Tk 顯示。
+    """
+
+    def __init__(self, connections, display_size, camera_area_ratio=0.6, vertical_offset=-0.1,
+                 reference_width=640):
+        self.display_size = tuple(display_size)
+        self.camera_area_ratio = camera_area_ratio
+        self.vertical_offset = vertical_offset
+        # 依顯示寬度相對於攝像頭寬度縮放線寬與點大小
+        scale = self.display_size[0] / reference_width
+        self.scale = scale
+        self.landmark_renderer = LandmarkRenderer(
+            connections, connection_color=(224, 224, 224), joint_color=(255, 48, 48),
+            connection_thickness=max(1, round(2 * scale)), joint_radius=max(2, round(4 * scale))
+        )
+        self.tip_radius = max(3, round(8 * scale))
+
+    def render(self, canvas, landmarks, index_tip=8):
+        """在畫布上繪製手部（landmarks 為 None 時顯示提示文字）"""
+        canvas.fill(0)
+        display_w, display_h = self.display_size
+
+        if landmarks is None:
+            cv2.putText(canvas, "No Hand Detected",
+                        (display_w // 2 - round(100 * self.scale), display_h // 2),
+                        cv2.FONT_HERSHEY_SIMPLEX, self.scale, (255, 255, 255),
+                        max(1, round(2 * self.scale)))
+            return canvas
+
+        # 繪製交互區域（綠色框）
+        ImageProcessor.draw_interaction_area(canvas, self.camera_area_ratio, self.vertical_offset)
+
+        # 繪製手部標記點並高亮食指尖端（青色圓點）
+        points = self.landmark_renderer.draw(canvas, landmarks)
+        tip_x, tip_y = points[index_tip]
+        cv2.circle(canvas, (int(tip_x), int(tip_y)), self.tip_radius, (0, 255, 255), -1)
+        return canvas